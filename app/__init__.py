@@ -48,10 +48,22 @@ def create_app(config_class=Config):
     from app.routes_categories import categories
     app.register_blueprint(categories)
     
+    # Registrar blueprint para administração
+    from app.routes_admin import admin_bp
+    app.register_blueprint(admin_bp)
+    
     # Criar tabelas se não existirem (apenas para desenvolvimento)
     with app.app_context():
         db.create_all()
     
+    # Inspecionar o schema uma única vez (colunas opcionais como categoria_listas.descricao)
+    from app import schema_capabilities
+    schema_capabilities.init_app(app)
+    
+    # Registrar o comando de reconstrução da fila de revisão
+    from app import review_queue
+    review_queue.init_app(app)
+    
     return app
 
 from app import models
@@ -1,515 +1,285 @@
-from openai import OpenAI
+import hashlib
 import json
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from app.models import AISuggestion, CategoriaLista, db
-from sqlalchemy import inspect, select
-from sqlalchemy.orm import aliased
+from app.models import AISuggestion, AISuggestionCache, db
+from app.classification_status import refresh_classification_status
+from app.openai_clients import get_openai_client
+from app.data_versions import DOMINIO_AI_SUGESTOES, DOMINIO_TAXONOMIA, bump_data_versions, get_data_version
+from app.taxonomy_service import get_aia_data, get_categories_lists, get_tecverde_classes, get_tecverde_subclasses
+from app.taxonomy_retrieval import retrieve_candidates
+from app.validation_index import FuzzyVocabulary, get_taxonomy_validation_index, get_tecverde_validation_index
+from app.ai_schemas import (ETAPA_1, ETAPA_2, ETAPA_3, ETAPA_3_LOTE, PRE_SELECAO, SUGGESTION_COLUMNS,
+                            StructuredOutputError, parse_structured_response, response_format)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Modelo usado em todas as etapas
+OPENAI_MODEL = "gpt-4o"
+
+# Versão dos templates de prompt; incrementar sempre que os prompts ou a validação mudarem,
+# para que o cache de sugestões não reutilize resultados gerados pelos prompts antigos
+PROMPT_TEMPLATE_VERSION = "2025.06-3"
+
+# Campos do projeto que entram nos prompts (e portanto na chave do cache de sugestões)
+PROJECT_PROMPT_FIELDS = ('titulo', 'titulo_publico', 'objetivo', 'descricao_publica', 'tags')
+
+# Tentativas de reparo de uma etapa cuja resposta não segue o esquema JSON
+STRUCTURED_REPAIR_ATTEMPTS = 1
+
+# Modos de apresentação da taxonomia na Etapa 1
+TAXONOMY_MODE_FULL = 'full'
+TAXONOMY_MODE_HIERARCHICAL = 'hierarchical'
+
+# Número máximo de threads usadas para executar a Etapa 3 em paralelo às Etapas 1 e 2
+ETAPA_EXECUTOR_MAX_WORKERS = 8
+
+# Projetos por requisição na Etapa 3 em lote (classify_tecverde_batch)
+ETAPA3_BATCH_SIZE = 10
+ETAPA3_MAX_BATCH_SIZE = 20
+
+# Tokens de resposta reservados por projeto na Etapa 3 em lote
+ETAPA3_BATCH_TOKENS_PER_PROJECT = 250
+
+# Campos do resultado de suggest_categories entregues a on_etapa ao final de cada etapa
+ETAPA_RESULT_FIELDS = {
+    ETAPA_1: ("_aia_n1_macroarea", "_aia_n2_segmento", "_aia_n3_dominio_afeito", "confianca", "justificativa"),
+    ETAPA_2: ("_aia_n3_dominio_outro",),
+    ETAPA_3: ("tecverde_se_aplica", "tecverde_classe", "tecverde_subclasse", "tecverde_confianca", "tecverde_justificativa")
+}
+
+_etapa_executor = None
+_etapa_executor_lock = threading.Lock()
+
+
+def _get_etapa_executor():
+    """Retorna o executor compartilhado pelo processo para as etapas paralelas (criado sob demanda)."""
+    global _etapa_executor
+    if _etapa_executor is None:
+        with _etapa_executor_lock:
+            if _etapa_executor is None:
+                _etapa_executor = ThreadPoolExecutor(
+                    max_workers=ETAPA_EXECUTOR_MAX_WORKERS,
+                    thread_name_prefix='ai-etapa'
+                )
+    return _etapa_executor
+
+
+def _notify_etapa(on_etapa, etapa, result):
+    """
+    Entrega a on_etapa os campos validados de uma etapa concluída.
+    
+    Falhas do callback são apenas registradas, para não interromper a classificação.
+    
+    Args:
+        on_etapa: Função on_etapa(etapa, campos) ou None
+        etapa: ETAPA_1, ETAPA_2 ou ETAPA_3
+        result: Dicionário com o resultado (parcial ou final) de suggest_categories
+    """
+    if on_etapa is None:
+        return
+    try:
+        on_etapa(etapa, {field: result[field] for field in ETAPA_RESULT_FIELDS[etapa] if field in result})
+    except Exception as e:
+        logger.error(f"Erro ao notificar a conclusão da {etapa}: {str(e)}")
+
+
+def suggestion_row_values(suggestion_data):
+    """
+    Converte o dicionário retornado por suggest_categories nos valores das colunas de AISuggestion.
+    
+    Args:
+        suggestion_data: Dados da sugestão
+        
+    Returns:
+        Dicionário coluna -> valor (sem id_projeto)
+    """
+    values = {"timestamp": datetime.now()}
+    for key, columns in SUGGESTION_COLUMNS.items():
+        value = suggestion_data.get(key, False if key == 'tecverde_se_aplica' else '')
+        for column in columns:
+            values[column] = value
+    return values
+
+
+def _suggestion_cache_options(taxonomy_mode, top_k, retrieval_top_n, retrieval_skip_threshold):
+    """Opções de suggest_categories que entram na chave do cache de sugestões."""
+    return {
+        "taxonomy_mode": taxonomy_mode,
+        "top_k": top_k if taxonomy_mode == TAXONOMY_MODE_HIERARCHICAL else None,
+        "retrieval_top_n": retrieval_top_n,
+        "retrieval_skip_threshold": retrieval_skip_threshold if retrieval_top_n else None
+    }
+
+
 class OpenAIClient:
-    def __init__(self, api_key):
+    def __init__(self, api_key, rate_limiter=None):
+        """
+        Args:
+            api_key: Chave da API OpenAI
+            rate_limiter: Objeto opcional com método acquire(tokens), chamado antes de cada
+                          requisição à API (usado pelos scripts de classificação em lote)
+        """
         self.api_key = api_key
-        self.client = OpenAI(api_key=api_key)
+        self.client = get_openai_client(api_key)
+        self.rate_limiter = rate_limiter
+        
+        # Uso de tokens acumulado pelas chamadas deste cliente (inclui tokens servidos do cache de prompt)
+        self.usage_stats = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0
+        }
+        self._usage_lock = threading.Lock()
     
-    def _get_categoria_lista_query(self):
+    def _create_chat_completion(self, messages, temperature=0.3, max_tokens=800, response_format=None):
         """
-        Retorna uma query para CategoriaLista que é segura mesmo se a coluna 'descricao' não existir.
-        """
-        try:
-            # Verificar se a coluna 'descricao' existe na tabela
-            inspector = inspect(db.engine)
-            columns = [col['name'] for col in inspector.get_columns('categoria_listas', schema='gepes')]
+        Envia uma requisição de chat completion, respeitando o limitador de taxa (se houver).
+        
+        Args:
+            messages: Lista de mensagens no formato da API
+            temperature: Temperatura do modelo
+            max_tokens: Número máximo de tokens na resposta
+            response_format: Formato de resposta da API (ex.: esquema JSON da etapa), opcional
             
-            if 'descricao' in columns:
-                # Se a coluna existe, incluí-la na query
-                return CategoriaLista.query
-            else:
-                # Se a coluna não existe, criar uma query que não inclui a coluna
-                # Criar um alias para a tabela CategoriaLista
-                CategoriaListaAlias = aliased(CategoriaLista)
-                
-                # Criar uma query que seleciona apenas as colunas que existem
-                query = select(
-                    CategoriaListaAlias.id,
-                    CategoriaListaAlias.tipo,
-                    CategoriaListaAlias.valor,
-                    CategoriaListaAlias.ativo
-                ).select_from(CategoriaListaAlias)
-                
-                # Converter para uma query SQLAlchemy
-                return db.session.query(CategoriaListaAlias.id, CategoriaListaAlias.tipo, CategoriaListaAlias.valor, CategoriaListaAlias.ativo)
-        except Exception as e:
-            logger.error(f"Erro ao criar query para CategoriaLista: {str(e)}")
-            # Em caso de erro, retornar uma query simples que não inclui a coluna 'descricao'
-            return db.session.query(CategoriaLista.id, CategoriaLista.tipo, CategoriaLista.valor, CategoriaLista.ativo)
+        Returns:
+            Resposta da API OpenAI
+        """
+        if self.rate_limiter is not None:
+            # Estimativa aproximada: ~4 caracteres por token no prompt, mais o máximo da resposta
+            prompt_chars = sum(len(message.get("content", "")) for message in messages)
+            self.rate_limiter.acquire(prompt_chars // 4 + max_tokens)
+        
+        options = {"response_format": response_format} if response_format else {}
+        response = self.client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **options
+        )
+        self._record_usage(response)
+        return response
     
-    def _get_categories_lists(self):
-        """Obtém as listas de categorias do banco de dados."""
-        organized_lists = {}
-        
-        # Inicializar listas vazias para cada tipo
-        for tipo in ['tecnologias_habilitadoras', 'areas_aplicacao', 'microarea', 'segmento', 'dominio']:
-            organized_lists[tipo] = []
-        
-        # Mapeamento de tipos para consulta no banco de dados
-        tipo_mapping = {
-            'microarea': 'macroárea',
-            'segmento': 'segmento',
-            'dominio': 'dominio'
-        }
+    def _request_etapa(self, etapa, messages, project_id=None, max_tokens=800):
+        """
+        Chama a API com saída estruturada (esquema JSON da etapa) e valida a resposta.
         
-        # Estrutura para armazenar domínios por microárea e segmento
-        dominios_por_microarea_segmento = {}
+        Se a resposta não seguir o esquema, apenas esta etapa é repetida, com a resposta
+        inválida e o erro encontrado acrescentados à conversa como pedido de correção.
         
-        try:
-            # Obter todas as categorias ativas usando a query segura
-            all_categories = self._get_categoria_lista_query().filter_by(ativo=True).all()
-            
-            # Log para depuração
-            logger.info(f"Recuperadas {len(all_categories)} categorias ativas do banco de dados")
-            
-            # Verificar se há categorias suficientes
-            if not all_categories or len(all_categories) < 100:  # Verificar se temos pelo menos 100 categorias
-                logger.warning(f"Poucas categorias encontradas no banco de dados: {len(all_categories)}. Adicionando categorias de exemplo.")
-                
-                # Adicionar categorias de exemplo para evitar erros
-                logger.info("Adicionando categorias de exemplo para complementar as existentes")
-                
-                # Adicionar macroáreas de exemplo (complementando as existentes)
-                example_macroareas = ["Energia renovável", "Construção", "Saúde", "Agro e Alimentos", "Telecomunicações", 
-                                     "Relações B2B/B2C", "Serviços Industriais de Utilidade Pública", 
-                                     "Indústria de base e transformação", "Engenharia de Produção", 
-                                     "Defesa e aeroespacial", "Petróleo e gás"]
-                for macroarea in example_macroareas:
-                    organized_lists['microarea'].append(macroarea)
-                    dominios_por_microarea_segmento[macroarea] = {}
-                
-                # Adicionar segmentos de exemplo (complementando os existentes)
-                example_segmentos = {
-                    "Energia renovável": ["Energia solar fotovoltaica", "Energia eólica", "Biomossa (biodiesel) e biogás", "Energia hidrelétrica", "Hidrogênio verde"],
-                    "Construção": ["Construção de Edifícios", "Obras de Infraestrutura", "Serviços Especializados para Construção"],
-                    "Saúde": ["Assistência à Saúde", "Dispositivos Médicos e Biomateriais", "Gestão e Inteligência em Saúde Pública", "Produtos Farmacêuticos e Insumos Estratégicos"],
-                    "Agro e Alimentos": ["Agricultura", "Alimentos e Bebidas", "Pecuária"],
-                    "Telecomunicações": ["Comunicação por Satélite", "Redes de Comunicação Terrestre"],
-                    "Relações B2B/B2C": ["Soluções de CRM", "E-commerce e Experiências Digitais", "SaaS e Microserviços"],
-                    "Indústria de base e transformação": ["Indústria química", "Indústria automobilística", "Indústria têxtil e de vestuário"],
-                    "Engenharia de Produção": ["Gestão da Produção e Operações", "Logística e Cadeias de Suprimento"]
-                }
-                
-                for macroarea, segmentos in example_segmentos.items():
-                    for segmento in segmentos:
-                        if segmento not in organized_lists['segmento']:
-                            organized_lists['segmento'].append(segmento)
-                        dominios_por_microarea_segmento[macroarea][segmento] = []
-                
-                # Adicionar domínios de exemplo (complementando os existentes)
-                example_dominios = {
-                    "Energia solar fotovoltaica": ["Painéis bifaciais e de alta eficiência", "Integração com edificações e infraestrutura urbana", "Inversores e sistemas de controle", "Armazenamento em baterias"],
-                    "Energia eólica": ["Turbinas onshore e offshore", "Integração com redes elétricas", "Sistemas de controle e conversão de energia", "Armazenamento complementar"],
-                    "Biomossa (biodiesel) e biogás": ["Produção de biodiesel", "Digestores anaeróbicos", "Purificação e refino de biogás"],
-                    "Energia hidrelétrica": ["Micro e minihidrelétricas", "Sistemas de modernização de usinas existentes"],
-                    "Hidrogênio verde": ["Eletrólise com energia renovável", "Células a combustível"],
-                    "Construção de Edifícios": ["Edificações sustentáveis", "Automação predial e IoT em edifícios", "Materiais estruturais avançados"],
-                    "Obras de Infraestrutura": ["Infraestruturas inteligentes", "Monitoramento estrutural"],
-                    "Assistência à Saúde": ["Telemedicina", "Sistemas de gestão hospitalar", "Aplicativos de suporte ao cuidado"],
-                    "Dispositivos Médicos e Biomateriais": ["Equipamentos de diagnóstico", "Dispositivos vestíveis"],
-                    "Agricultura": ["Agricultura de precisão e automação agrícola", "Melhoramento genético vegetal"],
-                    "Alimentos e Bebidas": ["Processamento de alimentos e bebidas", "Segurança e conservação alimentar"],
-                    "Redes de Comunicação Terrestre": ["Redes 5G e futuras gerações (6G)", "Conectividade móvel"],
-                    "SaaS e Microserviços": ["Plataformas web com entrega de software como serviço", "Desenvolvimento de APIs e interfaces para integração de serviços"]
-                }
-                
-                for segmento, dominios in example_dominios.items():
-                    for macroarea, segmentos in dominios_por_microarea_segmento.items():
-                        if segmento in segmentos:
-                            for dominio in dominios:
-                                if dominio not in organized_lists['dominio']:
-                                    organized_lists['dominio'].append(dominio)
-                                dominios_por_microarea_segmento[macroarea][segmento].append(dominio)
-                
-                # Adicionar a estrutura hierárquica ao resultado
-                organized_lists['dominios_por_microarea_segmento'] = dominios_por_microarea_segmento
-                
-                # Log para depuração
-                logger.info(f"Categorias de exemplo adicionadas: microarea={len(organized_lists['microarea'])}, segmento={len(organized_lists['segmento'])}, dominio={len(organized_lists['dominio'])}")
-                
-                return organized_lists
-            
-            # Processar cada categoria
-            for categoria in all_categories:
-                tipo = categoria.tipo
-                valor = categoria.valor
-                
-                # Log para depuração
-                logger.debug(f"Processando categoria: tipo={tipo}, valor={valor}")
-                
-                # Mapear o tipo do banco de dados para o tipo usado na interface
-                if tipo in tipo_mapping.values():
-                    # Encontrar a chave correspondente ao valor
-                    for ui_tipo, db_tipo in tipo_mapping.items():
-                        if db_tipo == tipo:
-                            # Adicionar à lista correspondente
-                            if valor not in organized_lists[ui_tipo]:
-                                organized_lists[ui_tipo].append(valor)
-                            break
-                elif tipo in organized_lists:
-                    # Para outros tipos que não estão no mapeamento
-                    if valor not in organized_lists[tipo]:
-                        organized_lists[tipo].append(valor)
-                
-                # Processar categorias para a estrutura hierárquica
-                if tipo == 'macroárea':
-                    # Macroárea é adicionada diretamente
-                    if valor not in organized_lists['microarea']:
-                        organized_lists['microarea'].append(valor)
-                    
-                    # Inicializar a estrutura para esta macroárea
-                    if valor not in dominios_por_microarea_segmento:
-                        dominios_por_microarea_segmento[valor] = {}
-                
-                elif tipo == 'segmento':
-                    # Segmento está no formato "Macroárea|Segmento"
-                    if '|' in valor:
-                        parts = valor.split('|')
-                        if len(parts) >= 2:
-                            macroárea = parts[0]
-                            segmento = parts[1]
-                            
-                            # Adicionar à lista de segmentos
-                            if segmento not in organized_lists['segmento']:
-                                organized_lists['segmento'].append(segmento)
-                            
-                            # Adicionar à estrutura hierárquica
-                            if macroárea not in dominios_por_microarea_segmento:
-                                dominios_por_microarea_segmento[macroárea] = {}
-                            
-                            if segmento not in dominios_por_microarea_segmento[macroárea]:
-                                dominios_por_microarea_segmento[macroárea][segmento] = []
-                
-                elif tipo == 'dominio':
-                    # Domínio está no formato "Macroárea|Segmento|Domínio"
-                    if '|' in valor:
-                        parts = valor.split('|')
-                        if len(parts) >= 3:
-                            macroárea = parts[0]
-                            segmento = parts[1]
-                            dominio = parts[2]
-                            
-                            # Adicionar à lista de domínios
-                            if dominio not in organized_lists['dominio']:
-                                organized_lists['dominio'].append(dominio)
-                            
-                            # Adicionar à estrutura hierárquica
-                            if macroárea not in dominios_por_microarea_segmento:
-                                dominios_por_microarea_segmento[macroárea] = {}
-                            
-                            if segmento not in dominios_por_microarea_segmento[macroárea]:
-                                dominios_por_microarea_segmento[macroárea][segmento] = []
-                            
-                            if dominio not in dominios_por_microarea_segmento[macroárea][segmento]:
-                                dominios_por_microarea_segmento[macroárea][segmento].append(dominio)
-            
-            # Log para depuração
-            logger.info(f"Categorias processadas: microarea={len(organized_lists['microarea'])}, segmento={len(organized_lists['segmento'])}, dominio={len(organized_lists['dominio'])}")
+        Args:
+            etapa: ETAPA_1, ETAPA_2, ETAPA_3 ou PRE_SELECAO
+            messages: Mensagens da etapa
+            project_id: ID do projeto (apenas para log)
+            max_tokens: Número máximo de tokens na resposta
             
-        except Exception as e:
-            logger.error(f"Erro ao obter categorias do banco de dados: {str(e)}")
+        Returns:
+            Dicionário validado, ou resultado de erro (com a chave 'error') se o reparo falhar
+        """
+        logger.info(f"{etapa} - Enviando prompt para OpenAI (projeto ID: {project_id})")
+        logger.debug(f"Prompt {etapa}: {messages[-1]['content'][:200]}...")
         
-        # Adicionar a estrutura hierárquica ao resultado
-        organized_lists['dominios_por_microarea_segmento'] = dominios_por_microarea_segmento
+        for attempt in range(STRUCTURED_REPAIR_ATTEMPTS + 1):
+            response = self._create_chat_completion(messages, max_tokens=max_tokens, response_format=response_format(etapa))
+            ai_response = (response.choices[0].message.content or "").strip()
+            logger.info(f"Resposta bruta da API ({etapa}): {ai_response}")
+            try:
+                return parse_structured_response(etapa, ai_response)
+            except StructuredOutputError as e:
+                error = str(e)
+                logger.warning(f"{etapa} - Resposta fora do esquema (projeto ID: {project_id}, tentativa {attempt + 1}): {error}")
+                messages = messages + [
+                    {"role": "assistant", "content": ai_response},
+                    {"role": "user", "content": f"A resposta anterior não é válida: {error}. Responda novamente APENAS com o JSON corrigido, seguindo exatamente a estrutura pedida."}
+                ]
         
-        return organized_lists
+        return self._invalid_response_result(f"Resposta da IA inválida na {etapa}: {error}")
     
-    def _get_tecverde_classes(self):
-        """Obtém as classes de tecnologias verdes do banco de dados."""
-        tecverde_classes = {}
+    def _parse_etapa_response(self, etapa, ai_response):
+        """
+        Valida uma resposta já recebida (ex.: Batch API), sem tentativa de reparo.
         
+        Returns:
+            Dicionário validado, ou resultado de erro (com a chave 'error')
+        """
         try:
-            # Buscar classes de tecnologias verdes no banco de dados usando a query segura
-            classes = self._get_categoria_lista_query().filter_by(tipo='tecverde_classe', ativo=True).all()
-            
-            # Se não encontrou nenhuma classe, usar dados predefinidos para exemplo
-            if not classes:
-                logger.warning("Nenhuma classe de tecnologia verde encontrada no banco de dados. Usando dados predefinidos.")
-                tecverde_classes = {
-                    "Energias alternativas": "Tecnologias relacionadas a fontes de energia alternativas",
-                    "Gestão Ambiental": "Tecnologias de gerenciamento e controle do impacto ambiental",
-                    "Transporte": "Tecnologias de transporte com menor impacto ambiental",
-                    "Conservação": "Tecnologias para conservação de recursos naturais",
-                    "Agricultura Sustentável": "Métodos agrícolas que minimizam impacto ambiental"
-                }
-            else:
-                # Processar as classes encontradas no banco de dados
-                for classe in classes:
-                    # O valor contém o nome da classe
-                    nome_classe = classe.valor
-                    
-                    # A descrição pode estar em um campo adicional ou ser extraída do valor
-                    # Verificar se o atributo 'descricao' existe no objeto e na tabela
-                    try:
-                        descricao = classe.descricao if hasattr(classe, 'descricao') else "Tecnologia verde"
-                    except Exception as e:
-                        # Se ocorrer um erro ao acessar o atributo (por exemplo, se a coluna não existir no banco de dados)
-                        logger.warning(f"Erro ao acessar atributo 'descricao': {str(e)}. Usando valor padrão.")
-                        descricao = "Tecnologia verde"
-                    
-                    tecverde_classes[nome_classe] = descricao
-                
-                logger.info(f"Carregadas {len(tecverde_classes)} classes de tecnologias verdes do banco de dados")
-        except Exception as e:
-            logger.error(f"Erro ao obter classes de tecnologias verdes do banco de dados: {str(e)}")
-            # Em caso de erro, usar dados predefinidos
-            tecverde_classes = {
-                "Energias alternativas": "Tecnologias relacionadas a fontes de energia alternativas",
-                "Gestão Ambiental": "Tecnologias de gerenciamento e controle do impacto ambiental",
-                "Transporte": "Tecnologias de transporte com menor impacto ambiental",
-                "Conservação": "Tecnologias para conservação de recursos naturais",
-                "Agricultura Sustentável": "Métodos agrícolas que minimizam impacto ambiental"
-            }
-        
-        logger.info(f"Classes de tecnologias verdes disponíveis: {list(tecverde_classes.keys())}")
-        return tecverde_classes
+            return parse_structured_response(etapa, ai_response)
+        except StructuredOutputError as e:
+            logger.warning(f"{etapa} - Resposta fora do esquema: {str(e)}")
+            return self._invalid_response_result(f"Resposta da IA inválida na {etapa}: {str(e)}")
     
-    def _get_tecverde_subclasses(self):
-        """Obtém as subclasses de tecnologias verdes do banco de dados."""
-        tecverde_subclasses = {}
-        
-        try:
-            # Buscar subclasses de tecnologias verdes no banco de dados usando a query segura
-            subclasses = self._get_categoria_lista_query().filter_by(tipo='tecverde_subclasse', ativo=True).all()
-            
-            # Se não encontrou nenhuma subclasse, usar dados predefinidos para exemplo
-            if not subclasses:
-                logger.warning("Nenhuma subclasse de tecnologia verde encontrada no banco de dados. Usando dados predefinidos.")
-                tecverde_subclasses = {
-                    "Energias alternativas": "Solar; Eólica; Biomassa; Geotérmica; Hidrogênio",
-                    "Gestão Ambiental": "Tratamento de resíduos; Controle de poluição; Monitoramento ambiental; Remediação",
-                    "Transporte": "Veículos elétricos; Biocombustíveis; Mobilidade urbana sustentável",
-                    "Conservação": "Conservação de água; Conservação de biodiversidade; Reflorestamento",
-                    "Agricultura Sustentável": "Agricultura orgânica; Agricultura de precisão; Agroecologia; Sistemas agroflorestais"
-                }
-            else:
-                # Processar as subclasses encontradas no banco de dados
-                for subclasse in subclasses:
-                    # O valor contém o nome da classe e as subclasses no formato "Classe|Subclasse1; Subclasse2; Subclasse3"
-                    valor = subclasse.valor
-                    
-                    # Verificar se o atributo 'descricao' existe no objeto e na tabela
-                    try:
-                        # Tentar acessar o atributo 'descricao' (não usado neste método, mas verificamos para consistência)
-                        _ = subclasse.descricao if hasattr(subclasse, 'descricao') else None
-                    except Exception as e:
-                        # Se ocorrer um erro ao acessar o atributo, logar o erro
-                        logger.warning(f"Erro ao acessar atributo 'descricao': {str(e)}. Isso não afeta o processamento de subclasses.")
-                    
-                    if '|' in valor:
-                        partes = valor.split('|')
-                        if len(partes) >= 2:
-                            classe = partes[0].strip()
-                            subclasses_str = partes[1].strip()
-                            
-                            # Adicionar as subclasses para esta classe
-                            tecverde_subclasses[classe] = subclasses_str
-                    else:
-                        logger.warning(f"Formato inválido para subclasse: {valor}. Esperado formato 'Classe|Subclasse1; Subclasse2'")
-                
-                logger.info(f"Carregadas subclasses para {len(tecverde_subclasses)} classes de tecnologias verdes do banco de dados")
-        except Exception as e:
-            logger.error(f"Erro ao obter subclasses de tecnologias verdes do banco de dados: {str(e)}")
-            # Em caso de erro, usar dados predefinidos
-            tecverde_subclasses = {
-                "Energias alternativas": "Solar; Eólica; Biomassa; Geotérmica; Hidrogênio",
-                "Gestão Ambiental": "Tratamento de resíduos; Controle de poluição; Monitoramento ambiental; Remediação",
-                "Transporte": "Veículos elétricos; Biocombustíveis; Mobilidade urbana sustentável",
-                "Conservação": "Conservação de água; Conservação de biodiversidade; Reflorestamento",
-                "Agricultura Sustentável": "Agricultura orgânica; Agricultura de precisão; Agroecologia; Sistemas agroflorestais"
-            }
-        
-        # Logar as subclasses disponíveis para cada classe
-        for classe, subclasses in tecverde_subclasses.items():
-            if isinstance(subclasses, str):
-                if ';' in subclasses:
-                    subclasses_list = subclasses.split(';')
-                elif ',' in subclasses:
-                    subclasses_list = subclasses.split(',')
-                else:
-                    subclasses_list = [subclasses]
-                subclasses_list = [s.strip() for s in subclasses_list if s.strip()]
-                logger.info(f"Subclasses disponíveis para '{classe}': {subclasses_list}")
-        
-        return tecverde_subclasses
+    def _invalid_response_result(self, message):
+        """Resultado de erro usado quando a resposta da IA não pode ser processada."""
+        return {
+            "_aia_n1_macroarea": "",
+            "_aia_n2_segmento": "",
+            "_aia_n3_dominio_afeito": "",
+            "_aia_n3_dominio_outro": "",
+            "confianca": "BAIXA",
+            "justificativa": message,
+            "error": message
+        }
     
-    def _get_aia_data_from_db(self):
+    def _record_usage(self, response):
+        """
+        Acumula o uso de tokens informado na resposta, incluindo os tokens de prompt
+        servidos pelo cache do provedor (usage.prompt_tokens_details.cached_tokens).
         """
-        Obtém os dados de AIA (Áreas de Interesse Aplicado) do banco de dados.
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        
+        with self._usage_lock:
+            self.usage_stats["requests"] += 1
+            self.usage_stats["prompt_tokens"] += prompt_tokens
+            self.usage_stats["cached_tokens"] += cached_tokens
+            self.usage_stats["completion_tokens"] += completion_tokens
+        
+        logger.info(f"Uso de tokens: prompt={prompt_tokens} (cache={cached_tokens}), resposta={completion_tokens}")
+    
+    def get_usage_stats(self):
+        """
+        Retorna o uso de tokens acumulado e a taxa de acerto do cache de prompt.
         
         Returns:
-            Lista de dicionários com as categorias do AIA
+            Dicionário com requests, prompt_tokens, cached_tokens, completion_tokens e cache_hit_rate
         """
-        try:
-            # Obter as categorias do banco de dados
-            categories_lists = self._get_categories_lists()
-            
-            # Log para depuração
-            logger.info(f"Estrutura de categorias recuperada: microarea={len(categories_lists.get('microarea', []))}, segmento={len(categories_lists.get('segmento', []))}, dominio={len(categories_lists.get('dominio', []))}")
-            
-            dominios_por_microarea_segmento = categories_lists.get('dominios_por_microarea_segmento', {})
-            
-            # Log para depuração
-            logger.info(f"Número de macroáreas na estrutura hierárquica: {len(dominios_por_microarea_segmento)}")
-            for macroarea, segmentos in dominios_por_microarea_segmento.items():
-                logger.info(f"Macroárea '{macroarea}' tem {len(segmentos)} segmentos")
-            
-            aia_data = []
-            
-            # Converter a estrutura hierárquica para o formato esperado pelo método _build_prompt_etapa1
-            # Garantir que todas as combinações de macroárea e segmento sejam incluídas
-            for macroarea, segmentos in dominios_por_microarea_segmento.items():
-                for segmento, dominios in segmentos.items():
-                    dominios_str = "; ".join(dominios) if dominios else ""
-                    aia_data.append({
-                        "Macroárea": macroarea,
-                        "Segmento": segmento,
-                        "Domínios Afeitos": dominios_str
-                    })
-            
-            # Verificar se temos categorias suficientes
-            if len(aia_data) < 10:
-                logger.warning(f"Poucas categorias encontradas: {len(aia_data)}. Adicionando categorias de produção.")
-                
-                # Adicionar categorias de produção
-                production_categories = [
-                    # Macroáreas e segmentos da lista_categories.py
-                    {
-                        "Macroárea": "Construção",
-                        "Segmento": "Construção de Edifícios",
-                        "Domínios Afeitos": "Edificações sustentáveis; Automação predial e IoT em edifícios; Materiais estruturais avançados"
-                    },
-                    {
-                        "Macroárea": "Relações B2B/B2C",
-                        "Segmento": "SaaS e Microserviços",
-                        "Domínios Afeitos": "Plataformas web com entrega de software como serviço; Desenvolvimento de APIs e interfaces para integração de serviços"
-                    },
-                    {
-                        "Macroárea": "Telecomunicações",
-                        "Segmento": "Redes de Comunicação Terrestre",
-                        "Domínios Afeitos": "Redes 5G e futuras gerações (6G); Conectividade móvel"
-                    },
-                    {
-                        "Macroárea": "Agro e Alimentos",
-                        "Segmento": "Agricultura",
-                        "Domínios Afeitos": "Agricultura de precisão e automação agrícola; Melhoramento genético vegetal"
-                    },
-                    {
-                        "Macroárea": "Saúde",
-                        "Segmento": "Assistência à Saúde",
-                        "Domínios Afeitos": "Telemedicina; Sistemas de gestão hospitalar"
-                    },
-                    {
-                        "Macroárea": "Energia renovável",
-                        "Segmento": "Energia solar fotovoltaica",
-                        "Domínios Afeitos": "Integração com edificações e infraestrutura urbana; Painéis bifaciais e de alta eficiência"
-                    },
-                    {
-                        "Macroárea": "Energia renovável",
-                        "Segmento": "Energia eólica",
-                        "Domínios Afeitos": "Integração com redes elétricas; Armazenamento complementar; Integração com outras fontes renováveis"
-                    },
-                    {
-                        "Macroárea": "Engenharia de Produção",
-                        "Segmento": "Gestão da Produção e Operações",
-                        "Domínios Afeitos": "Planejamento de processos produtivos; Controle de produção em tempo real"
-                    },
-                    {
-                        "Macroárea": "Indústria de base e transformação",
-                        "Segmento": "Indústria química",
-                        "Domínios Afeitos": "Desenvolvimento de novos polímeros e compósitos; Processos sustentáveis para síntese química"
-                    },
-                    {
-                        "Macroárea": "Petróleo e gás",
-                        "Segmento": "Exploração e produção de petróleo",
-                        "Domínios Afeitos": "Tecnologias para prospecção geofísica e sísmica; Perfuração de poços em águas profundas e ultraprofundas"
-                    }
-                ]
-                
-                # Adicionar categorias de produção à lista existente
-                for category in production_categories:
-                    if not any(item["Macroárea"] == category["Macroárea"] and 
-                              item["Segmento"] == category["Segmento"] for item in aia_data):
-                        aia_data.append(category)
-                
-                logger.info(f"Adicionadas {len(production_categories)} categorias de produção. Total agora: {len(aia_data)}")
-            
-            # Logar as categorias disponíveis
-            logger.info(f"Total de categorias disponíveis para classificação: {len(aia_data)}")
-            logger.debug(f"Primeiras 5 categorias disponíveis para classificação: {json.dumps(aia_data[:5], indent=2, ensure_ascii=False)}")
-            
-            # Verificar se estamos usando apenas 50 categorias (que é o padrão)
-            if len(aia_data) == 50:
-                logger.warning("Detectado limite de 50 categorias. Removendo limite para usar todas as categorias disponíveis.")
-                # Reconstruir aia_data com todas as categorias disponíveis
-                aia_data = []
-                for macroarea, segmentos in dominios_por_microarea_segmento.items():
-                    for segmento, dominios in segmentos.items():
-                        dominios_str = "; ".join(dominios) if dominios else ""
-                        aia_data.append({
-                            "Macroárea": macroarea,
-                            "Segmento": segmento,
-                            "Domínios Afeitos": dominios_str
-                        })
-                logger.info(f"Reconstruído aia_data com todas as categorias. Total agora: {len(aia_data)}")
-            
-            # Usar todas as categorias disponíveis para classificação
-            # Não limitar o número de categorias usadas
-            
-            # Garantir que temos pelo menos as categorias básicas
-            if not any(item["Macroárea"] == "Energia renovável" for item in aia_data):
-                logger.warning("Categoria 'Energia renovável' não encontrada. Adicionando manualmente.")
-                aia_data.append({
-                    "Macroárea": "Energia renovável",
-                    "Segmento": "Energia solar fotovoltaica",
-                    "Domínios Afeitos": "Integração com edificações e infraestrutura urbana"
-                })
-            
-            return aia_data
-            
-        except Exception as e:
-            logger.error(f"Erro ao obter dados AIA do banco de dados: {str(e)}")
-            # Em caso de erro, retornar dados de exemplo
-            logger.warning("Retornando dados de exemplo devido a erro")
-            return [
-                {
-                    "Macroárea": "Energia renovável",
-                    "Segmento": "Energia solar fotovoltaica",
-                    "Domínios Afeitos": "Integração com edificações e infraestrutura urbana"
-                },
-                {
-                    "Macroárea": "Energia renovável",
-                    "Segmento": "Energia eólica",
-                    "Domínios Afeitos": "Integração com redes elétricas; Armazenamento complementar; Integração com outras fontes renováveis"
-                },
-                {
-                    "Macroárea": "Construção",
-                    "Segmento": "Construção de Edifícios",
-                    "Domínios Afeitos": "Edificações sustentáveis; Automação predial e IoT em edifícios"
-                },
-                {
-                    "Macroárea": "Saúde",
-                    "Segmento": "Assistência à Saúde",
-                    "Domínios Afeitos": "Telemedicina; Sistemas de gestão hospitalar"
-                },
-                {
-                    "Macroárea": "Agro e Alimentos",
-                    "Segmento": "Agricultura",
-                    "Domínios Afeitos": "Agricultura de precisão e automação agrícola; Melhoramento genético vegetal"
-                }
-            ]
+        with self._usage_lock:
+            stats = dict(self.usage_stats)
+        stats["cache_hit_rate"] = round(stats["cached_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else 0.0
+        return stats
+    
+    def _get_categories_lists(self):
+        """Obtém as listas de categorias (app.taxonomy_service)."""
+        return get_categories_lists()
+    
+    def _get_tecverde_classes(self):
+        """Obtém as classes de tecnologias verdes (app.taxonomy_service)."""
+        return get_tecverde_classes()
+    
+    def _get_tecverde_subclasses(self):
+        """Obtém as subclasses de tecnologias verdes (app.taxonomy_service)."""
+        return get_tecverde_subclasses()
     
-    def suggest_categories(self, project, categories_lists=None, aia_data=None):
+    def _get_aia_data_from_db(self):
+        """Obtém os dados de AIA (app.taxonomy_service)."""
+        return get_aia_data()
+    
+    def suggest_categories(self, project, categories_lists=None, aia_data=None, parallel=True,
+                           taxonomy_mode=TAXONOMY_MODE_FULL, top_k=3,
+                           retrieval_top_n=None, retrieval_skip_threshold=None, force=False,
+                           on_etapa=None, tecverde_result=None):
         """
         Sugere categorias para um projeto usando a API do OpenAI em um processo de três etapas.
         
@@ -518,10 +288,42 @@ class OpenAIClient:
                  (todos os domínios de outros segmentos da mesma microárea) para a IA selecionar
         Etapa 3: A IA classifica o projeto em termos de Tecnologias Verdes (classe e subclasse)
         
+        A Etapa 3 depende apenas do texto do projeto e da lista de tecnologias verdes, portanto
+        no modo paralelo ela é executada em uma thread separada enquanto as Etapas 1 e 2 rodam
+        em sequência, reduzindo a latência total para a maior das duas cadeias.
+        
+        No modo hierárquico, uma chamada preliminar que vê apenas os nomes de macroáreas e
+        segmentos escolhe os top_k candidatos, e a Etapa 1 recebe somente os domínios desses
+        candidatos. A validação continua sendo feita contra a taxonomia completa.
+        
+        Com retrieval_top_n, um índice TF-IDF local ordena as entradas da taxonomia pela
+        similaridade com o texto do projeto e apenas as retrieval_top_n melhores vão para a
+        Etapa 1. Se retrieval_skip_threshold for informado e a similaridade for decisiva, a
+        Etapa 1 é resolvida localmente, sem chamada à API, com confiança ALTA.
+        
+        Resultados completos ficam em cache, endereçados pelo conteúdo do projeto, versão da
+        taxonomia, versão dos prompts, modelo e opções; uma nova chamada com a mesma entrada
+        retorna o resultado armazenado sem chamar a API, a menos que force=True.
+        
+        Se on_etapa for informado, ele é chamado como on_etapa(etapa, campos) assim que cada etapa
+        termina de ser validada (ETAPA_1: macroárea/segmento/domínio, ETAPA_2: domínio outro,
+        ETAPA_3: tecnologias verdes), permitindo exibir resultados parciais. No modo paralelo a
+        chamada da ETAPA_3 pode ocorrer na thread do executor e antes das demais.
+        
         Args:
             project: Dicionário com informações do projeto
             categories_lists: Dicionário com as listas de categorias disponíveis (opcional)
             aia_data: Lista de categorias do arquivo aia.json (opcional)
+            parallel: Se True, executa a Etapa 3 em paralelo com as Etapas 1 e 2 (padrão: True)
+            taxonomy_mode: TAXONOMY_MODE_FULL (taxonomia completa no prompt) ou
+                           TAXONOMY_MODE_HIERARCHICAL (pré-seleção de macroárea/segmento)
+            top_k: Número de pares macroárea/segmento pré-selecionados no modo hierárquico
+            retrieval_top_n: Número de entradas mantidas pela recuperação local (None = desativada)
+            retrieval_skip_threshold: Similaridade mínima para dispensar a Etapa 1 (None = nunca)
+            force: Se True, ignora o cache de sugestões e chama a API
+            on_etapa: Função chamada com os campos de cada etapa concluída (opcional)
+            tecverde_result: Campos tecverde_* já calculados (ex.: por classify_tecverde_batch);
+                             quando informado, a Etapa 3 não é executada
             
         Returns:
             Dicionário com as categorias sugeridas e informações adicionais
@@ -533,43 +335,72 @@ class OpenAIClient:
             }
         
         try:
+            # Reutilizar o resultado armazenado se nada que influencia a classificação mudou
+            # (apenas quando a taxonomia vem do banco, pois só ela tem versão conhecida)
+            cache_key = None
+            if not aia_data:
+                cache_key = self._suggestion_cache_key(
+                    project, _suggestion_cache_options(taxonomy_mode, top_k, retrieval_top_n, retrieval_skip_threshold)
+                )
+            if cache_key and not force:
+                cached_result = self._get_cached_suggestion(cache_key)
+                if cached_result is not None:
+                    logger.info(f"Sugestão reutilizada do cache para o projeto ID: {project.get('id')}")
+                    for etapa in (ETAPA_1, ETAPA_2, ETAPA_3):
+                        _notify_etapa(on_etapa, etapa, cached_result)
+                    return cached_result
+            
             # Se não foi fornecido aia_data, obter do banco de dados
             if not aia_data:
                 aia_data = self._get_aia_data_from_db()
-                
-            # ETAPA 1: Identificar Micro Área, Segmento e Domínio
-            prompt_etapa1 = self._build_prompt_etapa1(project, aia_data)
-            logger.info(f"Etapa 1 - Enviando prompt para OpenAI (projeto ID: {project.get('id')})")
-            logger.debug(f"Prompt Etapa 1: {prompt_etapa1[:200]}...")
             
-            # Chamar a API do ChatGPT para a primeira etapa
-            response_etapa1 = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Você é um assistente especializado em categorizar projetos de pesquisa e desenvolvimento industrial."},
-                    {"role": "user", "content": prompt_etapa1}
-                ],
-                temperature=0.3,
-                max_tokens=800
-            )
+            # ETAPA 3 (modo paralelo): disparar a classificação de Tecnologias Verdes antes das
+            # Etapas 1 e 2. Os dados de tecnologias verdes são carregados nesta thread, que possui
+            # o contexto da aplicação; a thread auxiliar apenas chama a API e valida a resposta.
+            # (ou usar os campos já calculados pela Etapa 3 em lote)
+            etapa3_future = None
+            if tecverde_result is not None:
+                etapa3_future = Future()
+                etapa3_future.set_result(tecverde_result)
+            elif parallel:
+                etapa3_future = self._submit_etapa3(project)
+            if etapa3_future is not None and on_etapa is not None:
+                etapa3_future.add_done_callback(
+                    lambda future: None if future.cancelled() else _notify_etapa(on_etapa, ETAPA_3, future.result())
+                )
+                
+            # Recuperação local: restringir a taxonomia da Etapa 1 às entradas mais similares
+            aia_data_etapa1 = aia_data
+            result_local = None
+            if retrieval_top_n:
+                aia_data_etapa1, result_local = retrieve_candidates(
+                    project, aia_data, retrieval_top_n, retrieval_skip_threshold
+                )
             
-            # Extrair a resposta da primeira etapa
-            ai_response_etapa1 = response_etapa1.choices[0].message.content.strip()
-            logger.info(f"Etapa 1 - Resposta recebida da OpenAI (projeto ID: {project.get('id')})")
-            logger.info(f"Resposta bruta da API (Etapa 1): {ai_response_etapa1}")
-            logger.debug(f"Resposta completa da API (Etapa 1): {response_etapa1}")
+            # Modo hierárquico: restringir a taxonomia da Etapa 1 aos segmentos candidatos
+            if result_local is None and taxonomy_mode == TAXONOMY_MODE_HIERARCHICAL:
+                aia_data_etapa1 = self._narrow_aia_data(project, aia_data_etapa1, top_k)
             
-            # Processar a resposta da primeira etapa
+            # ETAPA 1: Identificar Micro Área, Segmento e Domínio
             try:
-                # Tentar analisar como JSON
-                result_etapa1 = self._parse_ai_response(ai_response_etapa1)
+                if result_local is not None:
+                    logger.info(f"Etapa 1 - Resolvida pela recuperação local (projeto ID: {project.get('id')})")
+                    result_etapa1 = result_local
+                else:
+                    result_etapa1 = self._request_etapa(
+                        ETAPA_1, self._etapa1_messages(project, aia_data_etapa1), project.get('id')
+                    )
                 
-                # Se não conseguiu obter um resultado válido, retornar erro
+                # Se não conseguiu obter um resultado válido, retornar erro (descartando a Etapa 3
+                # em paralelo, se ainda não começou)
                 if not result_etapa1 or "error" in result_etapa1:
+                    if etapa3_future is not None:
+                        etapa3_future.cancel()
                     return result_etapa1
                 
                 # Validar se as categorias retornadas estão na lista de categorias permitidas
                 result_etapa1 = self._validate_categories(result_etapa1, aia_data)
+                _notify_etapa(on_etapa, ETAPA_1, result_etapa1)
                 
                 # ETAPA 2: Fornecer a lista de Domínios Afeitos Outros para seleção
                 # Extrair a microárea e segmento identificados na primeira etapa
@@ -579,7 +410,11 @@ class OpenAIClient:
                 # Se não temos microárea ou segmento, não podemos continuar
                 if not macroarea or not segmento:
                     result_etapa1["_aia_n3_dominio_outro"] = "N/A"
+                    # A Etapa 3 em paralelo já foi paga: incluir seus campos no resultado
+                    if etapa3_future is not None:
+                        result_etapa1.update(etapa3_future.result())
                     result_etapa1["timestamp"] = datetime.now().isoformat()
+                    _notify_etapa(on_etapa, ETAPA_2, result_etapa1)
                     return result_etapa1
                 
                 # Gerar a lista de Domínios Afeitos Outros (todos os domínios de outros segmentos da mesma microárea)
@@ -589,100 +424,35 @@ class OpenAIClient:
                 if not dominios_afeitos_outros:
                     # Se não há domínios afeitos outros, definir como N/A e pular etapa 2
                     result_etapa1["_aia_n3_dominio_outro"] = "N/A"
+                    # A Etapa 3 em paralelo já foi paga: incluir seus campos no resultado
+                    if etapa3_future is not None:
+                        result_etapa1.update(etapa3_future.result())
                     result_etapa1["timestamp"] = datetime.now().isoformat()
+                    _notify_etapa(on_etapa, ETAPA_2, result_etapa1)
                     return result_etapa1
                 
-                # Construir o prompt para a segunda etapa (só será executado se houver domínios afeitos outros)
-                prompt_etapa2 = self._build_prompt_etapa2(project, result_etapa1, dominios_afeitos_outros)
-                logger.info(f"Etapa 2 - Enviando prompt para OpenAI (projeto ID: {project.get('id')})")
-                logger.debug(f"Prompt Etapa 2: {prompt_etapa2[:200]}...")
-                
-                # Chamar a API do ChatGPT para a segunda etapa
-                response_etapa2 = self.client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "Você é um assistente especializado em categorizar projetos de pesquisa e desenvolvimento industrial."},
-                        {"role": "user", "content": prompt_etapa2}
-                    ],
-                    temperature=0.3,
-                    max_tokens=800
+                # Chamar a API para a segunda etapa (só será executada se houver domínios afeitos outros)
+                result_etapa2 = self._request_etapa(
+                    ETAPA_2, self._etapa2_messages(project, result_etapa1, dominios_afeitos_outros), project.get('id')
                 )
                 
-                # Extrair a resposta da segunda etapa
-                ai_response_etapa2 = response_etapa2.choices[0].message.content.strip()
-                logger.info(f"Etapa 2 - Resposta recebida da OpenAI (projeto ID: {project.get('id')})")
-                logger.info(f"Resposta bruta da API (Etapa 2): {ai_response_etapa2}")
-                logger.debug(f"Resposta completa da API (Etapa 2): {response_etapa2}")
-                
-                # Processar a resposta da segunda etapa
-                result_etapa2 = self._parse_ai_response(ai_response_etapa2)
-                
                 # Validar os domínios afeitos outros
-                if result_etapa2 and "_aia_n3_dominio_outro" in result_etapa2:
+                if "error" not in result_etapa2:
                     result_etapa2 = self._validate_dominios_outros(result_etapa2, dominios_afeitos_outros)
                 
                 # Combinar os resultados das duas etapas
                 final_result = result_etapa1.copy()
-                if result_etapa2 and "_aia_n3_dominio_outro" in result_etapa2:
+                if "error" not in result_etapa2:
                     final_result["_aia_n3_dominio_outro"] = result_etapa2["_aia_n3_dominio_outro"]
+                    _notify_etapa(on_etapa, ETAPA_2, final_result)
                 
-                # ETAPA 3: Classificar Tecnologias Verdes
-                try:
-                    # Carregar dados de tecnologias verdes do banco de dados
-                    tecverde_classes = self._get_tecverde_classes()
-                    tecverde_subclasses = self._get_tecverde_subclasses()
-                    
-                    # Construir o prompt para a terceira etapa
-                    prompt_etapa3 = self._build_prompt_etapa3(project, tecverde_classes, tecverde_subclasses)
-                    logger.info(f"Etapa 3 - Enviando prompt para OpenAI (projeto ID: {project.get('id')})")
-                    logger.debug(f"Prompt Etapa 3: {prompt_etapa3[:200]}...")
-                    
-                    # Chamar a API do ChatGPT para a terceira etapa
-                    response_etapa3 = self.client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=[
-                            {"role": "system", "content": "Você é um assistente especializado em categorizar projetos de pesquisa com foco em tecnologias verdes."},
-                            {"role": "user", "content": prompt_etapa3}
-                        ],
-                        temperature=0.3,
-                        max_tokens=800
-                    )
-                    
-                    # Extrair a resposta da terceira etapa
-                    ai_response_etapa3 = response_etapa3.choices[0].message.content.strip()
-                    logger.info(f"Etapa 3 - Resposta recebida da OpenAI (projeto ID: {project.get('id')})")
-                    logger.info(f"Resposta bruta da API (Etapa 3): {ai_response_etapa3}")
-                    logger.debug(f"Resposta completa da API (Etapa 3): {response_etapa3}")
-                    
-                    # Processar a resposta da terceira etapa
-                    result_etapa3 = self._parse_ai_response(ai_response_etapa3)
-                    
-                    # Validar as classes e subclasses de tecnologias verdes
-                    if result_etapa3 and not "error" in result_etapa3:
-                        result_etapa3 = self._validate_tecverde(result_etapa3, tecverde_classes, tecverde_subclasses)
-                    
-                    # Combinar os resultados das três etapas
-                    if result_etapa3 and not "error" in result_etapa3:
-                        # Normalizar o valor de se_aplica para Boolean
-                        tecverde_se_aplica = self._normalize_se_aplica(result_etapa3.get("tecverde_se_aplica", ""))
-                        
-                        # Log para depuração do valor de tecverde_se_aplica
-                        logger.info(f"Valor original de tecverde_se_aplica da IA: {result_etapa3.get('tecverde_se_aplica', '')}, tipo: {type(result_etapa3.get('tecverde_se_aplica', ''))}")
-                        logger.info(f"Valor normalizado de tecverde_se_aplica: {tecverde_se_aplica}, tipo: {type(tecverde_se_aplica)}")
-                        
-                        final_result["tecverde_se_aplica"] = tecverde_se_aplica
-                        final_result["tecverde_classe"] = result_etapa3.get("tecverde_classe", "") if tecverde_se_aplica else ""
-                        final_result["tecverde_subclasse"] = result_etapa3.get("tecverde_subclasse", "") if tecverde_se_aplica else ""
-                        final_result["tecverde_confianca"] = result_etapa3.get("confianca", "MÉDIA")
-                        final_result["tecverde_justificativa"] = result_etapa3.get("justificativa", "")
-                except Exception as e:
-                    print(f"Erro na etapa 3 (Tecnologias Verdes): {str(e)}")
-                    # Se houver erro na etapa 3, continuar com os resultados das etapas 1 e 2
-                    final_result["tecverde_se_aplica"] = False
-                    final_result["tecverde_classe"] = ""
-                    final_result["tecverde_subclasse"] = ""
-                    final_result["tecverde_confianca"] = "BAIXA"
-                    final_result["tecverde_justificativa"] = f"Erro ao processar tecnologias verdes: {str(e)}"
+                # ETAPA 3: Classificar Tecnologias Verdes (aguardar a thread ou executar agora)
+                if etapa3_future is not None:
+                    result_tecverde = etapa3_future.result()
+                else:
+                    result_tecverde = self._run_etapa3(project)
+                    _notify_etapa(on_etapa, ETAPA_3, result_tecverde)
+                final_result.update(result_tecverde)
                 
                 # Adicionar timestamp
                 final_result["timestamp"] = datetime.now().isoformat()
@@ -690,9 +460,15 @@ class OpenAIClient:
                 # Salvar a sugestão no banco de dados
                 self._save_suggestion_to_db(project['id'], final_result)
                 
+                # Guardar no cache de sugestões
+                if cache_key:
+                    self._store_cached_suggestion(cache_key, project['id'], final_result)
+                
                 return final_result
                 
             except Exception as e:
+                if etapa3_future is not None:
+                    etapa3_future.cancel()
                 return {
                     "_aia_n1_macroarea": "",
                     "_aia_n2_segmento": "",
@@ -716,6 +492,305 @@ class OpenAIClient:
                 "timestamp": datetime.now().isoformat()
             }
     
+    def _submit_etapa3(self, project):
+        """
+        Dispara a Etapa 3 (Tecnologias Verdes) no executor compartilhado.
+        
+        Os dados de tecnologias verdes são lidos do banco na thread chamadora, que possui o
+        contexto da aplicação Flask; a thread do executor não acessa o banco de dados.
+        
+        Args:
+            project: Dicionário com informações do projeto
+            
+        Returns:
+            Future cujo resultado é o dicionário com os campos tecverde_*
+        """
+        try:
+            tecverde_classes = self._get_tecverde_classes()
+            tecverde_subclasses = self._get_tecverde_subclasses()
+        except Exception as e:
+            logger.error(f"Erro ao carregar tecnologias verdes para a etapa 3: {str(e)}")
+            future = Future()
+            future.set_result(self._etapa3_error_result(e))
+            return future
+        
+        return _get_etapa_executor().submit(
+            self._classify_tecverde, project, tecverde_classes, tecverde_subclasses
+        )
+    
+    def _run_etapa3(self, project):
+        """
+        Executa a Etapa 3 (Tecnologias Verdes) de forma síncrona.
+        
+        Args:
+            project: Dicionário com informações do projeto
+            
+        Returns:
+            Dicionário com os campos tecverde_*
+        """
+        try:
+            # Carregar dados de tecnologias verdes do banco de dados
+            tecverde_classes = self._get_tecverde_classes()
+            tecverde_subclasses = self._get_tecverde_subclasses()
+        except Exception as e:
+            logger.error(f"Erro ao carregar tecnologias verdes para a etapa 3: {str(e)}")
+            return self._etapa3_error_result(e)
+        
+        return self._classify_tecverde(project, tecverde_classes, tecverde_subclasses)
+    
+    def _classify_tecverde(self, project, tecverde_classes, tecverde_subclasses):
+        """
+        Chama a API para a Etapa 3 e valida a resposta. Não acessa o banco de dados,
+        podendo ser executado fora do contexto da aplicação.
+        
+        Args:
+            project: Dicionário com informações do projeto
+            tecverde_classes: Dicionário com as classes de tecnologias verdes
+            tecverde_subclasses: Dicionário com as subclasses de tecnologias verdes
+            
+        Returns:
+            Dicionário com os campos tecverde_* (vazio se a resposta da IA for inválida)
+        """
+        try:
+            # Chamar a API para a terceira etapa
+            result_etapa3 = self._request_etapa(
+                ETAPA_3, self._etapa3_messages(project, tecverde_classes, tecverde_subclasses), project.get('id')
+            )
+            return self._process_etapa3_result(result_etapa3, tecverde_classes, tecverde_subclasses)
+        except Exception as e:
+            print(f"Erro na etapa 3 (Tecnologias Verdes): {str(e)}")
+            # Se houver erro na etapa 3, continuar com os resultados das etapas 1 e 2
+            return self._etapa3_error_result(e)
+    
+    def classify_tecverde_batch(self, projects, batch_size=ETAPA3_BATCH_SIZE):
+        """
+        Classifica vários projetos em Tecnologias Verdes com o catálogo enviado uma vez por requisição.
+        
+        Os projetos são agrupados em lotes de batch_size; cada lote é uma única chamada cuja
+        resposta é uma lista de classificações identificadas pelo ID do projeto, validadas
+        individualmente como na Etapa 3. Projetos ausentes da resposta (ou o lote inteiro, se
+        a resposta for inválida) são classificados pela Etapa 3 individual.
+        
+        Args:
+            projects: Lista de dicionários com informações dos projetos (com 'id')
+            batch_size: Número de projetos por requisição (limitado a ETAPA3_MAX_BATCH_SIZE)
+            
+        Returns:
+            Dicionário ID do projeto -> campos tecverde_*
+        """
+        if not projects:
+            return {}
+        
+        try:
+            tecverde_classes = self._get_tecverde_classes()
+            tecverde_subclasses = self._get_tecverde_subclasses()
+        except Exception as e:
+            logger.error(f"Erro ao carregar tecnologias verdes para a etapa 3 em lote: {str(e)}")
+            return {project['id']: self._etapa3_error_result(e) for project in projects}
+        
+        batch_size = max(1, min(batch_size, ETAPA3_MAX_BATCH_SIZE))
+        lotes = [projects[i:i + batch_size] for i in range(0, len(projects), batch_size)]
+        
+        # Os lotes são independentes e usam apenas a API, então rodam no executor compartilhado
+        futures = [
+            _get_etapa_executor().submit(self._classify_tecverde_lote, lote, tecverde_classes, tecverde_subclasses)
+            for lote in lotes
+        ]
+        
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        return results
+    
+    def _classify_tecverde_lote(self, projects, tecverde_classes, tecverde_subclasses):
+        """
+        Chama a API para um lote da Etapa 3 e valida cada classificação.
+        
+        Args:
+            projects: Projetos do lote
+            tecverde_classes: Dicionário com as classes de tecnologias verdes
+            tecverde_subclasses: Dicionário com as subclasses de tecnologias verdes
+            
+        Returns:
+            Dicionário ID do projeto -> campos tecverde_*
+        """
+        results = {}
+        try:
+            result_lote = self._request_etapa(
+                ETAPA_3_LOTE,
+                self._etapa3_lote_messages(projects, tecverde_classes, tecverde_subclasses),
+                ",".join(str(project.get('id')) for project in projects),
+                max_tokens=ETAPA3_BATCH_TOKENS_PER_PROJECT * len(projects)
+            )
+            
+            if "error" not in result_lote:
+                por_id = {str(project.get('id')): project for project in projects}
+                for classificacao in result_lote["classificacoes"]:
+                    project = por_id.get(classificacao.pop("project_id"))
+                    if project is not None and project['id'] not in results:
+                        results[project['id']] = self._process_etapa3_result(
+                            classificacao, tecverde_classes, tecverde_subclasses
+                        )
+        except Exception as e:
+            logger.error(f"Erro na etapa 3 em lote: {str(e)}")
+        
+        # Projetos que a resposta do lote não cobriu: classificar individualmente
+        faltantes = [project for project in projects if project['id'] not in results]
+        if faltantes:
+            logger.warning(f"Etapa 3 em lote sem resultado para {len(faltantes)} projeto(s); classificando individualmente")
+        for project in faltantes:
+            results[project['id']] = self._classify_tecverde(project, tecverde_classes, tecverde_subclasses)
+        
+        return results
+    
+    def _process_etapa3_result(self, result_etapa3, tecverde_classes, tecverde_subclasses):
+        """
+        Converte a resposta analisada da Etapa 3 nos campos tecverde_* validados.
+        
+        Args:
+            result_etapa3: Dicionário retornado por _request_etapa ou _parse_etapa_response
+            tecverde_classes: Dicionário com as classes de tecnologias verdes
+            tecverde_subclasses: Dicionário com as subclasses de tecnologias verdes
+            
+        Returns:
+            Dicionário com os campos tecverde_* (vazio se a resposta da IA for inválida)
+        """
+        result_tecverde = {}
+        try:
+            # Validar as classes e subclasses de tecnologias verdes
+            if result_etapa3 and not "error" in result_etapa3:
+                result_etapa3 = self._validate_tecverde(result_etapa3, tecverde_classes, tecverde_subclasses)
+            
+            if result_etapa3 and not "error" in result_etapa3:
+                # Normalizar o valor de se_aplica para Boolean
+                tecverde_se_aplica = self._normalize_se_aplica(result_etapa3.get("tecverde_se_aplica", ""))
+                
+                # Log para depuração do valor de tecverde_se_aplica
+                logger.info(f"Valor original de tecverde_se_aplica da IA: {result_etapa3.get('tecverde_se_aplica', '')}, tipo: {type(result_etapa3.get('tecverde_se_aplica', ''))}")
+                logger.info(f"Valor normalizado de tecverde_se_aplica: {tecverde_se_aplica}, tipo: {type(tecverde_se_aplica)}")
+                
+                result_tecverde["tecverde_se_aplica"] = tecverde_se_aplica
+                result_tecverde["tecverde_classe"] = result_etapa3.get("tecverde_classe", "") if tecverde_se_aplica else ""
+                result_tecverde["tecverde_subclasse"] = result_etapa3.get("tecverde_subclasse", "") if tecverde_se_aplica else ""
+                result_tecverde["tecverde_confianca"] = result_etapa3.get("confianca", "MÉDIA")
+                result_tecverde["tecverde_justificativa"] = result_etapa3.get("justificativa", "")
+        except Exception as e:
+            print(f"Erro na etapa 3 (Tecnologias Verdes): {str(e)}")
+            # Se houver erro na etapa 3, continuar com os resultados das etapas 1 e 2
+            return self._etapa3_error_result(e)
+        
+        return result_tecverde
+    
+    def _etapa3_error_result(self, error):
+        """Retorna os campos tecverde_* usados quando a Etapa 3 falha."""
+        return {
+            "tecverde_se_aplica": False,
+            "tecverde_classe": "",
+            "tecverde_subclasse": "",
+            "tecverde_confianca": "BAIXA",
+            "tecverde_justificativa": f"Erro ao processar tecnologias verdes: {str(error)}"
+        }
+    
+    def _etapa1_messages(self, project, aia_data):
+        """Monta as mensagens da Etapa 1 (a taxonomia fica no prefixo, idêntico para todos os projetos)."""
+        return [
+            {"role": "system", "content": self._build_prompt_etapa1_prefix(aia_data)},
+            {"role": "user", "content": self._build_prompt_etapa1(project)}
+        ]
+    
+    def _etapa2_messages(self, project, result_etapa1, dominios_afeitos_outros):
+        """Monta as mensagens da Etapa 2 (seleção de Domínios Afeitos Outros)."""
+        return [
+            {"role": "system", "content": "Você é um assistente especializado em categorizar projetos de pesquisa e desenvolvimento industrial."},
+            {"role": "user", "content": self._build_prompt_etapa2(project, result_etapa1, dominios_afeitos_outros)}
+        ]
+    
+    def _etapa3_messages(self, project, tecverde_classes, tecverde_subclasses):
+        """Monta as mensagens da Etapa 3 (Tecnologias Verdes)."""
+        return [
+            {"role": "system", "content": "Você é um assistente especializado em categorizar projetos de pesquisa com foco em tecnologias verdes."},
+            {"role": "user", "content": self._build_prompt_etapa3(project, tecverde_classes, tecverde_subclasses)}
+        ]
+    
+    def _etapa3_lote_messages(self, projects, tecverde_classes, tecverde_subclasses):
+        """Monta as mensagens da Etapa 3 em lote (catálogo e regras no prefixo, projetos na mensagem do usuário)."""
+        return [
+            {"role": "system", "content": self._build_prompt_etapa3_lote(tecverde_classes, tecverde_subclasses)},
+            {"role": "user", "content": self._build_projects_etapa3_lote(projects)}
+        ]
+    
+    def _suggestion_cache_key(self, project, options):
+        """
+        Calcula a chave do cache de sugestões.
+        
+        Args:
+            project: Dicionário com informações do projeto
+            options: Opções de suggest_categories que influenciam o resultado
+            
+        Returns:
+            Hash SHA-256 em hexadecimal, ou None se a versão da taxonomia não estiver disponível
+        """
+        taxonomy_version = get_data_version(DOMINIO_TAXONOMIA)
+        if taxonomy_version is None or project.get('id') is None:
+            return None
+        
+        payload = {
+            "project": {field: " ".join(str(project.get(field) or "").split()) for field in PROJECT_PROMPT_FIELDS},
+            "taxonomy_version": taxonomy_version,
+            "prompt_version": PROMPT_TEMPLATE_VERSION,
+            "model": OPENAI_MODEL,
+            "options": options
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    
+    def has_cached_suggestion(self, project, taxonomy_mode=TAXONOMY_MODE_FULL, top_k=3,
+                              retrieval_top_n=None, retrieval_skip_threshold=None):
+        """
+        Verifica se suggest_categories (sem force e com a taxonomia do banco) retornaria o
+        resultado do cache de sugestões para o projeto, sem chamar a API.
+        
+        Args:
+            project: Dicionário com informações do projeto
+            taxonomy_mode, top_k, retrieval_top_n, retrieval_skip_threshold: Mesmas opções
+                passadas a suggest_categories
+            
+        Returns:
+            True se há um resultado armazenado para a entrada atual
+        """
+        cache_key = self._suggestion_cache_key(
+            project, _suggestion_cache_options(taxonomy_mode, top_k, retrieval_top_n, retrieval_skip_threshold)
+        )
+        return cache_key is not None and self._get_cached_suggestion(cache_key) is not None
+    
+    def _get_cached_suggestion(self, cache_key):
+        """Retorna o resultado armazenado para a chave, ou None."""
+        try:
+            entry = db.session.get(AISuggestionCache, cache_key)
+            if entry is None:
+                return None
+            return json.loads(entry.resultado)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao ler o cache de sugestões: {str(e)}")
+            return None
+    
+    def _store_cached_suggestion(self, cache_key, project_id, suggestion_data):
+        """Armazena o resultado de suggest_categories no cache de sugestões."""
+        try:
+            entry = db.session.get(AISuggestionCache, cache_key)
+            if entry is None:
+                entry = AISuggestionCache(chave=cache_key, id_projeto=project_id)
+                db.session.add(entry)
+            entry.modelo = OPENAI_MODEL
+            entry.resultado = json.dumps(suggestion_data, ensure_ascii=False)
+            entry.timestamp = datetime.now()
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao gravar o cache de sugestões: {str(e)}")
+            return False
+    
     def _save_suggestion_to_db(self, project_id, suggestion_data):
         """
         Salva a sugestão da IA no banco de dados.
@@ -733,45 +808,15 @@ class OpenAIClient:
             if suggestion:
                 # Atualizar sugestão existente
                 logger.info(f"Atualizando sugestão existente para o projeto ID: {project_id}")
-                suggestion.microarea = suggestion_data.get('_aia_n1_macroarea', '')
-                suggestion.segmento = suggestion_data.get('_aia_n2_segmento', '')
-                suggestion.dominio = suggestion_data.get('_aia_n3_dominio_afeito', '')
-                suggestion.dominio_outro = suggestion_data.get('_aia_n3_dominio_outro', '')
-                suggestion.confianca = suggestion_data.get('confianca', '')
-                suggestion.justificativa = suggestion_data.get('justificativa', '')
-                suggestion.tecverde_se_aplica = suggestion_data.get('tecverde_se_aplica', False)
-                suggestion.tecverde_classe = suggestion_data.get('tecverde_classe', '')
-                suggestion.tecverde_subclasse = suggestion_data.get('tecverde_subclasse', '')
-                suggestion.tecverde_confianca = suggestion_data.get('tecverde_confianca', '')
-                suggestion.tecverde_justificativa = suggestion_data.get('tecverde_justificativa', '')
-                suggestion.timestamp = datetime.now()
-                suggestion._aia_n1_macroarea = suggestion_data.get('_aia_n1_macroarea', '')
-                suggestion._aia_n2_segmento = suggestion_data.get('_aia_n2_segmento', '')
-                suggestion._aia_n3_dominio_afeito = suggestion_data.get('_aia_n3_dominio_afeito', '')
-                suggestion._aia_n3_dominio_outro = suggestion_data.get('_aia_n3_dominio_outro', '')
+                for column, value in suggestion_row_values(suggestion_data).items():
+                    setattr(suggestion, column, value)
             else:
                 # Criar nova sugestão
-                suggestion = AISuggestion(
-                    id_projeto=project_id,
-                    microarea=suggestion_data.get('_aia_n1_macroarea', ''),
-                    segmento=suggestion_data.get('_aia_n2_segmento', ''),
-                    dominio=suggestion_data.get('_aia_n3_dominio_afeito', ''),
-                    dominio_outro=suggestion_data.get('_aia_n3_dominio_outro', ''),
-                    confianca=suggestion_data.get('confianca', ''),
-                    justificativa=suggestion_data.get('justificativa', ''),
-                    tecverde_se_aplica=suggestion_data.get('tecverde_se_aplica', False),
-                    tecverde_classe=suggestion_data.get('tecverde_classe', ''),
-                    tecverde_subclasse=suggestion_data.get('tecverde_subclasse', ''),
-                    tecverde_confianca=suggestion_data.get('tecverde_confianca', ''),
-                    tecverde_justificativa=suggestion_data.get('tecverde_justificativa', ''),
-                    timestamp=datetime.now(),
-                    _aia_n1_macroarea=suggestion_data.get('_aia_n1_macroarea', ''),
-                    _aia_n2_segmento=suggestion_data.get('_aia_n2_segmento', ''),
-                    _aia_n3_dominio_afeito=suggestion_data.get('_aia_n3_dominio_afeito', ''),
-                    _aia_n3_dominio_outro=suggestion_data.get('_aia_n3_dominio_outro', '')
-                )
+                suggestion = AISuggestion(id_projeto=project_id, **suggestion_row_values(suggestion_data))
                 db.session.add(suggestion)
                 
+            refresh_classification_status([project_id])
+            bump_data_versions(DOMINIO_AI_SUGESTOES)
             db.session.commit()
             return True
         except Exception as e:
@@ -779,17 +824,16 @@ class OpenAIClient:
             print(f"Erro ao salvar sugestão no banco de dados: {str(e)}")
             return False
     
-    def _build_prompt_etapa3(self, project, tecverde_classes, tecverde_subclasses):
+    def _build_tecverde_catalog(self, tecverde_classes, tecverde_subclasses):
         """
-        Constrói o prompt para a terceira etapa: classificação de Tecnologias Verdes.
+        Monta a lista de classes e subclasses de tecnologias verdes usada nos prompts da Etapa 3.
         
         Args:
-            project: Dicionário com informações do projeto
             tecverde_classes: Dicionário com as classes de tecnologias verdes
             tecverde_subclasses: Dicionário com as subclasses de tecnologias verdes
             
         Returns:
-            String com o prompt formatado
+            String com uma linha por classe
         """
         tecverde_list = []
         
@@ -809,7 +853,110 @@ class OpenAIClient:
             
             tecverde_list.append(f"Classe: {classe} | Descrição: {descricao} | Subclasses: {subclasses_text}")
         
-        tecverde_text = "\n".join(tecverde_list)
+        return "\n".join(tecverde_list)
+    
+    def _build_prompt_etapa3_lote(self, tecverde_classes, tecverde_subclasses):
+        """
+        Constrói as instruções da Etapa 3 em lote (enviadas uma única vez por requisição).
+        
+        O catálogo de classes e subclasses e as regras são os mesmos da Etapa 3 individual;
+        os projetos vão em uma mensagem separada (_build_projects_etapa3_lote).
+        
+        Args:
+            tecverde_classes: Dicionário com as classes de tecnologias verdes
+            tecverde_subclasses: Dicionário com as subclasses de tecnologias verdes
+            
+        Returns:
+            String com o prompt formatado
+        """
+        tecverde_text = self._build_tecverde_catalog(tecverde_classes, tecverde_subclasses)
+        
+        prompt = f"""
+Você é um assistente especializado em classificar projetos de pesquisa em Tecnologias Verdes.
+
+A partir da definição de tecnologia verde como "tecnologias ambientalmente corretas que protegem o meio ambiente, são menos poluentes, usam os recursos de forma mais sustentável, reciclam mais seus resíduos e produtos, e lidam com os resíduos de forma mais aceitável do que as tecnologias que substituem" (Agenda 21, Capítulo 34), você receberá uma lista de projetos. Avalie CADA projeto de forma independente, em três etapas:
+
+Etapa 1 – Avaliação de elegibilidade como tecnologia verde:
+O projeto descrito é uma tecnologia verde segundo a definição acima?
+Decida com base nos critérios: proteção ambiental, menor poluição, uso sustentável de recursos, reciclagem, etc.
+
+Etapa 2 – Classificação por classe:
+Caso o projeto seja uma tecnologia verde, indique a classe do projeto, selecionando entre as classes fornecidas.
+
+Etapa 3 – Classificação por subclasse:
+Indique qual subclasse o projeto se encaixa dentro da classe escolhida.
+
+Lista de Classes e Subclasses:
+{tecverde_text}
+
+Regras:
+- Para a Etapa 1, responda APENAS "Sim" ou "Não".
+- Para a Etapa 2, a Classe escolhida DEVE existir na lista fornecida ACIMA. NÃO crie ou invente novas classes.
+- Para a Etapa 3, a Subclasse escolhida DEVE pertencer à Classe escolhida e DEVE estar listada ACIMA. NÃO crie ou invente novas subclasses.
+- Use EXATAMENTE os mesmos nomes das classes e subclasses como estão listados acima, sem alterações.
+- Classifique o grau de confiança: ALTA, MÉDIA ou BAIXA.
+- A justificativa deve ser clara e concisa (no máximo 2-3 frases).
+- Se a resposta for "Não", a justificativa DEVE explicar especificamente por que o projeto não atende aos critérios de tecnologia verde.
+- Se a resposta for "Sim", a justificativa deve explicar como o projeto contribui para os objetivos de tecnologia verde.
+- Retorne exatamente uma classificação para cada projeto, com o mesmo ID informado em "ID do Projeto".
+
+IMPORTANTE:
+Sua resposta deve ser APENAS um JSON válido no seguinte formato:
+
+{{
+    "classificacoes": [
+        {{
+            "project_id": "ID do projeto",
+            "tecverde_se_aplica": "Sim ou Não",
+            "tecverde_classe": "Nome da Classe escolhida (apenas se 'se_aplica' for 'Sim')",
+            "tecverde_subclasse": "Nome da Subclasse escolhida (apenas se 'se_aplica' for 'Sim')",
+            "confianca": "ALTA, MÉDIA ou BAIXA",
+            "justificativa": "Breve explicação da escolha, incluindo motivo específico quando não se aplica"
+        }}
+    ]
+}}
+
+Não adicione explicações fora do JSON.
+
+Para projetos relacionados a monitoramento e otimização de energia renovável, considere fortemente a classe "Gestão Ambiental" e a subclasse "Monitoramento ambiental", especialmente se o projeto contribui para a proteção ambiental e uso sustentável de recursos.
+"""
+        
+        return prompt.strip()
+    
+    def _build_projects_etapa3_lote(self, projects):
+        """
+        Constrói a mensagem com os projetos de um lote da Etapa 3.
+        
+        Args:
+            projects: Lista de dicionários com informações dos projetos
+            
+        Returns:
+            String com um bloco por projeto
+        """
+        blocos = []
+        for project in projects:
+            blocos.append(f"""ID do Projeto: {project.get('id')}
+Título: {project.get('titulo', '')}
+Título Público: {project.get('titulo_publico', '')}
+Objetivo: {project.get('objetivo', '')}
+Descrição Pública: {project.get('descricao_publica', '')}
+Tags: {project.get('tags', '')}""")
+        
+        return "Projetos:\n\n" + "\n\n---\n\n".join(blocos)
+
+    def _build_prompt_etapa3(self, project, tecverde_classes, tecverde_subclasses):
+        """
+        Constrói o prompt para a terceira etapa: classificação de Tecnologias Verdes.
+        
+        Args:
+            project: Dicionário com informações do projeto
+            tecverde_classes: Dicionário com as classes de tecnologias verdes
+            tecverde_subclasses: Dicionário com as subclasses de tecnologias verdes
+            
+        Returns:
+            String com o prompt formatado
+        """
+        tecverde_text = self._build_tecverde_catalog(tecverde_classes, tecverde_subclasses)
 
         prompt = f"""
 Você é um assistente especializado em classificar projetos de pesquisa em Tecnologias Verdes.
@@ -864,52 +1011,6 @@ Para projetos relacionados a monitoramento e otimização de energia renovável,
         
         return prompt.strip()
     
-    def _parse_ai_response(self, ai_response):
-        """
-        Analisa a resposta da IA e tenta extrair o JSON.
-        
-        Args:
-            ai_response: Resposta da IA em texto
-            
-        Returns:
-            Dicionário com os dados extraídos ou objeto de erro
-        """
-        logger.info("Analisando resposta da IA para extrair JSON")
-        try:
-            # Tentar analisar como JSON diretamente
-            result = json.loads(ai_response)
-            logger.info("Resposta da IA analisada com sucesso como JSON")
-            return result
-        except json.JSONDecodeError:
-            logger.warning("Falha ao analisar resposta como JSON diretamente, tentando extrair parte JSON")
-            # Tentar extrair apenas a parte JSON da resposta
-            start_idx = ai_response.find('{')
-            end_idx = ai_response.rfind('}') + 1
-            
-            if start_idx >= 0 and end_idx > 0:
-                json_str = ai_response[start_idx:end_idx]
-                try:
-                    result = json.loads(json_str)
-                    logger.info("JSON extraído com sucesso da resposta da IA")
-                    return result
-                except Exception as e:
-                    logger.error(f"Falha ao analisar JSON extraído: {str(e)}")
-            else:
-                logger.error("Não foi possível encontrar estrutura JSON na resposta da IA")
-            
-            # Retornar um objeto de erro se não conseguir extrair como JSON
-            error_result = {
-                "_aia_n1_macroarea": "",
-                "_aia_n2_segmento": "",
-                "_aia_n3_dominio_afeito": "",
-                "_aia_n3_dominio_outro": "",
-                "confianca": "BAIXA",
-                "justificativa": "Não foi possível processar a resposta da IA como JSON",
-                "error": "Não foi possível processar a resposta da IA como JSON"
-            }
-            logger.error(f"Retornando objeto de erro: {error_result}")
-            return error_result
-    
     def _get_dominios_afeitos_outros(self, macroarea, segmento, aia_data):
         """
         Gera a lista de Domínios Afeitos Outros (todos os domínios de outros segmentos da mesma microárea).
@@ -956,16 +1057,112 @@ Para projetos relacionados a monitoramento e otimização de energia renovável,
         logger.info(f"Domínios afeitos outros encontrados: {dominios_outros}")
         return dominios_outros
     
-    def _build_prompt_etapa1(self, project, aia_data=None):
+    def _narrow_aia_data(self, project, aia_data, top_k=3):
         """
-        Constrói o prompt para a primeira etapa: identificação de Micro Área, Segmento e Domínio.
+        Pré-seleciona os pares macroárea/segmento mais prováveis para o projeto.
+        
+        Faz uma chamada curta em que a IA vê apenas os nomes de macroáreas e segmentos
+        (sem domínios) e retorna até top_k candidatos.
         
         Args:
             project: Dicionário com informações do projeto
+            aia_data: Lista completa de categorias do AIA
+            top_k: Número máximo de candidatos
+            
+        Returns:
+            Sublista de aia_data com os candidatos (ou aia_data completo se a pré-seleção falhar)
+        """
+        try:
+            prefix = self._build_prompt_narrowing_prefix(aia_data, top_k)
+            prompt = self._build_prompt_etapa1(project)
+            
+            result = self._request_etapa(
+                PRE_SELECAO,
+                [
+                    {"role": "system", "content": prefix},
+                    {"role": "user", "content": prompt}
+                ],
+                project.get('id'),
+                max_tokens=300
+            )
+            candidatos = result.get("candidatos", [])
+            
+            # Indexar a taxonomia por (macroárea, segmento), sem diferenciar maiúsculas
+            por_par = {}
+            for item in aia_data:
+                chave = (item.get('Macroárea', '').strip().lower(), item.get('Segmento', '').strip().lower())
+                por_par.setdefault(chave, []).append(item)
+            
+            selecionados = []
+            for candidato in candidatos[:top_k]:
+                if not isinstance(candidato, dict):
+                    continue
+                chave = (str(candidato.get("_aia_n1_macroarea", "")).strip().lower(),
+                         str(candidato.get("_aia_n2_segmento", "")).strip().lower())
+                for item in por_par.pop(chave, []):
+                    selecionados.append(item)
+            
+            if not selecionados:
+                logger.warning("Pré-seleção hierárquica não retornou candidatos válidos. Usando a taxonomia completa.")
+                return aia_data
+            
+            logger.info(f"Pré-seleção hierárquica: {len(selecionados)} de {len(aia_data)} segmentos enviados à Etapa 1")
+            return selecionados
+        except Exception as e:
+            logger.error(f"Erro na pré-seleção hierárquica: {str(e)}. Usando a taxonomia completa.")
+            return aia_data
+    
+    def _build_prompt_narrowing_prefix(self, aia_data, top_k):
+        """
+        Constrói a mensagem de sistema da pré-seleção hierárquica (apenas macroáreas e segmentos).
+        
+        Args:
+            aia_data: Lista completa de categorias do AIA
+            top_k: Número máximo de candidatos
+            
+        Returns:
+            String com a mensagem de sistema
+        """
+        macroareas = {}
+        for item in aia_data or []:
+            segmentos = macroareas.setdefault(item.get('Macroárea'), [])
+            if item.get('Segmento') not in segmentos:
+                segmentos.append(item.get('Segmento'))
+        
+        taxonomia_text = ""
+        for macroarea, segmentos in macroareas.items():
+            taxonomia_text += f"Macroárea: {macroarea}\n"
+            for segmento in segmentos:
+                taxonomia_text += f"  Segmento: {segmento}\n"
+        
+        return f"""Você é um assistente especializado em categorizar projetos de pesquisa e desenvolvimento industrial.
+        
+        Com base nas informações do projeto enviado pelo usuário, selecione os {top_k} pares de Macroárea e Segmento mais prováveis entre as opções abaixo, do mais provável para o menos provável.
+        
+        {taxonomia_text}
+        Use EXATAMENTE os nomes listados acima. NÃO crie ou invente novas categorias.
+        
+        Forneça sua resposta APENAS em formato JSON válido com a seguinte estrutura:
+        {{
+            "candidatos": [
+                {{"_aia_n1_macroarea": "Nome da Macroárea", "_aia_n2_segmento": "Nome do Segmento"}}
+            ]
+        }}
+        """
+    
+    def _build_prompt_etapa1_prefix(self, aia_data=None):
+        """
+        Constrói a mensagem de sistema da primeira etapa: papel, taxonomia do AIA e instruções.
+        
+        O texto depende apenas da taxonomia, sendo idêntico byte a byte para todos os projetos.
+        Por isso ele vai no início da conversa, permitindo que o cache de prompt do provedor
+        reutilize esse prefixo entre chamadas; apenas a mensagem do usuário varia por projeto.
+        
+        Args:
             aia_data: Lista de categorias do arquivo aia.json (opcional)
             
         Returns:
-            String com o prompt formatado
+            String com a mensagem de sistema
         """
         # Construir a parte do prompt com as categorias do aia.json
         aia_categories_text = ""
@@ -1022,15 +1219,10 @@ Para projetos relacionados a monitoramento e otimização de energia renovável,
       - Integração com outras fontes renováveis
 """
         
-        # Construir o prompt principal
-        prompt_base = f"""
-        Com base nas informações do projeto abaixo, sugira as categorias mais apropriadas do AIA (Áreas de Interesse Aplicado):
+        # Papel do assistente
+        prompt_papel = """Você é um assistente especializado em categorizar projetos de pesquisa e desenvolvimento industrial.
         
-        Título do Projeto: {project.get('titulo', '')}
-        Título Público: {project.get('titulo_publico', '')}
-        Objetivo: {project.get('objetivo', '')}
-        Descrição Pública: {project.get('descricao_publica', '')}
-        Tags: {project.get('tags', '')}
+        Com base nas informações do projeto enviado pelo usuário, sugira as categorias mais apropriadas do AIA (Áreas de Interesse Aplicado) listadas abaixo.
         """
         
         # Adicionar as categorias ao prompt
@@ -1067,10 +1259,28 @@ Para projetos relacionados a monitoramento e otimização de energia renovável,
         Para projetos relacionados a monitoramento e otimização de energia renovável em edifícios, considere fortemente a macroárea "Energia renovável", o segmento "Energia solar fotovoltaica" e o domínio "Integração com edificações e infraestrutura urbana".
         """
         
-        # Combinar todas as partes do prompt
-        prompt = prompt_base + prompt_categorias + prompt_instrucoes
+        # Combinar todas as partes do prefixo
+        return prompt_papel + prompt_categorias + prompt_instrucoes
+    
+    def _build_prompt_etapa1(self, project):
+        """
+        Constrói a mensagem do usuário da primeira etapa: apenas os dados do projeto.
         
-        return prompt
+        Args:
+            project: Dicionário com informações do projeto
+            
+        Returns:
+            String com o prompt formatado
+        """
+        return f"""
+        Classifique o projeto abaixo nas categorias do AIA (Áreas de Interesse Aplicado):
+        
+        Título do Projeto: {project.get('titulo', '')}
+        Título Público: {project.get('titulo_publico', '')}
+        Objetivo: {project.get('objetivo', '')}
+        Descrição Pública: {project.get('descricao_publica', '')}
+        Tags: {project.get('tags', '')}
+        """
     
     def _build_prompt_etapa2(self, project, result_etapa1, dominios_afeitos_outros):
         """
@@ -1223,47 +1433,36 @@ Para projetos relacionados a monitoramento e otimização de energia renovável,
             result["tecverde_subclasse"] = ""
             return result
         
+        # Índice construído uma vez por versão da taxonomia
+        index = get_tecverde_validation_index(tecverde_classes, tecverde_subclasses)
+        
         # Validar a classe
-        if tecverde_classe and tecverde_classe not in tecverde_classes:
-            logger.warning(f"Classe de tecnologia verde '{tecverde_classe}' não está na lista de classes disponíveis")
-            # Tentar encontrar a classe mais próxima
-            if tecverde_classes:
-                # Usar a primeira classe disponível como fallback
-                classe_corrigida = next(iter(tecverde_classes.keys()))
-                logger.info(f"Substituindo classe '{tecverde_classe}' por '{classe_corrigida}'")
-                result["tecverde_classe"] = classe_corrigida
-                tecverde_classe = classe_corrigida
-            else:
-                logger.error("Nenhuma classe de tecnologia verde disponível para substituição")
-                result["tecverde_classe"] = ""
+        if tecverde_classe:
+            classe_corrigida, tipo = index.classes.match(tecverde_classe)
+            if classe_corrigida is None and tecverde_subclasse:
+                # Deduzir a classe a partir da subclasse, se ela pertence a uma única classe
+                classes_da_subclasse = [classe for classe, subclasses in index.subclasses.items()
+                                        if subclasses.match(tecverde_subclasse)[0] is not None]
+                classe_corrigida = classes_da_subclasse[0] if len(classes_da_subclasse) == 1 else None
+                tipo = 'pela subclasse'
+            if classe_corrigida is None:
+                logger.warning(f"Classe de tecnologia verde '{tecverde_classe}' não está na lista de classes disponíveis e não há nenhuma próxima")
                 tecverde_classe = ""
+            elif classe_corrigida != tecverde_classe:
+                logger.info(f"Substituindo classe '{tecverde_classe}' por '{classe_corrigida}' (correspondência {tipo})")
+                tecverde_classe = classe_corrigida
+            result["tecverde_classe"] = tecverde_classe
         
         # Validar a subclasse (apenas se temos uma classe válida)
         if tecverde_classe and tecverde_subclasse:
-            # Obter as subclasses disponíveis para a classe
-            subclasses_da_classe = []
-            if tecverde_classe in tecverde_subclasses:
-                subclasses = tecverde_subclasses[tecverde_classe]
-                if isinstance(subclasses, str):
-                    if ';' in subclasses:
-                        subclasses_da_classe = [s.strip() for s in subclasses.split(';') if s.strip()]
-                    elif ',' in subclasses:
-                        subclasses_da_classe = [s.strip() for s in subclasses.split(',') if s.strip()]
-                    else:
-                        subclasses_da_classe = [subclasses.strip()]
-            
-            # Verificar se a subclasse está na lista de subclasses disponíveis
-            if tecverde_subclasse not in subclasses_da_classe:
-                logger.warning(f"Subclasse de tecnologia verde '{tecverde_subclasse}' não está na lista de subclasses disponíveis para a classe '{tecverde_classe}'")
-                # Tentar encontrar a subclasse mais próxima
-                if subclasses_da_classe:
-                    # Usar a primeira subclasse disponível como fallback
-                    subclasse_corrigida = subclasses_da_classe[0]
-                    logger.info(f"Substituindo subclasse '{tecverde_subclasse}' por '{subclasse_corrigida}'")
-                    result["tecverde_subclasse"] = subclasse_corrigida
-                else:
-                    logger.error(f"Nenhuma subclasse de tecnologia verde disponível para a classe '{tecverde_classe}'")
-                    result["tecverde_subclasse"] = ""
+            subclasses_da_classe = index.subclasses.get(tecverde_classe)
+            subclasse_corrigida, tipo = subclasses_da_classe.match(tecverde_subclasse) if subclasses_da_classe else (None, None)
+            if subclasse_corrigida is None:
+                logger.warning(f"Subclasse de tecnologia verde '{tecverde_subclasse}' não está na lista de subclasses disponíveis para a classe '{tecverde_classe}' e não há nenhuma próxima")
+                subclasse_corrigida = ""
+            elif subclasse_corrigida != tecverde_subclasse:
+                logger.info(f"Substituindo subclasse '{tecverde_subclasse}' por '{subclasse_corrigida}' (correspondência {tipo})")
+            result["tecverde_subclasse"] = subclasse_corrigida
         
         logger.info(f"Tecnologias verdes validadas: {json.dumps({k: result.get(k, '') for k in ['tecverde_se_aplica', 'tecverde_classe', 'tecverde_subclasse']}, indent=2, ensure_ascii=False)}")
         return result
@@ -1295,17 +1494,18 @@ Para projetos relacionados a monitoramento e otimização de energia renovável,
             result["_aia_n3_dominio_outro"] = "N/A"
             return result
         
-        # Validar os domínios afeitos outros
+        # Validar os domínios afeitos outros (aceitando variações de acentos, maiúsculas e grafia)
+        vocabulario = FuzzyVocabulary(dominios_afeitos_outros)
         dominios_outros_validados = []
         
         # Dividir os domínios afeitos outros retornados pela IA
         dominios_outros_list = dominios_outros.split(';')
         for dominio in dominios_outros_list:
-            dominio = dominio.strip()
-            if dominio and dominio in dominios_afeitos_outros:
-                dominios_outros_validados.append(dominio)
-            else:
-                logger.warning(f"Domínio afeito outro '{dominio}' não está na lista de domínios disponíveis")
+            dominio_corrigido, _ = vocabulario.match(dominio)
+            if dominio_corrigido is None:
+                logger.warning(f"Domínio afeito outro '{dominio.strip()}' não está na lista de domínios disponíveis")
+            elif dominio_corrigido not in dominios_outros_validados:
+                dominios_outros_validados.append(dominio_corrigido)
         
         # Atualizar o resultado com os domínios validados
         if dominios_outros_validados:
@@ -1320,7 +1520,8 @@ Para projetos relacionados a monitoramento e otimização de energia renovável,
     def _validate_categories(self, result, aia_data):
         """
         Valida se as categorias retornadas pela IA estão na lista de categorias permitidas.
-        Se não estiverem, tenta encontrar a categoria mais próxima ou retorna uma mensagem de erro.
+        Se não estiverem, usa a categoria válida mais próxima (sem acentos/maiúsculas ou por
+        similaridade de trigramas); sem nenhuma próxima, o campo fica vazio.
         
         Args:
             result: Dicionário com as categorias retornadas pela IA
@@ -1329,105 +1530,65 @@ Para projetos relacionados a monitoramento e otimização de energia renovável,
         Returns:
             Dicionário com as categorias validadas
         """
-        logger.info("Validando categorias retornadas pela IA")
-        
         # Se não temos dados de AIA, não podemos validar
         if not aia_data:
             logger.warning("Sem dados de AIA para validar categorias")
             return result
         
+        # Índice construído uma vez por versão da taxonomia
+        index = get_taxonomy_validation_index(aia_data)
+        
         # Extrair as categorias retornadas pela IA
         macroarea = result.get("_aia_n1_macroarea", "")
         segmento = result.get("_aia_n2_segmento", "")
         dominio_afeito = result.get("_aia_n3_dominio_afeito", "")
         
-        # Coletar todas as macroáreas, segmentos e domínios disponíveis
-        macroareas_disponiveis = set()
-        segmentos_disponiveis = {}  # Mapeamento de macroárea para seus segmentos
-        dominios_disponiveis = {}   # Mapeamento de segmento para seus domínios
-        
-        # Log para depuração
-        logger.info(f"Validando contra {len(aia_data)} categorias disponíveis")
-        
-        for item in aia_data:
-            item_macroarea = item.get('Macroárea', '')
-            item_segmento = item.get('Segmento', '')
-            
-            if item_macroarea:
-                macroareas_disponiveis.add(item_macroarea)
-                
-                if item_macroarea not in segmentos_disponiveis:
-                    segmentos_disponiveis[item_macroarea] = set()
-                
-                if item_segmento:
-                    segmentos_disponiveis[item_macroarea].add(item_segmento)
-                    
-                    if item_segmento not in dominios_disponiveis:
-                        dominios_disponiveis[item_segmento] = set()
-                    
-                    dominios = item.get('Domínios Afeitos', '').split(';')
-                    for dominio in dominios:
-                        dominio = dominio.strip()
-                        if dominio:
-                            dominios_disponiveis[item_segmento].add(dominio)
-        
-        # Log para depuração
-        logger.info(f"Macroáreas disponíveis: {macroareas_disponiveis}")
-        
         # Validar a macroárea
-        if macroarea and macroarea not in macroareas_disponiveis:
-            logger.warning(f"Macroárea '{macroarea}' não está na lista de macroáreas disponíveis")
-            
-            # Tentar encontrar a macroárea mais próxima
-            if macroareas_disponiveis:
-                # Usar a primeira macroárea disponível como fallback
-                macroarea_corrigida = next(iter(macroareas_disponiveis))
-                logger.info(f"Substituindo macroárea '{macroarea}' por '{macroarea_corrigida}'")
-                result["_aia_n1_macroarea"] = macroarea_corrigida
-                macroarea = macroarea_corrigida
-            else:
-                logger.error("Nenhuma macroárea disponível para substituição")
-                result["_aia_n1_macroarea"] = ""
-                macroarea = ""
-        
-        # Log para depuração
         if macroarea:
-            logger.info(f"Segmentos disponíveis para macroárea '{macroarea}': {segmentos_disponiveis.get(macroarea, set())}")
+            macroarea_corrigida, tipo = index.macroareas.match(macroarea)
+            if macroarea_corrigida is None and segmento:
+                # Deduzir a macroárea a partir do segmento, se ele pertence a uma única macroárea
+                segmento_global, _ = index.todos_segmentos.match(segmento)
+                macroarea_corrigida = index.macroarea_do_segmento(segmento_global) if segmento_global else None
+                tipo = 'pelo segmento'
+            if macroarea_corrigida is None:
+                logger.warning(f"Macroárea '{macroarea}' não está na lista de macroáreas disponíveis e não há nenhuma próxima")
+                macroarea = ""
+            elif macroarea_corrigida != macroarea:
+                logger.info(f"Substituindo macroárea '{macroarea}' por '{macroarea_corrigida}' (correspondência {tipo})")
+                macroarea = macroarea_corrigida
+            result["_aia_n1_macroarea"] = macroarea
         
         # Validar o segmento (apenas se temos uma macroárea válida)
         if macroarea and segmento:
-            segmentos_da_macroarea = segmentos_disponiveis.get(macroarea, set())
-            if segmento not in segmentos_da_macroarea:
-                logger.warning(f"Segmento '{segmento}' não está na lista de segmentos disponíveis para a macroárea '{macroarea}'")
-                # Tentar encontrar o segmento mais próximo
-                if segmentos_da_macroarea:
-                    # Usar o primeiro segmento disponível como fallback
-                    segmento_corrigido = next(iter(segmentos_da_macroarea))
-                    logger.info(f"Substituindo segmento '{segmento}' por '{segmento_corrigido}'")
-                    result["_aia_n2_segmento"] = segmento_corrigido
-                    segmento = segmento_corrigido
-                else:
-                    logger.error(f"Nenhum segmento disponível para a macroárea '{macroarea}'")
-                    result["_aia_n2_segmento"] = ""
-                    segmento = ""
-        
-        # Log para depuração
-        if segmento:
-            logger.info(f"Domínios disponíveis para segmento '{segmento}': {dominios_disponiveis.get(segmento, set())}")
+            segmentos_da_macroarea = index.segmentos.get(macroarea)
+            segmento_corrigido, tipo = segmentos_da_macroarea.match(segmento) if segmentos_da_macroarea else (None, None)
+            if segmento_corrigido is None:
+                logger.warning(f"Segmento '{segmento}' não está na lista de segmentos disponíveis para a macroárea '{macroarea}' e não há nenhum próximo")
+                segmento = ""
+            elif segmento_corrigido != segmento:
+                logger.info(f"Substituindo segmento '{segmento}' por '{segmento_corrigido}' (correspondência {tipo})")
+                segmento = segmento_corrigido
+            result["_aia_n2_segmento"] = segmento
         
         # Validar os domínios afeitos (apenas se temos um segmento válido)
         if segmento and dominio_afeito:
-            dominios_do_segmento = dominios_disponiveis.get(segmento, set())
+            dominios_do_segmento = index.dominios.get((macroarea, segmento))
             dominios_afeitos_validados = []
             
             # Dividir os domínios afeitos retornados pela IA
-            dominios_afeitos = dominio_afeito.split(';')
-            for dominio in dominios_afeitos:
+            for dominio in dominio_afeito.split(';'):
                 dominio = dominio.strip()
-                if dominio and dominio in dominios_do_segmento:
-                    dominios_afeitos_validados.append(dominio)
-                else:
+                if not dominio:
+                    continue
+                dominio_corrigido, tipo = dominios_do_segmento.match(dominio) if dominios_do_segmento else (None, None)
+                if dominio_corrigido is None:
                     logger.warning(f"Domínio '{dominio}' não está na lista de domínios disponíveis para o segmento '{segmento}'")
+                    continue
+                if dominio_corrigido != dominio:
+                    logger.info(f"Substituindo domínio '{dominio}' por '{dominio_corrigido}' (correspondência {tipo})")
+                if dominio_corrigido not in dominios_afeitos_validados:
+                    dominios_afeitos_validados.append(dominio_corrigido)
             
             # Atualizar o resultado com os domínios validados
             if dominios_afeitos_validados:
@@ -0,0 +1,168 @@
+import json
+from collections import namedtuple
+
+# Nomes das chamadas à IA que possuem esquema de resposta
+ETAPA_1 = 'etapa1'
+ETAPA_2 = 'etapa2'
+ETAPA_3 = 'etapa3'
+ETAPA_3_LOTE = 'etapa3_lote'
+PRE_SELECAO = 'pre_selecao'
+
+CONFIANCA_VALUES = ["ALTA", "MÉDIA", "BAIXA"]
+
+
+def _object_schema(properties):
+    """Esquema de objeto no formato exigido pelo modo estrito (todos os campos obrigatórios, sem extras)."""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+_ETAPA_3_PROPERTIES = {
+    "tecverde_se_aplica": {"type": "string", "enum": ["Sim", "Não"]},
+    "tecverde_classe": {"type": "string"},
+    "tecverde_subclasse": {"type": "string"},
+    "confianca": {"type": "string", "enum": CONFIANCA_VALUES},
+    "justificativa": {"type": "string"}
+}
+
+# Esquemas JSON das respostas, enviados em response_format (structured outputs)
+RESPONSE_SCHEMAS = {
+    ETAPA_1: _object_schema({
+        "_aia_n1_macroarea": {"type": "string"},
+        "_aia_n2_segmento": {"type": "string"},
+        "_aia_n3_dominio_afeito": {"type": "string"},
+        "confianca": {"type": "string", "enum": CONFIANCA_VALUES},
+        "justificativa": {"type": "string"}
+    }),
+    ETAPA_2: _object_schema({
+        "_aia_n3_dominio_outro": {"type": "string"}
+    }),
+    ETAPA_3: _object_schema(_ETAPA_3_PROPERTIES),
+    # Etapa 3 em lote: uma classificação por projeto, identificada pelo ID do projeto
+    ETAPA_3_LOTE: _object_schema({
+        "classificacoes": {
+            "type": "array",
+            "items": _object_schema(dict({"project_id": {"type": "string"}}, **_ETAPA_3_PROPERTIES))
+        }
+    }),
+    PRE_SELECAO: _object_schema({
+        "candidatos": {
+            "type": "array",
+            "items": _object_schema({
+                "_aia_n1_macroarea": {"type": "string"},
+                "_aia_n2_segmento": {"type": "string"}
+            })
+        }
+    })
+}
+
+# Chaves do resultado de suggest_categories -> colunas de AISuggestion que recebem o valor
+SUGGESTION_COLUMNS = {
+    "_aia_n1_macroarea": ("microarea", "_aia_n1_macroarea"),
+    "_aia_n2_segmento": ("segmento", "_aia_n2_segmento"),
+    "_aia_n3_dominio_afeito": ("dominio", "_aia_n3_dominio_afeito"),
+    "_aia_n3_dominio_outro": ("dominio_outro", "_aia_n3_dominio_outro"),
+    "confianca": ("confianca",),
+    "justificativa": ("justificativa",),
+    "tecverde_se_aplica": ("tecverde_se_aplica",),
+    "tecverde_classe": ("tecverde_classe",),
+    "tecverde_subclasse": ("tecverde_subclasse",),
+    "tecverde_confianca": ("tecverde_confianca",),
+    "tecverde_justificativa": ("tecverde_justificativa",)
+}
+
+_JSON_TYPES = {"string": str, "array": list, "object": dict}
+
+# Regra de validação de um campo, compilada a partir do esquema
+_FieldRule = namedtuple('_FieldRule', ['name', 'python_type', 'enum', 'items'])
+
+
+class StructuredOutputError(ValueError):
+    """Resposta da IA que não é um JSON válido segundo o esquema da etapa."""
+
+
+def _compile(schema):
+    """Converte um esquema de objeto em uma tupla de regras, avaliada sem interpretar o esquema."""
+    rules = []
+    for name, spec in schema["properties"].items():
+        enum = None
+        if "enum" in spec:
+            # Comparação sem diferenciar maiúsculas, devolvendo o valor canônico
+            enum = {value.upper(): value for value in spec["enum"]}
+        items = _compile(spec["items"]) if spec.get("type") == "array" and spec["items"].get("type") == "object" else None
+        rules.append(_FieldRule(name, _JSON_TYPES[spec["type"]], enum, items))
+    return tuple(rules)
+
+
+_VALIDATORS = {etapa: _compile(schema) for etapa, schema in RESPONSE_SCHEMAS.items()}
+
+
+def response_format(etapa):
+    """
+    Retorna o parâmetro response_format da API para a etapa.
+
+    Args:
+        etapa: ETAPA_1, ETAPA_2, ETAPA_3, ETAPA_3_LOTE ou PRE_SELECAO
+
+    Returns:
+        Dicionário json_schema em modo estrito
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"resposta_{etapa}",
+            "strict": True,
+            "schema": RESPONSE_SCHEMAS[etapa]
+        }
+    }
+
+
+def _validate(rules, data, path):
+    if not isinstance(data, dict):
+        raise StructuredOutputError(f"{path or 'resposta'}: esperado um objeto JSON")
+
+    result = {}
+    for rule in rules:
+        if rule.name not in data:
+            raise StructuredOutputError(f"campo obrigatório ausente: {path}{rule.name}")
+        value = data[rule.name]
+        if not isinstance(value, rule.python_type):
+            raise StructuredOutputError(f"campo {path}{rule.name}: tipo inválido ({type(value).__name__})")
+
+        if rule.python_type is str:
+            value = value.strip()
+            if rule.enum is not None:
+                canonical = rule.enum.get(value.upper())
+                if canonical is None:
+                    raise StructuredOutputError(f"campo {path}{rule.name}: valor '{value}' fora de {sorted(rule.enum.values())}")
+                value = canonical
+        elif rule.items is not None:
+            value = [_validate(rule.items, item, f"{path}{rule.name}[{i}].") for i, item in enumerate(value)]
+
+        result[rule.name] = value
+    return result
+
+
+def parse_structured_response(etapa, ai_response):
+    """
+    Analisa a resposta da IA de uma etapa: json.loads direto e validação pelas regras pré-compiladas.
+
+    Não tenta recortar JSON de dentro de texto livre; respostas fora do esquema geram
+    StructuredOutputError para que a etapa seja reparada.
+
+    Args:
+        etapa: ETAPA_1, ETAPA_2, ETAPA_3, ETAPA_3_LOTE ou PRE_SELECAO
+        ai_response: Texto da resposta da IA
+
+    Returns:
+        Dicionário apenas com os campos do esquema (strings sem espaços nas pontas, enums canônicos)
+    """
+    try:
+        data = json.loads(ai_response)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise StructuredOutputError(f"JSON inválido: {str(e)}")
+    return _validate(_VALIDATORS[etapa], data, "")
@@ -0,0 +1,383 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from openai.types.chat import ChatCompletion
+from app.models import AISuggestion, Projeto, db
+from app.data_versions import DOMINIO_AI_SUGESTOES, bump_data_versions
+from app.classification_status import refresh_classification_status
+from app.ai_integration import OPENAI_MODEL, PROMPT_TEMPLATE_VERSION, suggestion_row_values
+from app.ai_schemas import ETAPA_1, ETAPA_2, ETAPA_3, response_format
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Parâmetros da Batch API da OpenAI
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# Fases da classificação em lote, na ordem em que são executadas
+FASE_ETAPAS_1_3 = 'etapas_1_3'
+FASE_ETAPA_2 = 'etapa_2'
+FASE_GRAVACAO = 'gravacao'
+FASE_CONCLUIDO = 'concluido'
+
+# Número máximo de ids por cláusula IN na gravação em massa
+UPSERT_CHUNK_SIZE = 500
+
+
+class BatchClassificationError(Exception):
+    """Erro que interrompe a classificação em lote (ex.: lote terminado com status failed ou expired)."""
+
+
+class BatchClassifier:
+    """
+    Classifica muitos projetos pela Batch API da OpenAI, sem exigir respostas imediatas.
+
+    Fluxo:
+        1. As requisições das Etapas 1 e 3 de todos os projetos vão em um único arquivo JSONL
+           submetido como lote; o lote é acompanhado até terminar.
+        2. Para os projetos cuja Etapa 1 exige a Etapa 2, um segundo lote é submetido.
+        3. As sugestões finais são gravadas em massa em AISuggestion.
+
+    O progresso (ids dos arquivos e lotes, resultados intermediários e fase atual) é gravado em
+    um arquivo de estado após cada passo; se o processo for interrompido, uma nova execução com
+    o mesmo arquivo de estado retoma do ponto em que parou sem submeter os lotes novamente.
+
+    Os prompts, a validação e o processamento das respostas são os mesmos de
+    OpenAIClient.suggest_categories (taxonomia completa na Etapa 1).
+    """
+
+    def __init__(self, openai_client, state_file, poll_interval=60, batch_client=None,
+                 temperature=0.3, max_tokens=800):
+        """
+        Args:
+            openai_client: Instância de OpenAIClient (prompts, validação e contagem de tokens)
+            state_file: Caminho do arquivo JSON de estado usado para retomar a execução
+            poll_interval: Intervalo em segundos entre as consultas de status do lote
+            batch_client: Cliente com as operações files.create, files.content, batches.create e
+                          batches.retrieve (padrão: o cliente OpenAI de openai_client)
+            temperature: Temperatura do modelo em todas as requisições
+            max_tokens: Número máximo de tokens em cada resposta
+        """
+        self.openai_client = openai_client
+        self.batch_client = batch_client or openai_client.client
+        self.state_file = state_file
+        self.poll_interval = poll_interval
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.state = None
+
+    def run(self, projects, save=True):
+        """
+        Classifica os projetos, retomando uma execução anterior inacabada se houver.
+
+        Deve ser chamado dentro do contexto da aplicação (taxonomia e gravação no banco).
+
+        Args:
+            projects: Lista de dicionários de projeto (com 'id' e os campos dos prompts); ignorada
+                      quando uma execução inacabada é retomada do arquivo de estado
+            save: Se True, grava as sugestões em AISuggestion ao final. Uma execução retomada só
+                  grava se também tiver sido iniciada com save=True
+
+        Returns:
+            Tupla (resultados, erros): dicionários id do projeto (str) -> sugestão / mensagem de erro
+        """
+        self.state = self._load_state()
+        if self.state and self.state.get('fase') != FASE_CONCLUIDO:
+            logger.info(f"Retomando classificação em lote na fase '{self.state['fase']}' "
+                        f"({len(self.state['projetos'])} projetos) a partir de {self.state_file}")
+            if save and not self.state.get('gravar', True):
+                logger.warning("A execução retomada foi iniciada sem gravação; as sugestões não serão gravadas")
+            save = save and self.state.get('gravar', True)
+        else:
+            self.state = self._new_state(projects, save)
+            self._save_state()
+
+        aia_data = self.openai_client._get_aia_data_from_db()
+        tecverde_classes = self.openai_client._get_tecverde_classes()
+        tecverde_subclasses = self.openai_client._get_tecverde_subclasses()
+
+        if self.state['fase'] == FASE_ETAPAS_1_3:
+            outputs = self._run_batch(FASE_ETAPAS_1_3, lambda: self._etapas_1_3_requests(aia_data, tecverde_classes, tecverde_subclasses))
+            self._process_etapas_1_3(outputs, aia_data, tecverde_classes, tecverde_subclasses)
+            self.state['fase'] = FASE_ETAPA_2
+            self._save_state()
+
+        if self.state['fase'] == FASE_ETAPA_2:
+            if self.state['pendentes_etapa2']:
+                outputs = self._run_batch(FASE_ETAPA_2, self._etapa2_requests)
+                self._process_etapa2(outputs)
+            self._merge_results()
+            self.state['fase'] = FASE_GRAVACAO
+            self._save_state()
+
+        if self.state['fase'] == FASE_GRAVACAO:
+            if save:
+                saved = bulk_upsert_suggestions(self.state['resultados'])
+                logger.info(f"{saved} sugestões gravadas em massa")
+            self.state['fase'] = FASE_CONCLUIDO
+            self._save_state()
+
+        return self.state['resultados'], self.state['erros']
+
+    def _new_state(self, projects, save):
+        """Cria o estado inicial de uma nova execução."""
+        return {
+            "fase": FASE_ETAPAS_1_3,
+            "gravar": save,
+            "modelo": OPENAI_MODEL,
+            "versao_prompt": PROMPT_TEMPLATE_VERSION,
+            "criado_em": datetime.now().isoformat(),
+            "projetos": {str(project['id']): project for project in projects},
+            "lotes": {},
+            "etapa1": {},
+            "etapa3": {},
+            "pendentes_etapa2": {},
+            "etapa2": {},
+            "resultados": {},
+            "erros": {}
+        }
+
+    def _load_state(self):
+        """Lê o arquivo de estado, ou retorna None se ele não existir."""
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_state(self):
+        """Grava o arquivo de estado de forma atômica (arquivo temporário + rename)."""
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.state_file)
+
+    def _request_line(self, etapa, project_id, messages):
+        """Monta uma linha do arquivo JSONL de entrada da Batch API (com o esquema JSON da etapa)."""
+        return {
+            "custom_id": f"{etapa}:{project_id}",
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": OPENAI_MODEL,
+                "messages": messages,
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "response_format": response_format(etapa)
+            }
+        }
+
+    def _etapas_1_3_requests(self, aia_data, tecverde_classes, tecverde_subclasses):
+        """Requisições das Etapas 1 e 3 de todos os projetos."""
+        requests = []
+        for project_id, project in self.state['projetos'].items():
+            requests.append(self._request_line(ETAPA_1, project_id, self.openai_client._etapa1_messages(project, aia_data)))
+            requests.append(self._request_line(ETAPA_3, project_id, self.openai_client._etapa3_messages(project, tecverde_classes, tecverde_subclasses)))
+        return requests
+
+    def _etapa2_requests(self):
+        """Requisições da Etapa 2 dos projetos que possuem Domínios Afeitos Outros."""
+        return [
+            self._request_line(
+                ETAPA_2, project_id,
+                self.openai_client._etapa2_messages(self.state['projetos'][project_id], self.state['etapa1'][project_id], dominios)
+            )
+            for project_id, dominios in self.state['pendentes_etapa2'].items()
+        ]
+
+    def _run_batch(self, nome, build_requests):
+        """
+        Submete um lote (se ainda não foi submetido), aguarda o término e baixa as respostas.
+
+        Args:
+            nome: Nome do lote no arquivo de estado
+            build_requests: Função que retorna as linhas do arquivo JSONL de entrada
+
+        Returns:
+            Dicionário custom_id -> (conteúdo da resposta ou None, mensagem de erro ou None)
+        """
+        lote = self.state['lotes'].setdefault(nome, {})
+
+        if not lote.get('input_file_id'):
+            input_path = f"{self.state_file}.{nome}.jsonl"
+            requests = build_requests()
+            with open(input_path, 'w', encoding='utf-8') as f:
+                for request in requests:
+                    f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            with open(input_path, 'rb') as f:
+                input_file = self.batch_client.files.create(file=f, purpose="batch")
+            os.remove(input_path)
+            lote['input_file_id'] = input_file.id
+            lote['requisicoes'] = len(requests)
+            self._save_state()
+            logger.info(f"Lote '{nome}': arquivo de entrada {input_file.id} enviado ({len(requests)} requisições)")
+
+        if not lote.get('batch_id'):
+            batch = self.batch_client.batches.create(
+                input_file_id=lote['input_file_id'],
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW,
+                metadata={"etapa": nome}
+            )
+            lote['batch_id'] = batch.id
+            self._save_state()
+            logger.info(f"Lote '{nome}': submetido como {batch.id}")
+
+        batch = self._wait_for_batch(lote['batch_id'])
+        lote['status'] = batch.status
+        lote['output_file_id'] = getattr(batch, 'output_file_id', None)
+        lote['error_file_id'] = getattr(batch, 'error_file_id', None)
+        self._save_state()
+
+        if batch.status != 'completed':
+            raise BatchClassificationError(f"Lote '{nome}' ({lote['batch_id']}) terminou com status '{batch.status}'")
+
+        outputs = {}
+        for file_id in (lote['output_file_id'], lote['error_file_id']):
+            if file_id:
+                outputs.update(self._read_output_file(file_id))
+        return outputs
+
+    def _wait_for_batch(self, batch_id):
+        """Consulta o lote a cada poll_interval segundos até que ele chegue a um status final."""
+        while True:
+            batch = self.batch_client.batches.retrieve(batch_id)
+            counts = getattr(batch, 'request_counts', None)
+            if counts is not None:
+                logger.info(f"Lote {batch_id}: {batch.status} ({counts.completed} concluídas, {counts.failed} com erro, {counts.total} no total)")
+            else:
+                logger.info(f"Lote {batch_id}: {batch.status}")
+            if batch.status in BATCH_FINAL_STATUSES:
+                return batch
+            time.sleep(self.poll_interval)
+
+    def _read_output_file(self, file_id):
+        """
+        Baixa um arquivo de saída (ou de erros) da Batch API.
+
+        Returns:
+            Dicionário custom_id -> (conteúdo da resposta ou None, mensagem de erro ou None)
+        """
+        outputs = {}
+        content = self.batch_client.files.content(file_id).text
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get('response') or {}
+            if entry.get('error') or response.get('status_code') != 200:
+                error = entry.get('error') or (response.get('body') or {}).get('error') or f"status {response.get('status_code')}"
+                outputs[entry['custom_id']] = (None, error.get('message', str(error)) if isinstance(error, dict) else str(error))
+                continue
+            completion = ChatCompletion.model_validate(response['body'])
+            self.openai_client._record_usage(completion)
+            outputs[entry['custom_id']] = (completion.choices[0].message.content.strip(), None)
+        return outputs
+
+    def _process_etapas_1_3(self, outputs, aia_data, tecverde_classes, tecverde_subclasses):
+        """Valida as respostas das Etapas 1 e 3 e identifica os projetos que precisam da Etapa 2."""
+        for project_id in self.state['projetos']:
+            # Etapa 3: em caso de erro, a sugestão segue com os campos de erro de tecnologias verdes
+            content, error = outputs.get(f"{ETAPA_3}:{project_id}", (None, "resposta ausente no lote"))
+            if content is None:
+                self.state['etapa3'][project_id] = self.openai_client._etapa3_error_result(error)
+            else:
+                result_etapa3 = self.openai_client._parse_etapa_response(ETAPA_3, content)
+                self.state['etapa3'][project_id] = self.openai_client._process_etapa3_result(result_etapa3, tecverde_classes, tecverde_subclasses)
+
+            # Etapa 1: sem resposta válida o projeto é registrado como erro
+            content, error = outputs.get(f"{ETAPA_1}:{project_id}", (None, "resposta ausente no lote"))
+            result_etapa1 = self.openai_client._parse_etapa_response(ETAPA_1, content) if content is not None else {"error": error}
+            if "error" in result_etapa1:
+                self.state['erros'][project_id] = result_etapa1["error"]
+                continue
+
+            result_etapa1 = self.openai_client._validate_categories(result_etapa1, aia_data)
+            self.state['etapa1'][project_id] = result_etapa1
+
+            macroarea = result_etapa1.get("_aia_n1_macroarea", "")
+            segmento = result_etapa1.get("_aia_n2_segmento", "")
+            dominios_afeitos_outros = []
+            if macroarea and segmento:
+                dominios_afeitos_outros = self.openai_client._get_dominios_afeitos_outros(macroarea, segmento, aia_data)
+
+            if dominios_afeitos_outros:
+                self.state['pendentes_etapa2'][project_id] = dominios_afeitos_outros
+            else:
+                result_etapa1["_aia_n3_dominio_outro"] = "N/A"
+
+    def _process_etapa2(self, outputs):
+        """Valida as respostas da Etapa 2."""
+        for project_id, dominios_afeitos_outros in self.state['pendentes_etapa2'].items():
+            content, error = outputs.get(f"{ETAPA_2}:{project_id}", (None, "resposta ausente no lote"))
+            if content is None:
+                logger.warning(f"Etapa 2 sem resposta para o projeto {project_id}: {error}")
+                continue
+            result_etapa2 = self.openai_client._parse_etapa_response(ETAPA_2, content)
+            if "error" not in result_etapa2:
+                result_etapa2 = self.openai_client._validate_dominios_outros(result_etapa2, dominios_afeitos_outros)
+                self.state['etapa2'][project_id] = result_etapa2["_aia_n3_dominio_outro"]
+
+    def _merge_results(self):
+        """Combina os resultados das três etapas em uma sugestão por projeto."""
+        for project_id, result_etapa1 in self.state['etapa1'].items():
+            final_result = dict(result_etapa1)
+            if project_id in self.state['etapa2']:
+                final_result["_aia_n3_dominio_outro"] = self.state['etapa2'][project_id]
+            final_result.update(self.state['etapa3'].get(project_id, {}))
+            final_result["timestamp"] = datetime.now().isoformat()
+            self.state['resultados'][project_id] = final_result
+
+
+def bulk_upsert_suggestions(resultados):
+    """
+    Grava as sugestões em AISuggestion em uma única transação, atualizando as linhas existentes.
+
+    Projetos inexistentes no banco são ignorados (ex.: projetos lidos de um arquivo JSON).
+
+    Args:
+        resultados: Dicionário id do projeto -> dicionário retornado por suggest_categories
+
+    Returns:
+        Número de sugestões gravadas
+    """
+    by_id = {}
+    for project_id, suggestion_data in resultados.items():
+        try:
+            by_id[int(project_id)] = suggestion_data
+        except (TypeError, ValueError):
+            logger.warning(f"Id de projeto inválido ignorado na gravação em massa: {project_id}")
+
+    saved = 0
+    try:
+        ids = list(by_id)
+        for start in range(0, len(ids), UPSERT_CHUNK_SIZE):
+            chunk = ids[start:start + UPSERT_CHUNK_SIZE]
+            existing_projects = {row.id for row in db.session.query(Projeto.id).filter(Projeto.id.in_(chunk))}
+            existing_suggestions = {s.id_projeto: s for s in AISuggestion.query.filter(AISuggestion.id_projeto.in_(chunk))}
+
+            for project_id in chunk:
+                if project_id not in existing_projects:
+                    logger.warning(f"Projeto {project_id} não existe no banco de dados; sugestão não gravada")
+                    continue
+                values = suggestion_row_values(by_id[project_id])
+                suggestion = existing_suggestions.get(project_id)
+                if suggestion:
+                    for column, value in values.items():
+                        setattr(suggestion, column, value)
+                else:
+                    db.session.add(AISuggestion(id_projeto=project_id, **values))
+                saved += 1
+
+        refresh_classification_status(ids)
+        bump_data_versions(DOMINIO_AI_SUGESTOES)
+        db.session.commit()
+        return saved
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro na gravação em massa das sugestões: {str(e)}")
+        raise
@@ -0,0 +1,130 @@
+"""
+Status de classificação dos projetos, mantido em gepes.projetos.status_classificacao.
+
+O status deriva das tabelas de categorias (validação humana) e de sugestões da IA. Em bancos
+migrados (add_status_classificacao_to_projetos) ele fica gravado na própria linha do projeto,
+com índices parciais por status, e é recalculado nas escritas que criam categorias ou
+sugestões; sem a coluna, os mesmos critérios são avaliados com EXISTS a cada consulta.
+"""
+import logging
+from sqlalchemy import Text, bindparam, column, exists, literal_column, or_, text
+from app.models import AISuggestion, Categoria, Projeto, db
+from app.schema_capabilities import has_column
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Valores de status_classificacao
+STATUS_NAO_CLASSIFICADO = 'nao_classificado'
+STATUS_CLASSIFICADO_IA = 'classificado_ia'
+STATUS_VALIDADO_HUMANO = 'validado_humano'
+STATUS_VALUES = (STATUS_NAO_CLASSIFICADO, STATUS_CLASSIFICADO_IA, STATUS_VALIDADO_HUMANO)
+
+# Coluna em gepes.projetos (fora do modelo: existe apenas após a migração)
+STATUS_COLUMN = 'status_classificacao'
+
+# Status calculado a partir das tabelas de origem; deve ser igual ao da migração
+STATUS_SQL = """
+    CASE
+        WHEN EXISTS (SELECT 1 FROM gepes.categorias c WHERE c.id_projeto = p.id) THEN 'validado_humano'
+        WHEN EXISTS (SELECT 1 FROM gepes.ai_suggestions s WHERE s.id_projeto = p.id) THEN 'classificado_ia'
+        ELSE 'nao_classificado'
+    END
+"""
+
+
+def status_column_available():
+    """Verifica se a coluna status_classificacao existe no banco atual."""
+    try:
+        return has_column('projetos', STATUS_COLUMN)
+    except Exception as e:
+        logger.error(f"Erro ao verificar a coluna de status de classificação: {str(e)}")
+        return False
+
+
+def status_column():
+    """Coluna status_classificacao ligada à tabela de Projeto (para uso em consultas)."""
+    return column(STATUS_COLUMN, Text, _selectable=Projeto.__table__)
+
+
+def has_categoria():
+    """EXISTS: o projeto tem categoria salva (validado por humano)."""
+    return exists().where(Categoria.id_projeto == Projeto.id)
+
+
+def has_ai_suggestion():
+    """EXISTS: o projeto tem sugestão da IA."""
+    return exists().where(AISuggestion.id_projeto == Projeto.id)
+
+
+def _status_from_tables(status):
+    if status == STATUS_VALIDADO_HUMANO:
+        return has_categoria()
+    if status == STATUS_CLASSIFICADO_IA:
+        return ~has_categoria() & has_ai_suggestion()
+    return ~has_categoria() & ~has_ai_suggestion()
+
+
+def status_is(*statuses):
+    """
+    Critério "o projeto está em um dos status informados".
+
+    Usa a coluna indexada quando existe; caso contrário, os EXISTS equivalentes.
+
+    Args:
+        statuses: Valores de STATUS_VALUES
+
+    Returns:
+        Expressão SQLAlchemy para usar em filter()/where()
+    """
+    if status_column_available():
+        # Valores como constantes no SQL (e não parâmetros) e um OR por status, para que o
+        # planejador reconheça os predicados dos índices parciais também em planos preparados
+        values = [literal_column(f"'{status}'", Text) for status in statuses if status in STATUS_VALUES]
+        return or_(*[status_column() == value for value in values])
+    return or_(*[_status_from_tables(status) for status in statuses])
+
+
+def refresh_classification_status(project_ids=None):
+    """
+    Recalcula status_classificacao e a fila de revisão na sessão atual (chamar antes do
+    commit da escrita).
+
+    Args:
+        project_ids: IDs dos projetos alterados; None recalcula todos (ex.: importações)
+
+    Returns:
+        Número de projetos cujo status mudou (0 se a coluna não existe)
+    """
+    from app.review_queue import sync_review_queue
+
+    if project_ids is not None:
+        project_ids = [project_id for project_id in project_ids if project_id is not None]
+        if not project_ids:
+            return 0
+
+    changed = _update_status_column(project_ids) if status_column_available() else 0
+    sync_review_queue(project_ids)
+    return changed
+
+
+def _update_status_column(project_ids):
+    # As categorias e sugestões criadas nesta sessão precisam estar no banco antes do UPDATE
+    db.session.flush()
+
+    sql = f"""
+        UPDATE gepes.projetos p
+        SET {STATUS_COLUMN} = {STATUS_SQL}
+        WHERE p.{STATUS_COLUMN} IS DISTINCT FROM {STATUS_SQL}
+    """
+    params = {}
+    if project_ids is not None:
+        sql += " AND p.id IN :project_ids"
+        params['project_ids'] = project_ids
+    statement = text(sql)
+    if project_ids is not None:
+        statement = statement.bindparams(bindparam('project_ids', expanding=True))
+
+    result = db.session.execute(statement, params)
+    return result.rowcount
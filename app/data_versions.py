@@ -0,0 +1,99 @@
+from datetime import datetime
+from flask import g, has_app_context
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import VersaoDados, db
+import logging
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Domínios de dados versionados
+DOMINIO_TAXONOMIA = 'taxonomia'
+DOMINIO_ESQUEMA = 'esquema'
+DOMINIO_PROJETOS = 'projetos'
+DOMINIO_CATEGORIAS = 'categorias'
+DOMINIO_TECVERDE = 'tecnologias_verdes'
+DOMINIO_LOGS = 'logs'
+DOMINIO_AI_RATINGS = 'ai_ratings'
+DOMINIO_AI_SUGESTOES = 'ai_sugestoes'
+
+
+def get_data_version(dominio):
+    """
+    Retorna a versão atual de um domínio de dados.
+    
+    As versões de todos os domínios são lidas em uma única consulta no máximo uma vez por
+    contexto da aplicação (ou seja, uma vez por requisição) e guardadas em flask.g.
+    
+    Args:
+        dominio: Nome do domínio (ex.: DOMINIO_TAXONOMIA)
+        
+    Returns:
+        Número da versão (0 se o domínio nunca foi alterado) ou None se não foi possível ler
+    """
+    if not has_app_context():
+        return None
+    
+    if '_data_versions' not in g:
+        try:
+            g._data_versions = dict(db.session.query(VersaoDados.dominio, VersaoDados.versao).all())
+        except Exception as e:
+            logger.error(f"Erro ao ler versões dos domínios de dados: {str(e)}")
+            db.session.rollback()
+            g._data_versions = None
+    
+    if g._data_versions is None:
+        return None
+    return g._data_versions.get(dominio, 0)
+
+
+def get_data_versions(dominios):
+    """
+    Retorna as versões atuais de vários domínios de dados (ver get_data_version).
+    
+    Args:
+        dominios: Nomes dos domínios
+        
+    Returns:
+        Dicionário domínio -> versão, ou None se não foi possível ler as versões
+    """
+    versions = {}
+    for dominio in dominios:
+        version = get_data_version(dominio)
+        if version is None:
+            return None
+        versions[dominio] = version
+    return versions
+
+
+def bump_data_version(dominio):
+    """
+    Incrementa a versão de um domínio de dados na sessão atual.
+    
+    Deve ser chamada antes do commit da escrita que altera o domínio, para que a nova
+    versão seja gravada na mesma transação. O incremento é um único INSERT ... ON CONFLICT,
+    de modo que duas transações incrementando pela primeira vez o mesmo domínio não falham
+    com chave duplicada (o que desfaria a escrita do usuário).
+    
+    Args:
+        dominio: Nome do domínio (ex.: DOMINIO_TAXONOMIA)
+    """
+    insert = postgresql_insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+    now = datetime.utcnow()
+    statement = insert(VersaoDados).values(dominio=dominio, versao=1, data_atualizacao=now)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[VersaoDados.dominio],
+        set_={'versao': VersaoDados.versao + 1, 'data_atualizacao': now}
+    ))
+    
+    # Descartar as versões lidas nesta requisição para que a próxima leitura veja a alteração
+    if has_app_context():
+        g.pop('_data_versions', None)
+
+
+def bump_data_versions(*dominios):
+    """Incrementa a versão de cada domínio informado (ver bump_data_version)."""
+    for dominio in dominios:
+        bump_data_version(dominio)
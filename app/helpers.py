@@ -1,4 +1,5 @@
 from app.models import CategoriaLista, db
+from app.taxonomy import invalidate_taxonomy
 import logging
 
 # Configurar logging
@@ -70,6 +71,7 @@ def add_tecverde_categories():
                 logger.info(f"Adicionadas subclasses para a classe de tecnologia verde: {classe}")
         
         # Commit das alterações
+        invalidate_taxonomy()
         db.session.commit()
         logger.info("Categorias de tecnologias verdes adicionadas com sucesso")
         
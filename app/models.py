@@ -114,6 +114,11 @@ class Projeto(db.Model):
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
     data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # A coluna gerada 'busca' (tsvector da migração add_busca_to_projetos) não é mapeada aqui:
+    # ela só existe em bancos migrados e é lida apenas por app.project_search
+    # O mesmo vale para 'status_classificacao' (add_status_classificacao_to_projetos), mantida
+    # por app.classification_status
+    
     # Relações
     categoria = db.relationship('Categoria', backref='projeto', uselist=False, cascade="all, delete-orphan")
     tecverde = db.relationship('TecnologiaVerde', backref='projeto', uselist=False, cascade="all, delete-orphan")
@@ -175,6 +180,23 @@ class CategoriaLista(db.Model):
     def __repr__(self):
         return f'<CategoriaLista {self.tipo}: {self.valor}>'
 
+class VersaoDados(db.Model):
+    """
+    Contador de versão por domínio de dados (ex.: 'taxonomia').
+    
+    É incrementado na mesma transação das escritas do domínio e permite que caches em
+    memória de qualquer processo detectem alterações com uma leitura por chave primária.
+    """
+    __tablename__ = 'versoes_dados'
+    __table_args__ = {'schema': 'gepes'}
+    
+    dominio = db.Column(db.Text, primary_key=True)
+    versao = db.Column(db.BigInteger, nullable=False, default=0)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<VersaoDados {self.dominio}: {self.versao}>'
+
 class ClassificacaoAdicional(db.Model):
     __tablename__ = 'classificacoes_adicionais'
     __table_args__ = {'schema': 'gepes'}
@@ -273,6 +295,68 @@ class AISuggestion(db.Model):
             'is_ai_suggestion': True
         }
 
+class AISuggestionCache(db.Model):
+    """
+    Resultado de suggest_categories endereçado pelo conteúdo da entrada.
+    
+    A chave é um hash dos campos normalizados do projeto, da versão da taxonomia, da versão
+    dos prompts, do modelo e das opções da classificação; se nada disso mudou, o resultado
+    armazenado é reutilizado sem chamar a API.
+    """
+    __tablename__ = 'ai_suggestion_cache'
+    __table_args__ = {'schema': 'gepes'}
+    
+    chave = db.Column(db.Text, primary_key=True)
+    id_projeto = db.Column(db.Integer, db.ForeignKey('gepes.projetos.id'), nullable=False, index=True)
+    modelo = db.Column(db.Text)
+    resultado = db.Column(db.Text, nullable=False)  # JSON com o resultado de suggest_categories
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AISuggestionCache {self.chave[:12]} para projeto {self.id_projeto}>'
+
+class RAGCacheEntry(db.Model):
+    """
+    Resposta do chatbot armazenada no cache compartilhado entre processos (app.rag_cache).
+    
+    A chave é um hash da pergunta normalizada; entradas expiradas ou cujos domínios de dados
+    mudaram são ignoradas na leitura e removidas periodicamente.
+    """
+    __tablename__ = 'rag_cache'
+    __table_args__ = {'schema': 'gepes'}
+    
+    chave = db.Column(db.Text, primary_key=True)
+    consulta = db.Column(db.Text, nullable=False)  # Pergunta normalizada (para inspeção)
+    resposta = db.Column(db.Text, nullable=False)
+    versoes = db.Column(db.Text)  # JSON domínio -> versão dos dados lidos (app.data_versions)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<RAGCacheEntry {self.chave[:12]}>'
+
+class FilaRevisao(db.Model):
+    """
+    Fila de revisão usada por next_project (app.review_queue).
+    
+    Contém os projetos ainda não validados por humano, na ordem em que são oferecidos aos
+    revisores: primeiro os classificados pela IA, depois os não classificados. Cada revisor
+    reserva um projeto por vez; a reserva expira em reservado_ate.
+    """
+    __tablename__ = 'fila_revisao'
+    __table_args__ = (
+        db.Index('ix_fila_revisao_ordem', 'prioridade', 'id_projeto'),
+        {'schema': 'gepes'}
+    )
+    
+    id_projeto = db.Column(db.Integer, db.ForeignKey('gepes.projetos.id', ondelete='CASCADE'), primary_key=True)
+    prioridade = db.Column(db.SmallInteger, nullable=False)  # 0: classificado pela IA, 1: não classificado
+    reservado_por = db.Column(db.Integer, db.ForeignKey('gepes.usuarios.id', ondelete='SET NULL'))
+    reservado_ate = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<FilaRevisao projeto {self.id_projeto} prioridade {self.prioridade}>'
+
 class AIRating(db.Model):
     __tablename__ = 'ai_ratings'
     
@@ -0,0 +1,77 @@
+import os
+import logging
+import threading
+from flask import current_app, has_app_context
+from openai import DEFAULT_CONNECTION_LIMITS, DefaultHttpxClient, OpenAI, Timeout
+from config import Config
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configurações do pool HTTP (lidas de app.config ou, fora da aplicação, de Config)
+POOL_SETTINGS = (
+    'OPENAI_TIMEOUT_SECONDS',
+    'OPENAI_CONNECT_TIMEOUT_SECONDS',
+    'OPENAI_MAX_CONNECTIONS',
+    'OPENAI_MAX_KEEPALIVE_CONNECTIONS',
+    'OPENAI_KEEPALIVE_EXPIRY_SECONDS',
+    'OPENAI_MAX_RETRIES'
+)
+
+_http_client = None
+_clients = {}
+_pid = None
+_lock = threading.Lock()
+
+
+def _pool_settings():
+    config = current_app.config if has_app_context() else {}
+    return {name: config.get(name, getattr(Config, name)) for name in POOL_SETTINGS}
+
+
+def _create_http_client(settings):
+    # DEFAULT_CONNECTION_LIMITS é uma instância de Limits do httpx usado pelo SDK
+    limits = type(DEFAULT_CONNECTION_LIMITS)(
+        max_connections=settings['OPENAI_MAX_CONNECTIONS'],
+        max_keepalive_connections=settings['OPENAI_MAX_KEEPALIVE_CONNECTIONS'],
+        keepalive_expiry=settings['OPENAI_KEEPALIVE_EXPIRY_SECONDS']
+    )
+    timeout = Timeout(settings['OPENAI_TIMEOUT_SECONDS'], connect=settings['OPENAI_CONNECT_TIMEOUT_SECONDS'])
+    logger.info(
+        f"Criando pool HTTP da OpenAI (max_connections={limits.max_connections}, "
+        f"keepalive={limits.max_keepalive_connections}, timeout={settings['OPENAI_TIMEOUT_SECONDS']}s)"
+    )
+    return DefaultHttpxClient(limits=limits, timeout=timeout)
+
+
+def get_openai_client(api_key):
+    """
+    Retorna o cliente da API OpenAI do processo para a chave informada.
+
+    Os clientes são criados uma vez por chave e compartilham um único pool HTTP com conexões
+    keep-alive, de modo que requisições e jobs consecutivos reaproveitam as conexões TLS já
+    abertas em vez de criar um cliente (e um pool) a cada uso. O pool é recriado após um fork
+    (ex.: workers do Gunicorn com --preload), pois conexões não podem ser compartilhadas
+    entre processos.
+
+    Args:
+        api_key: Chave da API OpenAI
+
+    Returns:
+        Instância de openai.OpenAI
+    """
+    global _http_client, _pid
+    with _lock:
+        if _pid != os.getpid():
+            _http_client, _pid = None, os.getpid()
+            _clients.clear()
+
+        client = _clients.get(api_key)
+        if client is None:
+            settings = _pool_settings()
+            if _http_client is None:
+                _http_client = _create_http_client(settings)
+            client = OpenAI(api_key=api_key, http_client=_http_client, max_retries=settings['OPENAI_MAX_RETRIES'])
+            _clients[api_key] = client
+        return client
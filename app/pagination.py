@@ -0,0 +1,85 @@
+"""
+Paginação por cursor (keyset) para listas com rolagem infinita.
+
+Em vez de OFFSET, cada página pede as linhas cuja chave de ordenação é maior que a da última
+linha já entregue; a consulta usa o índice da chave e custa o mesmo em qualquer profundidade.
+O cursor devolvido ao cliente é opaco (JSON em base64 url-safe) e não precisa de COUNT(*).
+"""
+import base64
+import binascii
+import json
+import logging
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(values):
+    """
+    Codifica a posição de uma página em um cursor opaco.
+
+    Args:
+        values: Dicionário com os valores da chave de ordenação da última linha (ex.: {'id': 42})
+
+    Returns:
+        String url-safe a ser devolvida ao cliente
+    """
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decodifica um cursor gerado por encode_cursor.
+
+    Args:
+        cursor: String recebida do cliente
+
+    Returns:
+        Dicionário com os valores da chave, ou None se o cursor estiver vazio ou inválido
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError) as e:
+        logger.warning(f"Cursor de paginação inválido ignorado: {str(e)}")
+        return None
+    return values if isinstance(values, dict) else None
+
+
+def keyset_page(query, key_column, cursor=None, per_page=20, offset=None):
+    """
+    Busca uma página de `query` ordenada por `key_column`.
+
+    Lê per_page + 1 linhas para saber se há próxima página sem contar o total.
+
+    Args:
+        query: Consulta SQLAlchemy (ORM) já filtrada
+        key_column: Coluna única usada como chave de ordenação (ex.: Projeto.id)
+        cursor: Cursor da página anterior (None para a primeira página)
+        per_page: Quantidade de itens por página
+        offset: Deslocamento explícito para clientes que ainda paginam por número de página
+            (usado apenas quando não há cursor)
+
+    Returns:
+        Tupla (itens, next_cursor); next_cursor é None na última página
+    """
+    key = key_column.key
+    after = decode_cursor(cursor)
+
+    query = query.order_by(key_column)
+    if after is not None and after.get(key) is not None:
+        query = query.filter(key_column > after[key])
+    elif offset:
+        query = query.offset(offset)
+
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor({key: getattr(items[-1], key)})
+    return items, next_cursor
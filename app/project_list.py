@@ -0,0 +1,126 @@
+"""
+Consulta enxuta da listagem de projetos (/projects).
+
+A listagem mostra poucos campos de cada projeto; em vez de carregar objetos Projeto completos
+(com textos longos como objetivo e descrição) e a categoria por joinedload, seleciona apenas as
+colunas exibidas e calcula a existência de categoria e de sugestão da IA com EXISTS. Cada linha
+vira um ProjectListItem, objeto leve fora do identity map da sessão. Em bancos com a coluna
+status_classificacao (app.classification_status), o status é lido da própria linha.
+"""
+from sqlalchemy import select
+from app.models import AISuggestion, Projeto, db
+from app.classification_status import (
+    STATUS_CLASSIFICADO_IA, STATUS_NAO_CLASSIFICADO, STATUS_VALIDADO_HUMANO, has_ai_suggestion, has_categoria,
+    status_column, status_column_available, status_is
+)
+
+# Colunas de Projeto exibidas na listagem (também os campos do JSON da rolagem infinita)
+PROJECT_LIST_COLUMNS = (
+    Projeto.id,
+    Projeto.codigo_projeto,
+    Projeto.titulo,
+    Projeto.unidade_embrapii,
+    Projeto.data_contrato,
+    Projeto._aia_n1_macroarea,
+    Projeto._aia_n2_segmento,
+    Projeto.tecverde_se_aplica,
+    Projeto.tecverde_classe,
+    Projeto.tecverde_subclasse
+)
+
+# Filtros de status da listagem: sem categoria nem sugestão, com sugestão da IA mas sem
+# categoria, e com categoria salva por um revisor
+LIST_FILTER_STATUS = {
+    'uncategorized': STATUS_NAO_CLASSIFICADO,
+    'ai_classified': STATUS_CLASSIFICADO_IA,
+    'human_validated': STATUS_VALIDADO_HUMANO
+}
+
+# Campos das sugestões da IA usados pelo template quando o projeto não tem tecverde salvo
+SUGGESTION_LIST_COLUMNS = (
+    AISuggestion.id_projeto,
+    AISuggestion.tecverde_se_aplica,
+    AISuggestion.tecverde_classe,
+    AISuggestion.tecverde_subclasse
+)
+
+
+class ProjectListItem:
+    """Linha da listagem de projetos com os mesmos nomes de atributos de Projeto."""
+
+    __slots__ = tuple(column.key for column in PROJECT_LIST_COLUMNS) + ('human_validated', 'ai_classified')
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, getattr(row, name))
+
+    def to_dict(self):
+        """Converte a linha para o JSON da rolagem infinita."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def project_list_query():
+    """
+    Consulta base da listagem: apenas as colunas exibidas e os indicadores de status.
+
+    Returns:
+        Query do SQLAlchemy cujas linhas podem ser convertidas com ProjectListItem
+    """
+    if status_column_available():
+        # Status gravado na linha do projeto (sem subconsultas)
+        human_validated = status_column() == STATUS_VALIDADO_HUMANO
+        ai_classified = status_column() == STATUS_CLASSIFICADO_IA
+    else:
+        human_validated = has_categoria()
+        ai_classified = has_ai_suggestion()
+
+    return db.session.query(
+        *PROJECT_LIST_COLUMNS,
+        human_validated.label('human_validated'),
+        ai_classified.label('ai_classified')
+    )
+
+
+def filter_by_status(query, filter_type):
+    """
+    Aplica o filtro de status de categorização da listagem.
+
+    Args:
+        query: Consulta sobre Projeto
+        filter_type: 'uncategorized', 'ai_classified' ou 'human_validated' (outros valores
+            não filtram)
+
+    Returns:
+        Consulta filtrada
+    """
+    status = LIST_FILTER_STATUS.get(filter_type)
+    if status is None:
+        return query
+    return query.filter(status_is(status))
+
+
+def get_suggestions_for_projects(project_ids):
+    """
+    Busca os campos de tecnologia verde das sugestões da IA dos projetos informados.
+
+    Args:
+        project_ids: IDs dos projetos da página
+
+    Returns:
+        Lista de dicionários com project_id, tecverde_se_aplica, tecverde_classe e
+        tecverde_subclasse (mesmas chaves de AISuggestion.to_dict)
+    """
+    if not project_ids:
+        return []
+    rows = db.session.execute(
+        select(*SUGGESTION_LIST_COLUMNS).where(AISuggestion.id_projeto.in_(project_ids))
+    )
+    return [
+        {
+            'project_id': row[0],
+            'tecverde_se_aplica': row[1],
+            'tecverde_classe': row[2],
+            'tecverde_subclasse': row[3]
+        }
+        for row in rows
+    ]
@@ -0,0 +1,170 @@
+"""
+Busca textual de projetos compartilhada pela listagem /projects e pelo chatbot.
+
+Quando a coluna gepes.projetos.busca existe (migração add_busca_to_projetos), a busca usa o
+tsvector com stemming em português e o índice GIN correspondente; o código do projeto também
+é comparado por substring, coberto pelo índice pg_trgm. Sem a coluna (banco ainda não migrado
+ou outro SGBD), as funções recorrem aos ILIKE anteriores, com o mesmo resultado de antes.
+"""
+import re
+import logging
+from sqlalchemy import case, column, func, or_, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from app.models import Projeto, db
+from app.schema_capabilities import has_column
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuração de busca textual do PostgreSQL usada no tsvector e nas consultas
+SEARCH_CONFIG = 'portuguese'
+
+# Coluna tsvector gerada em gepes.projetos (fora do modelo: existe apenas após a migração)
+SEARCH_COLUMN = 'busca'
+
+# Expressão da coluna gerada; pesos: A (título e código), B (unidade e categorias AIA),
+# C (objetivo) e D (descrição pública). Deve ser igual à da migração add_busca_to_projetos.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('portuguese', coalesce(titulo, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(codigo_projeto, '')), 'A') || "
+    "setweight(to_tsvector('portuguese', coalesce(unidade_embrapii, '') || ' ' || "
+    "coalesce(_aia_n1_macroarea, '') || ' ' || coalesce(_aia_n2_segmento, '')), 'B') || "
+    "setweight(to_tsvector('portuguese', coalesce(objetivo, '')), 'C') || "
+    "setweight(to_tsvector('portuguese', coalesce(descricao_publica, '')), 'D')"
+)
+
+# Palavras da consulta aceitas no tsquery (demais caracteres são descartados)
+_WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def full_text_available():
+    """Verifica se a coluna tsvector de busca existe no banco atual."""
+    try:
+        return db.engine.dialect.name == 'postgresql' and has_column('projetos', SEARCH_COLUMN)
+    except Exception as e:
+        logger.error(f"Erro ao verificar a coluna de busca de projetos: {str(e)}")
+        return False
+
+
+def build_tsquery(term, operator='&'):
+    """
+    Monta um tsquery de prefixos a partir do texto digitado.
+
+    Cada palavra vira `palavra:*`, de modo que termos incompletos (a busca da listagem roda
+    enquanto o usuário digita) também encontrem resultados.
+
+    Args:
+        term: Texto da busca
+        operator: '&' para exigir todas as palavras ou '|' para qualquer uma
+
+    Returns:
+        String no formato de to_tsquery, ou None se não houver palavras
+    """
+    words = _WORD_PATTERN.findall(term or '')
+    # Letras soltas (ex.: o "d" de "d'água") casariam com quase tudo como prefixo
+    words = [word for word in words if len(word) > 1] or words
+    if not words:
+        return None
+    return f' {operator} '.join(f'{word.lower()}:*' for word in words)
+
+
+def _search_vector():
+    # Coluna ligada à tabela do modelo: mesma cláusula FROM e respeita schema_translate_map
+    return column(SEARCH_COLUMN, TSVECTOR, _selectable=Projeto.__table__)
+
+
+def project_search_filter(term):
+    """
+    Critério de busca para consultas sobre Projeto (listagem /projects).
+
+    Args:
+        term: Texto da busca
+
+    Returns:
+        Expressão SQLAlchemy para usar em query.filter()
+    """
+    substring = f"%{term}%"
+    tsquery = build_tsquery(term) if full_text_available() else None
+    if tsquery is None:
+        return or_(
+            Projeto.titulo.ilike(substring),
+            Projeto.codigo_projeto.ilike(substring),
+            Projeto.unidade_embrapii.ilike(substring),
+            Projeto._aia_n1_macroarea.ilike(substring),
+            Projeto._aia_n2_segmento.ilike(substring)
+        )
+
+    return or_(
+        _search_vector().op('@@')(func.to_tsquery(SEARCH_CONFIG, tsquery)),
+        Projeto.codigo_projeto.ilike(substring)
+    )
+
+
+def search_projects(term, limit=5):
+    """
+    Busca projetos por relevância (usada pelo chatbot).
+
+    Exige todas as palavras da consulta e, se nada for encontrado, aceita qualquer uma. Um
+    código de projeto igual ao termo vem sempre primeiro.
+
+    Args:
+        term: Texto da busca
+        limit: Quantidade máxima de projetos
+
+    Returns:
+        Lista de dicionários com id, codigo_projeto e titulo, do mais para o menos relevante
+    """
+    if not full_text_available():
+        return _search_projects_ilike(term, limit)
+
+    for operator in ('&', '|'):
+        tsquery = build_tsquery(term, operator)
+        if tsquery is None:
+            return []
+
+        query_ts = func.to_tsquery(SEARCH_CONFIG, tsquery)
+        vector = _search_vector()
+        exact_code = case((Projeto.codigo_projeto.ilike(term), 1), else_=0)
+
+        rows = db.session.execute(
+            select(Projeto.id, Projeto.codigo_projeto, Projeto.titulo)
+            .where(or_(vector.op('@@')(query_ts), Projeto.codigo_projeto.ilike(f"%{term}%")))
+            .order_by(exact_code.desc(), func.ts_rank_cd(vector, query_ts).desc(), Projeto.titulo)
+            .limit(limit)
+        ).all()
+        if rows:
+            return [{"id": row[0], "codigo_projeto": row[1], "titulo": row[2]} for row in rows]
+
+    return []
+
+
+def _search_projects_ilike(term, limit):
+    """Busca anterior à coluna tsvector: ILIKE com relevância definida por CASE."""
+    partial_query = f"%{term}%"
+    broad_query = f"%{' '.join(['%' + word + '%' for word in term.split()])}%"
+    relevance = case(
+        (Projeto.titulo.ilike(term), 10),
+        (Projeto.codigo_projeto.ilike(term), 9),
+        (Projeto.titulo.ilike(partial_query), 8),
+        (Projeto.codigo_projeto.ilike(partial_query), 7),
+        (Projeto.titulo.ilike(broad_query), 6),
+        (Projeto.objetivo.ilike(partial_query), 5),
+        (Projeto.descricao_publica.ilike(partial_query), 4),
+        (Projeto.objetivo.ilike(broad_query), 3),
+        (Projeto.descricao_publica.ilike(broad_query), 2),
+        else_=1
+    )
+
+    rows = db.session.execute(
+        select(Projeto.id, Projeto.codigo_projeto, Projeto.titulo)
+        .where(or_(
+            Projeto.titulo.ilike(broad_query),
+            Projeto.codigo_projeto.ilike(broad_query),
+            Projeto.objetivo.ilike(broad_query),
+            Projeto.descricao_publica.ilike(broad_query)
+        ))
+        .order_by(relevance.desc(), Projeto.titulo)
+        .limit(limit)
+    ).all()
+    return [{"id": row[0], "codigo_projeto": row[1], "titulo": row[2]} for row in rows]
@@ -0,0 +1,385 @@
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.data_versions import get_data_versions
+from app.models import RAGCacheEntry, db
+from app.text_utils import normalize_text
+from config import Config
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Backends disponíveis (RAG_CACHE_BACKEND)
+BACKEND_MEMORY = 'memory'
+BACKEND_DATABASE = 'database'
+BACKEND_TIERED = 'tiered'
+
+# Gravações no banco entre duas limpezas das entradas expiradas
+DATABASE_PURGE_INTERVAL = 200
+
+# Blocos de contexto mantidos em memória por processo (RAGAssistant)
+CONTEXT_CACHE_MAX_ENTRIES = 200
+
+# Pontuação e espaços ignorados nas extremidades da pergunta ("Quantos projetos?" == "quantos projetos")
+_EDGE_PUNCTUATION_RE = re.compile(r"^[\s\W_]+|[\s\W_]+$")
+
+
+def normalize_query(query):
+    """
+    Normaliza uma pergunta para uso como chave de cache.
+
+    Remove acentos, maiúsculas, espaços repetidos e pontuação nas extremidades.
+
+    Args:
+        query: Pergunta do usuário (ou chave composta, ex.: 'search_project:termo')
+
+    Returns:
+        Pergunta normalizada
+    """
+    return _EDGE_PUNCTUATION_RE.sub('', normalize_text(query))
+
+
+class CacheStats:
+    """Contadores de acertos e falhas do cache neste processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {'hits': 0, 'misses': 0, 'stale': 0, 'sets': 0, 'errors': 0}
+            self.hits_by_backend = {}
+
+    def hit(self, backend):
+        with self._lock:
+            self.counters['hits'] += 1
+            self.hits_by_backend[backend] = self.hits_by_backend.get(backend, 0) + 1
+
+    def increment(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def to_dict(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return dict(
+                self.counters,
+                hits_by_backend=dict(self.hits_by_backend),
+                hit_rate=round(self.counters['hits'] / lookups, 4) if lookups else 0.0
+            )
+
+
+class MemoryCacheBackend:
+    """
+    Cache LRU em memória do processo.
+
+    Usa um OrderedDict: leituras movem a entrada para o fim e a remoção da menos usada
+    (popitem do início) é O(1).
+    """
+
+    name = BACKEND_MEMORY
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retorna (valor, expira_em, versões) ou None se a chave não existir ou estiver expirada."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, query, value, expires_at, versions=None):
+        with self._lock:
+            self._entries[key] = (value, expires_at, versions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'evictions': self.evictions}
+
+
+class DatabaseCacheBackend:
+    """
+    Cache compartilhado por todos os processos na tabela gepes.rag_cache.
+
+    As operações usam uma conexão própria (db.engine), fora da sessão da requisição, para
+    que gravar no cache nunca confirme alterações pendentes da requisição.
+    """
+
+    name = BACKEND_DATABASE
+
+    def __init__(self, purge_interval=DATABASE_PURGE_INTERVAL):
+        self.purge_interval = purge_interval
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._table = RAGCacheEntry.__table__
+
+    def get(self, key):
+        """Retorna (valor, expira_em, versões) ou None se a chave não existir ou estiver expirada."""
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(self._table.c.resposta, self._table.c.expira_em, self._table.c.versoes).where(
+                    self._table.c.chave == key,
+                    self._table.c.expira_em > datetime.utcnow()
+                )
+            ).first()
+        if row is None:
+            return None
+        versions = json.loads(row.versoes) if row.versoes else None
+        return row.resposta, (row.expira_em - datetime(1970, 1, 1)).total_seconds(), versions
+
+    def set(self, key, query, value, expires_at, versions=None):
+        values = {
+            'consulta': query,
+            'resposta': value,
+            'versoes': json.dumps(versions, sort_keys=True) if versions else None,
+            'criado_em': datetime.utcnow(),
+            'expira_em': datetime.utcfromtimestamp(expires_at)
+        }
+        with db.engine.begin() as connection:
+            updated = connection.execute(update(self._table).where(self._table.c.chave == key).values(**values))
+            if not updated.rowcount:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(insert(self._table).values(chave=key, **values))
+                except IntegrityError:
+                    # Outro processo gravou a mesma pergunta ao mesmo tempo; a resposta dele serve
+                    pass
+
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.purge_interval == 0
+        if purge:
+            self.purge_expired()
+
+    def delete(self, key):
+        with db.engine.begin() as connection:
+            connection.execute(delete(self._table).where(self._table.c.chave == key))
+
+    def purge_expired(self):
+        """Remove as entradas expiradas e retorna quantas foram removidas."""
+        with db.engine.begin() as connection:
+            removed = connection.execute(delete(self._table).where(self._table.c.expira_em <= datetime.utcnow())).rowcount
+        logger.info(f"{removed} respostas expiradas removidas do cache do chatbot")
+        return removed
+
+    def clear(self):
+        with db.engine.begin() as connection:
+            connection.execute(delete(self._table))
+
+    def info(self):
+        with db.engine.connect() as connection:
+            entries = connection.execute(select(db.func.count()).select_from(self._table)).scalar()
+        return {'entries': entries}
+
+
+class ResponseCache:
+    """
+    Cache de respostas do chatbot em camadas.
+
+    As leituras consultam os backends em ordem (ex.: memória e depois banco) e um acerto em
+    uma camada posterior preenche as anteriores com o tempo de vida restante. As gravações vão
+    para todos os backends. Falhas de um backend são registradas e tratadas como falta no cache.
+
+    Cada entrada pode guardar as versões dos domínios de dados lidos para produzi-la
+    (app.data_versions). Uma entrada cujo domínio mudou desde a gravação é descartada na
+    leitura; por isso entradas versionadas usam um tempo de vida bem maior (versioned_ttl).
+    """
+
+    def __init__(self, backends, ttl, versioned_ttl=None):
+        self.backends = backends
+        self.ttl = ttl
+        self.versioned_ttl = versioned_ttl or ttl
+        self.stats = CacheStats()
+
+    @staticmethod
+    def make_key(query, scope=None):
+        """Chave do cache para a pergunta normalizada (e o escopo, ex.: usuário, se houver)."""
+        normalized = normalize_query(query)
+        if scope:
+            normalized = f"{scope}\x1f{normalized}"
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def get(self, query, scope=None):
+        """
+        Retorna a resposta armazenada para a pergunta.
+
+        Args:
+            query: Pergunta do usuário
+            scope: Escopo opcional (respostas personalizadas não são compartilhadas entre escopos)
+
+        Returns:
+            Resposta ou None
+        """
+        key = self.make_key(query, scope)
+        for position, backend in enumerate(self.backends):
+            try:
+                entry = backend.get(key)
+            except Exception as e:
+                logger.error(f"Erro ao ler o cache do chatbot ({backend.name}): {str(e)}")
+                self.stats.increment('errors')
+                continue
+            if entry is None:
+                continue
+
+            value, expires_at, versions = entry
+            if versions and get_data_versions(versions) != versions:
+                # Algum domínio lido pela resposta mudou; uma camada posterior pode ter a resposta nova
+                self.stats.increment('stale')
+                try:
+                    backend.delete(key)
+                except Exception as e:
+                    logger.error(f"Erro ao descartar entrada do cache do chatbot ({backend.name}): {str(e)}")
+                continue
+
+            for previous in self.backends[:position]:
+                try:
+                    previous.set(key, normalize_query(query), value, expires_at, versions)
+                except Exception as e:
+                    logger.error(f"Erro ao preencher o cache do chatbot ({previous.name}): {str(e)}")
+            self.stats.hit(backend.name)
+            logger.info(f"Cache hit ({backend.name}) para a pergunta: {query}")
+            return value
+
+        self.stats.increment('misses')
+        return None
+
+    def set(self, query, value, scope=None, ttl=None, versions=None):
+        """
+        Armazena a resposta para a pergunta em todos os backends.
+
+        Args:
+            query: Pergunta do usuário
+            value: Resposta
+            scope: Escopo opcional (ver get)
+            ttl: Tempo de vida em segundos (padrão: versioned_ttl se houver versões, senão ttl)
+            versions: Dicionário domínio -> versão dos dados lidos para produzir a resposta,
+                      obtido com get_data_versions antes da leitura
+        """
+        if ttl is None:
+            ttl = self.versioned_ttl if versions else self.ttl
+        key = self.make_key(query, scope)
+        expires_at = time.time() + ttl
+        for backend in self.backends:
+            try:
+                backend.set(key, normalize_query(query), value, expires_at, versions)
+            except Exception as e:
+                logger.error(f"Erro ao gravar o cache do chatbot ({backend.name}): {str(e)}")
+                self.stats.increment('errors')
+        self.stats.increment('sets')
+
+    def clear(self):
+        """Remove todas as respostas de todos os backends e zera os contadores."""
+        for backend in self.backends:
+            backend.clear()
+        self.stats.reset()
+
+    def to_dict(self):
+        """Contadores e tamanho de cada backend (para o endpoint de administração)."""
+        backends = {}
+        for backend in self.backends:
+            try:
+                backends[backend.name] = backend.info()
+            except Exception as e:
+                backends[backend.name] = {'error': str(e)}
+        return dict(self.stats.to_dict(), ttl_seconds=self.ttl, versioned_ttl_seconds=self.versioned_ttl, backends=backends)
+
+
+def create_response_cache(config):
+    """
+    Cria o cache de respostas conforme a configuração.
+
+    Args:
+        config: Configuração da aplicação (RAG_CACHE_BACKEND, RAG_CACHE_MAX_ENTRIES, RAG_CACHE_TTL_SECONDS,
+                RAG_CACHE_VERSIONED_TTL_SECONDS)
+
+    Returns:
+        Instância de ResponseCache
+    """
+    backend = config.get('RAG_CACHE_BACKEND', BACKEND_TIERED)
+    backends = []
+    if backend in (BACKEND_MEMORY, BACKEND_TIERED):
+        backends.append(MemoryCacheBackend(config.get('RAG_CACHE_MAX_ENTRIES', 500)))
+    if backend in (BACKEND_DATABASE, BACKEND_TIERED):
+        backends.append(DatabaseCacheBackend())
+    if not backends:
+        logger.warning(f"Backend de cache do chatbot desconhecido: {backend}. Usando apenas memória.")
+        backends.append(MemoryCacheBackend(config.get('RAG_CACHE_MAX_ENTRIES', 500)))
+    return ResponseCache(
+        backends,
+        config.get('RAG_CACHE_TTL_SECONDS', 3600),
+        config.get('RAG_CACHE_VERSIONED_TTL_SECONDS', 7 * 24 * 3600)
+    )
+
+
+_response_cache = None
+_context_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def _cache_config():
+    if has_app_context():
+        return current_app.config
+    return {
+        name: getattr(Config, name)
+        for name in ('RAG_CACHE_BACKEND', 'RAG_CACHE_MAX_ENTRIES', 'RAG_CACHE_TTL_SECONDS', 'RAG_CACHE_VERSIONED_TTL_SECONDS')
+    }
+
+
+def get_response_cache():
+    """Retorna o cache de respostas do processo (criado sob demanda com a configuração da aplicação)."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = create_response_cache(_cache_config())
+    return _response_cache
+
+
+def get_context_cache():
+    """
+    Retorna o cache em memória dos blocos de contexto do chatbot (um por processo).
+
+    Os blocos são versionados pelos domínios de dados que leem, como as respostas.
+    """
+    global _context_cache
+    if _context_cache is None:
+        with _response_cache_lock:
+            if _context_cache is None:
+                config = _cache_config()
+                _context_cache = ResponseCache(
+                    [MemoryCacheBackend(CONTEXT_CACHE_MAX_ENTRIES)],
+                    config.get('RAG_CACHE_TTL_SECONDS', 3600),
+                    config.get('RAG_CACHE_VERSIONED_TTL_SECONDS', 7 * 24 * 3600)
+                )
+    return _context_cache
@@ -6,53 +6,38 @@ Handles the retrieval and generation of responses using OpenAI API
 import os
 import json
 import re
-import hashlib
-import time
 from datetime import datetime
 from functools import lru_cache
 from flask import current_app
-import openai
 from sqlalchemy import text
 from app import db
+from app.openai_clients import get_openai_client
+from app.rag_cache import get_context_cache, get_response_cache
+from app.project_search import search_projects
+from app.statistics_snapshot import get_statistics, get_tecverde_class_counts
+from app.data_versions import (
+    DOMINIO_AI_RATINGS, DOMINIO_AI_SUGESTOES, DOMINIO_CATEGORIAS, DOMINIO_LOGS,
+    DOMINIO_PROJETOS, DOMINIO_TAXONOMIA, DOMINIO_TECVERDE, get_data_versions
+)
 from app.models import (
     Projeto, Categoria, TecnologiaVerde, CategoriaLista,
     ClassificacaoAdicional, Log, AISuggestion, AIRating, Usuario
 )
 
-class SimpleCache:
-    """Implementação simples de cache para respostas"""
-    def __init__(self, max_size=100, ttl=3600):  # TTL: 1 hora por padrão
-        self.cache = {}
-        self.max_size = max_size
-        self.ttl = ttl
-    
-    def _generate_key(self, query):
-        return hashlib.md5(query.lower().encode()).hexdigest()
-    
-    def get(self, query):
-        key = self._generate_key(query)
-        if key in self.cache:
-            item = self.cache[key]
-            if time.time() - item['timestamp'] < self.ttl:
-                current_app.logger.info(f"Cache hit for query: {query}")
-                return item['data']
-            else:
-                del self.cache[key]  # Cache expirado
-        return None
-    
-    def set(self, query, data):
-        key = self._generate_key(query)
-        self.cache[key] = {
-            'data': data,
-            'timestamp': time.time()
-        }
-        
-        # Limitar tamanho do cache
-        if len(self.cache) > self.max_size:
-            oldest_key = min(self.cache, key=lambda k: self.cache[k]['timestamp'])
-            del self.cache[oldest_key]
-        
-        current_app.logger.info(f"Added to cache: {query}")
+# Domínios de dados lidos por cada bloco de contexto; as respostas e os blocos em cache são
+# descartados quando a versão de um desses domínios muda (app.data_versions)
+CONTEXT_BLOCK_DOMAINS = {
+    'estatisticas': (DOMINIO_PROJETOS, DOMINIO_CATEGORIAS, DOMINIO_TECVERDE, DOMINIO_AI_SUGESTOES),
+    'projetos': (DOMINIO_PROJETOS, DOMINIO_CATEGORIAS, DOMINIO_TECVERDE),
+    'tecnologias_verdes': (DOMINIO_TAXONOMIA, DOMINIO_PROJETOS, DOMINIO_TECVERDE),
+    'categorias': (DOMINIO_TAXONOMIA, DOMINIO_CATEGORIAS),
+    'sugestoes_ia': (DOMINIO_AI_SUGESTOES, DOMINIO_AI_RATINGS),
+    'usuarios': (DOMINIO_LOGS,),
+    'busca_projetos': (DOMINIO_PROJETOS, DOMINIO_CATEGORIAS, DOMINIO_TECVERDE)
+}
+
+# Sufixo das mensagens de contexto devolvidas quando a consulta ao banco falha (não são armazenadas)
+CONTEXT_UNAVAILABLE_SUFFIX = "Dados não disponíveis no momento."
 
 class QueryAnalyzer:
     """Analisador de consultas para determinar o tipo e complexidade da consulta"""
@@ -137,7 +122,6 @@ class RAGAssistant:
     def __init__(self):
         """Initialize the RAG Assistant"""
         self.openai_api_key = os.environ.get('OPENAI_API_KEY')
-        self.client = openai.OpenAI(api_key=self.openai_api_key)
         
         # Modelos disponíveis com base na complexidade
         self.models = {
@@ -148,7 +132,6 @@ class RAGAssistant:
         self.default_model = "gpt-4-turbo"  # Compatibilidade com código existente
         
         # Componentes auxiliares
-        self.cache = SimpleCache()
         self.query_analyzer = QueryAnalyzer()
         
         # Configurações do sistema
@@ -161,6 +144,21 @@ class RAGAssistant:
             "model_usage": {model: 0 for model in self.models.values()}
         }
     
+    @property
+    def cache(self):
+        """Cache de respostas compartilhado pelo processo (memória + banco, ver app.rag_cache)"""
+        return get_response_cache()
+    
+    @property
+    def context_cache(self):
+        """Cache em memória dos blocos de contexto, versionado pelos domínios de dados de cada bloco"""
+        return get_context_cache()
+    
+    @property
+    def client(self):
+        """Cliente da API OpenAI compartilhado pelo processo (obtido no primeiro uso, após o fork do worker)"""
+        return get_openai_client(self.openai_api_key)
+    
     def _get_system_prompt(self):
         """Get the system prompt for the assistant"""
         return """
@@ -199,8 +197,14 @@ class RAGAssistant:
         if conversation_history is None:
             conversation_history = []
         
+        # Respostas personalizadas (com dados do usuário) não são compartilhadas entre usuários
+        cache_scope = user_info.get('email') if user_info else None
+        
+        # Versões dos dados lidas antes de consultar o banco: uma escrita concorrente invalida a resposta
+        data_versions = get_data_versions(set().union(*CONTEXT_BLOCK_DOMAINS.values()))
+        
         # Verifica cache para consultas repetidas
-        cached_response = self.cache.get(user_message)
+        cached_response = self.cache.get(user_message, scope=cache_scope)
         if cached_response:
             self.usage_stats["cache_hits"] += 1
             return cached_response
@@ -214,14 +218,15 @@ class RAGAssistant:
             search_terms = re.sub(r'buscar|encontrar|pesquisar|projeto[s]?', '', user_message.lower(), flags=re.IGNORECASE).strip()
             if search_terms:
                 project_info = self.search_project(search_terms)
-                self.cache.set(user_message, project_info)
+                self.cache.set(user_message, project_info, scope=cache_scope,
+                               versions=self._versions_for(data_versions, CONTEXT_BLOCK_DOMAINS['busca_projetos']))
                 return project_info
         
         # Seleciona o modelo apropriado com base na complexidade
         selected_model = self._select_model(query_analysis)
         
         # Retrieve relevant information from the database based on the user's query
-        context = self._retrieve_enhanced_context(user_message, query_analysis, user_info)
+        context, context_domains = self._retrieve_enhanced_context(user_message, query_analysis, user_info)
         
         # Add user information to the system prompt if available
         system_content = self.system_prompt
@@ -268,7 +273,8 @@ class RAGAssistant:
             answer = response.choices[0].message.content
             
             # Armazena no cache
-            self.cache.set(user_message, answer)
+            self.cache.set(user_message, answer, scope=cache_scope,
+                           versions=self._versions_for(data_versions, context_domains))
             
             return answer
         except Exception as e:
@@ -292,6 +298,37 @@ class RAGAssistant:
         else:
             return self.models["advanced"]
     
+    def _versions_for(self, data_versions, domains):
+        """Seleciona as versões dos domínios lidos (None se as versões não puderam ser lidas)"""
+        if data_versions is None:
+            return None
+        return {domain: data_versions[domain] for domain in domains}
+    
+    def _context_block(self, name, build, query='', scope=None):
+        """
+        Obtém um bloco de contexto do cache ou o constrói com build().
+        
+        Args:
+            name: Nome do bloco em CONTEXT_BLOCK_DOMAINS
+            build: Função sem argumentos que consulta o banco e retorna o texto do bloco
+            query: Pergunta, para blocos que dependem dela
+            scope: Escopo opcional (ex.: e-mail do usuário, para blocos personalizados)
+            
+        Returns:
+            str: Texto do bloco
+        """
+        versions = get_data_versions(CONTEXT_BLOCK_DOMAINS[name])
+        key = f"{name}:{query}"
+        if versions is not None:
+            block = self.context_cache.get(key, scope=scope)
+            if block is not None:
+                return block
+        
+        block = build()
+        if versions is not None and not block.strip().endswith(CONTEXT_UNAVAILABLE_SUFFIX):
+            self.context_cache.set(key, block, scope=scope, versions=versions)
+        return block
+    
     def _retrieve_enhanced_context(self, query, query_analysis, user_info=None):
         """
         Recupera contexto relevante baseado na análise da consulta
@@ -302,40 +339,46 @@ class RAGAssistant:
             user_info (dict): Information about the current user
             
         Returns:
-            str: Context information to include in the prompt
+            tuple: (context information to include in the prompt, set of data domains it read)
         """
         context_parts = []
+        domains = set()
         primary_type = query_analysis["primary_type"]
         type_scores = query_analysis["type_scores"]
         
+        def add_block(name, build, block_query='', scope=None):
+            context_parts.append(self._context_block(name, build, block_query, scope))
+            domains.update(CONTEXT_BLOCK_DOMAINS[name])
+        
         # Sempre inclui visão geral do sistema
         context_parts.append(self._get_system_overview())
         
         # Adiciona contexto específico com base no tipo de consulta
         if primary_type == "estatistica" or type_scores["estatistica"] > 0.3:
-            context_parts.append(self._get_enhanced_statistics_info(query))
+            add_block('estatisticas', lambda: self._get_enhanced_statistics_info(query), query)
         
         if primary_type == "projeto" or type_scores["projeto"] > 0.3:
-            context_parts.append(self._get_projects_info())
+            add_block('projetos', self._get_projects_info)
         
         if primary_type == "tecnologia_verde" or type_scores["tecnologia_verde"] > 0.3:
-            context_parts.append(self._get_enhanced_tecverde_info(query))
+            add_block('tecnologias_verdes', lambda: self._get_enhanced_tecverde_info(query), query)
         
         if primary_type == "categoria" or type_scores["categoria"] > 0.3:
-            context_parts.append(self._get_categories_info())
+            add_block('categorias', self._get_categories_info)
         
         if primary_type == "sugestao_ia" or type_scores["sugestao_ia"] > 0.3:
-            context_parts.append(self._get_ai_suggestions_info())
+            add_block('sugestoes_ia', self._get_ai_suggestions_info)
             
         if primary_type == "usuario_comparacao" or type_scores["usuario_comparacao"] > 0.3:
-            context_parts.append(self._get_user_comparison_info(query, user_info))
+            add_block('usuarios', lambda: self._get_user_comparison_info(query, user_info), query,
+                      user_info.get('email') if user_info else None)
         
         # Se nenhum contexto específico foi adicionado além da visão geral,
         # adiciona informações gerais
         if len(context_parts) == 1:
             context_parts.append(self._get_general_info())
         
-        return "\n\n".join(context_parts)
+        return "\n\n".join(context_parts), domains
     
     def _get_ai_suggestions_info(self):
         """Obtém informações específicas sobre sugestões da IA"""
@@ -428,55 +471,28 @@ class RAGAssistant:
             detailed_stats = {}
             
             if "tecnologia verde" in query.lower() or "tecverde" in query.lower():
-                # Estatísticas específicas de tecnologia verde
-                with db.engine.connect() as connection:
-                    tecverde_stats_result = connection.execute(text("""
-                        SELECT
-                            COUNT(*) AS total_tecverde,
-                            COUNT(DISTINCT p.id) AS unique_projects,
-                            COUNT(DISTINCT CASE WHEN tv.classe IS NOT NULL THEN tv.id END) AS with_class,
-                            COUNT(DISTINCT CASE WHEN tv.subclasse IS NOT NULL THEN tv.id END) AS with_subclass
-                        FROM gepes.tecnologias_verdes tv
-                        JOIN gepes.projetos p ON tv.id_projeto = p.id
-                        WHERE tv.se_aplica = true
-                    """))
-                    tv_stats_row = tecverde_stats_result.fetchone()
-                    # Convert Row to dict explicitly
-                    tv_stats = {}
-                    if tv_stats_row:
-                        tv_stats = {
-                            "total_tecverde": tv_stats_row[0],
-                            "unique_projects": tv_stats_row[1],
-                            "with_class": tv_stats_row[2],
-                            "with_subclass": tv_stats_row[3]
-                        }
-                    
-                    # Distribuição por classe
-                    tecverde_classes_result = connection.execute(text("""
-                        SELECT classe, COUNT(*) 
-                        FROM gepes.tecnologias_verdes 
-                        WHERE se_aplica = true AND classe IS NOT NULL 
-                        GROUP BY classe 
-                        ORDER BY COUNT(*) DESC
-                    """))
+                # Estatísticas específicas de tecnologia verde (snapshot compartilhado com o dashboard)
+                snapshot = get_statistics()
+                tv_stats = {
+                    "unique_projects": snapshot['tecverde_registered_projects'],
+                    "with_class": snapshot['tecverde_with_class'],
+                    "with_subclass": snapshot['tecverde_with_subclass']
+                }
+                tv_classes = [f"- {classe}: {count} projetos" for classe, count in get_tecverde_class_counts()]
+                
+                detailed_stats["tecverde"] = {
+                    "texto": f"""
+                    ESTATÍSTICAS DETALHADAS DE TECNOLOGIA VERDE:
                     
-                    tv_classes = []
-                    for row in tecverde_classes_result:
-                        tv_classes.append(f"- {row[0]}: {row[1]} projetos")
+                    Total de projetos com tecnologia verde: {tv_stats.get('unique_projects', 0)}
+                    Projetos com classe definida: {tv_stats.get('with_class', 0)} ({round(tv_stats.get('with_class', 0)/tv_stats.get('unique_projects', 1)*100 if tv_stats.get('unique_projects', 0) > 0 else 0, 1)}%)
+                    Projetos com subclasse definida: {tv_stats.get('with_subclass', 0)} ({round(tv_stats.get('with_subclass', 0)/tv_stats.get('unique_projects', 1)*100 if tv_stats.get('unique_projects', 0) > 0 else 0, 1)}%)
                     
-                    detailed_stats["tecverde"] = {
-                        "texto": f"""
-                        ESTATÍSTICAS DETALHADAS DE TECNOLOGIA VERDE:
-                        
-                        Total de projetos com tecnologia verde: {tv_stats.get('unique_projects', 0)}
-                        Projetos com classe definida: {tv_stats.get('with_class', 0)} ({round(tv_stats.get('with_class', 0)/tv_stats.get('unique_projects', 1)*100 if tv_stats.get('unique_projects', 0) > 0 else 0, 1)}%)
-                        Projetos com subclasse definida: {tv_stats.get('with_subclass', 0)} ({round(tv_stats.get('with_subclass', 0)/tv_stats.get('unique_projects', 1)*100 if tv_stats.get('unique_projects', 0) > 0 else 0, 1)}%)
-                        
-                        Distribuição por classe:
-                        {chr(10).join(tv_classes[:10])}
-                        """,
-                        "prioridade": 1
-                    }
+                    Distribuição por classe:
+                    {chr(10).join(tv_classes[:10])}
+                    """,
+                    "prioridade": 1
+                }
             
             if "sugestão" in query.lower() or "ia" in query.lower():
                 # Já temos essa informação na função específica
@@ -485,36 +501,19 @@ class RAGAssistant:
                     "prioridade": 1
                 }
             
-            # Obter estatísticas básicas para todos os casos
-            with db.engine.connect() as connection:
-                # Consulta otimizada para obter todas as estatísticas básicas de uma vez
-                stats_result = connection.execute(text("""
-                    WITH stats AS (
-                        SELECT 
-                            (SELECT COUNT(*) FROM gepes.projetos) AS total_projects,
-                            (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.categorias c ON p.id = c.id_projeto) AS categorized_projects,
-                            (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.tecnologias_verdes tv ON p.id = tv.id_projeto WHERE tv.se_aplica = true) AS tecverde_projects,
-                            (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.ai_suggestions ais ON p.id = ais.id_projeto) AS ai_suggested_projects,
-                            (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.categorias c ON p.id = c.id_projeto WHERE p.ai_rating_aia_user IS NOT NULL) AS human_validated_projects
-                    )
-                    SELECT * FROM stats
-                """))
-                
-                stats_row = stats_result.fetchone()
-                # Convert Row to dict explicitly
-                stats = {}
-                if stats_row:
-                    stats = {
-                        "total_projects": stats_row[0],
-                        "categorized_projects": stats_row[1],
-                        "tecverde_projects": stats_row[2],
-                        "ai_suggested_projects": stats_row[3],
-                        "human_validated_projects": stats_row[4]
-                    }
-                
-                # Calcular estatísticas derivadas
-                ai_classified = stats.get('categorized_projects', 0) - stats.get('human_validated_projects', 0)
-                uncategorized = stats.get('total_projects', 0) - stats.get('categorized_projects', 0)
+            # Estatísticas básicas do snapshot compartilhado com o dashboard
+            snapshot = get_statistics()
+            stats = {
+                "total_projects": snapshot['total_projects'],
+                "categorized_projects": snapshot['categorized_projects'],
+                "tecverde_projects": snapshot['tecverde_registered_projects'],
+                "ai_suggested_projects": snapshot['projects_with_ai_suggestions'],
+                "human_validated_projects": snapshot['human_validated_projects']
+            }
+            
+            # Calcular estatísticas derivadas
+            ai_classified = stats['categorized_projects'] - stats['human_validated_projects']
+            uncategorized = stats['total_projects'] - stats['categorized_projects']
             
             # Formatar estatísticas básicas
             basic_stats = f"""
@@ -664,36 +663,11 @@ class RAGAssistant:
     def _get_projects_info(self):
         """Get information about projects"""
         try:
-            # Consulta SQL otimizada para obter todas as contagens de uma vez
-            with db.engine.connect() as connection:
-                projects_stats_result = connection.execute(text("""
-                    SELECT 
-                        (SELECT COUNT(*) FROM gepes.projetos) AS total_projects,
-                        (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.categorias c ON p.id = c.id_projeto) AS categorized_projects,
-                        (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.tecnologias_verdes tv ON p.id = tv.id_projeto WHERE tv.se_aplica = true) AS tecverde_projects
-                    
-                """))
-                
-                # CORRIGIDO: Usar índices numéricos para obter valores da linha
-                stats_row = projects_stats_result.fetchone()
-                stats = {}
-                if stats_row:  # Check if row exists before processing
-                    stats = {
-                        "total_projects": stats_row[0],
-                        "categorized_projects": stats_row[1],
-                        "tecverde_projects": stats_row[2]
-                    }
-                else:
-                    # Default values if query returns no results
-                    stats = {
-                        "total_projects": 0,
-                        "categorized_projects": 0,
-                        "tecverde_projects": 0
-                    }
-                    
-                total_projects = stats.get("total_projects", 0)
-                categorized_projects = stats.get("categorized_projects", 0)
-                tecverde_projects = stats.get("tecverde_projects", 0)
+            # Contagens do snapshot compartilhado com o dashboard
+            snapshot = get_statistics()
+            total_projects = snapshot['total_projects']
+            categorized_projects = snapshot['categorized_projects']
+            tecverde_projects = snapshot['tecverde_registered_projects']
             
             # Get recent projects with improved efficiency
             with db.engine.connect() as connection:
@@ -831,32 +805,19 @@ class RAGAssistant:
     def _get_statistics_info(self):
         """Get statistical information"""
         try:
-            # Consulta SQL otimizada para obter todas as estatísticas em uma única chamada
-            with db.engine.connect() as connection:
-                stats_result = connection.execute(text("""
-                    SELECT 
-                        (SELECT COUNT(*) FROM gepes.projetos) AS total_projects,
-                        (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.categorias c ON p.id = c.id_projeto) AS categorized_projects,
-                        (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.tecnologias_verdes tv ON p.id = tv.id_projeto WHERE tv.se_aplica = true) AS tecverde_projects,
-                        (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.ai_suggestions ais ON p.id = ais.id_projeto) AS ai_suggested_projects,
-                        (SELECT COUNT(*) FROM gepes.projetos p JOIN gepes.categorias c ON p.id = c.id_projeto WHERE p.ai_rating_aia_user IS NOT NULL) AS human_validated_projects
-                """))
-                
-                stats_row = stats_result.fetchone()
-                # Convert Row to dict explicitly
-                stats = {}
-                if stats_row:
-                    stats = {
-                        "total_projects": stats_row[0],
-                        "categorized_projects": stats_row[1],
-                        "tecverde_projects": stats_row[2],
-                        "ai_suggested_projects": stats_row[3],
-                        "human_validated_projects": stats_row[4]
-                    }
-                
-                # Calcular estatísticas derivadas
-                ai_classified = stats.get('categorized_projects', 0) - stats.get('human_validated_projects', 0)
-                uncategorized = stats.get('total_projects', 0) - stats.get('categorized_projects', 0)
+            # Estatísticas do snapshot compartilhado com o dashboard
+            snapshot = get_statistics()
+            stats = {
+                "total_projects": snapshot['total_projects'],
+                "categorized_projects": snapshot['categorized_projects'],
+                "tecverde_projects": snapshot['tecverde_registered_projects'],
+                "ai_suggested_projects": snapshot['projects_with_ai_suggestions'],
+                "human_validated_projects": snapshot['human_validated_projects']
+            }
+            
+            # Calcular estatísticas derivadas
+            ai_classified = stats['categorized_projects'] - stats['human_validated_projects']
+            uncategorized = stats['total_projects'] - stats['categorized_projects']
             
             return f"""
             ESTATÍSTICAS DO SISTEMA:
@@ -917,54 +878,15 @@ class RAGAssistant:
             if cached_result:
                 return cached_result
             
-            # Consulta otimizada para busca de projetos - utilizando múltiplos critérios
-            with db.engine.connect() as connection:
-                search_sql = """
-                WITH project_search AS (
-                    SELECT 
-                        p.id, p.codigo_projeto, p.titulo,
-                        CASE
-                            WHEN p.titulo ILIKE :exact_query THEN 10
-                            WHEN p.codigo_projeto ILIKE :exact_query THEN 9
-                            WHEN p.titulo ILIKE :partial_query THEN 8
-                            WHEN p.codigo_projeto ILIKE :partial_query THEN 7
-                            WHEN p.titulo ILIKE :broad_query THEN 6
-                            WHEN p.objetivo ILIKE :partial_query THEN 5
-                            WHEN p.descricao_publica ILIKE :partial_query THEN 4
-                            WHEN p.objetivo ILIKE :broad_query THEN 3
-                            WHEN p.descricao_publica ILIKE :broad_query THEN 2
-                            ELSE 1
-                        END as relevance
-                    FROM gepes.projetos p
-                    WHERE 
-                        p.titulo ILIKE :broad_query OR
-                        p.codigo_projeto ILIKE :broad_query OR
-                        p.objetivo ILIKE :broad_query OR
-                        p.descricao_publica ILIKE :broad_query
-                )
-                SELECT id, codigo_projeto, titulo
-                FROM project_search
-                ORDER BY relevance DESC, titulo
-                LIMIT 5
-                """
-                
-                projects_result = connection.execute(
-                    text(search_sql),
-                    {
-                        "exact_query": query,
-                        "partial_query": f"%{query}%",
-                        "broad_query": f"%{' '.join(['%' + word + '%' for word in query.split()])}%"
-                    }
-                )
-                
-                projects = [
-                    {"id": row[0], "codigo_projeto": row[1], "titulo": row[2]} 
-                    for row in projects_result
-                ]
+            # Versões dos dados lidas antes da busca (marcam o resultado armazenado no cache)
+            versions = get_data_versions(CONTEXT_BLOCK_DOMAINS['busca_projetos'])
+            
+            # Busca textual ranqueada (tsvector em português quando disponível)
+            projects = search_projects(query, limit=5)
             
             if not projects:
                 result = f"Nenhum projeto encontrado com o termo '{query}'."
-                self.cache.set(cache_key, result)
+                self.cache.set(cache_key, result, versions=versions)
                 return result
             
             # Consulta otimizada para obter detalhes em uma única operação
@@ -1030,7 +952,7 @@ class RAGAssistant:
                 result += "\n"
             
             # Armazenar no cache
-            self.cache.set(cache_key, result)
+            self.cache.set(cache_key, result, versions=versions)
             
             return result
         except Exception as e:
@@ -0,0 +1,228 @@
+"""
+Fila de revisão de projetos (gepes.fila_revisao) usada por next_project.
+
+A fila guarda os projetos ainda não validados por humano com a prioridade de revisão
+(classificados pela IA antes dos não classificados) e é mantida nas mesmas escritas que
+recalculam o status de classificação. Cada revisor reserva o próximo projeto com uma única
+consulta pelo índice (prioridade, id_projeto) usando FOR UPDATE SKIP LOCKED: dois revisores
+pedindo o próximo projeto ao mesmo tempo nunca recebem o mesmo, e a reserva impede que o
+projeto seja oferecido a outro revisor até expirar.
+"""
+import logging
+from datetime import datetime, timedelta
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import case, delete, exists, insert, or_, select, true, update
+from app.classification_status import STATUS_CLASSIFICADO_IA, STATUS_NAO_CLASSIFICADO, status_is
+from app.models import FilaRevisao, Projeto, db
+from config import Config
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Prioridades da fila (menor primeiro), na ordem de next_project
+PRIORIDADE_CLASSIFICADO_IA = 0
+PRIORIDADE_NAO_CLASSIFICADO = 1
+
+
+def _lease_seconds():
+    if has_app_context():
+        return current_app.config.get('REVIEW_QUEUE_LEASE_SECONDS', Config.REVIEW_QUEUE_LEASE_SECONDS)
+    return Config.REVIEW_QUEUE_LEASE_SECONDS
+
+
+def _priority():
+    """Prioridade do projeto (Projeto) na fila, derivada do status de classificação."""
+    return case(
+        (status_is(STATUS_CLASSIFICADO_IA), PRIORIDADE_CLASSIFICADO_IA),
+        else_=PRIORIDADE_NAO_CLASSIFICADO
+    )
+
+
+def sync_review_queue(project_ids=None):
+    """
+    Atualiza a fila na sessão atual a partir do status dos projetos (chamar antes do commit).
+
+    Remove os projetos validados ou excluídos, ajusta a prioridade dos que receberam
+    sugestão da IA e inclui os projetos pendentes que ainda não estão na fila. As reservas
+    existentes são mantidas.
+
+    Args:
+        project_ids: IDs dos projetos alterados; None sincroniza todos (ex.: importações)
+
+    Returns:
+        Número de linhas da fila incluídas, alteradas ou removidas
+    """
+    if project_ids is not None:
+        project_ids = [project_id for project_id in project_ids if project_id is not None]
+        if not project_ids:
+            return 0
+
+    fila = FilaRevisao.__table__
+    queue_scope = fila.c.id_projeto.in_(project_ids) if project_ids is not None else true()
+    project_scope = Projeto.id.in_(project_ids) if project_ids is not None else true()
+    pending = status_is(STATUS_NAO_CLASSIFICADO, STATUS_CLASSIFICADO_IA)
+
+    # As categorias e sugestões criadas nesta sessão precisam estar no banco
+    db.session.flush()
+
+    removed = db.session.execute(
+        delete(fila).where(
+            queue_scope,
+            fila.c.id_projeto.not_in(select(Projeto.id).where(project_scope, pending))
+        )
+    ).rowcount
+
+    priority = select(_priority()).where(Projeto.id == fila.c.id_projeto).scalar_subquery()
+    changed = db.session.execute(
+        update(fila).where(queue_scope, fila.c.prioridade != priority).values(prioridade=priority)
+    ).rowcount
+
+    added = db.session.execute(
+        insert(fila).from_select(
+            ['id_projeto', 'prioridade'],
+            select(Projeto.id, _priority()).where(
+                project_scope,
+                pending,
+                ~exists().where(fila.c.id_projeto == Projeto.id)
+            )
+        )
+    ).rowcount
+
+    return (removed or 0) + (changed or 0) + (added or 0)
+
+
+def rebuild_review_queue():
+    """
+    Sincroniza a fila inteira com o status dos projetos e grava a alteração.
+
+    Returns:
+        Número de linhas da fila incluídas, alteradas ou removidas
+    """
+    try:
+        changed = sync_review_queue()
+        db.session.commit()
+        logger.info(f"Fila de revisão reconstruída ({changed} alterações)")
+        return changed
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro ao reconstruir a fila de revisão: {str(e)}")
+        raise
+
+
+def _available(user_id, now):
+    # Sem reserva, reserva expirada ou reservada pelo próprio revisor
+    return or_(
+        FilaRevisao.reservado_ate == None,
+        FilaRevisao.reservado_ate <= now,
+        FilaRevisao.reservado_por == user_id
+    )
+
+
+def _release_other_claims(user_id, project_id):
+    # Cada revisor mantém uma única reserva: liberar a anterior
+    db.session.execute(
+        update(FilaRevisao).where(FilaRevisao.reservado_por == user_id, FilaRevisao.id_projeto != project_id)
+        .values(reservado_por=None, reservado_ate=None)
+    )
+
+
+def _claim(user_id, after_project_id, now):
+    """Reserva o primeiro projeto disponível da fila (após after_project_id, se informado)."""
+    query = select(FilaRevisao, Projeto.codigo_projeto).join(
+        Projeto, Projeto.id == FilaRevisao.id_projeto
+    ).where(_available(user_id, now))
+    if after_project_id is not None:
+        query = query.where(FilaRevisao.id_projeto > after_project_id)
+    query = query.order_by(FilaRevisao.prioridade, FilaRevisao.id_projeto).limit(1).with_for_update(
+        skip_locked=True, of=FilaRevisao
+    )
+
+    row = db.session.execute(query).first()
+    if row is None:
+        return None
+
+    entry, codigo_projeto = row
+    entry.reservado_por = user_id
+    entry.reservado_ate = now + timedelta(seconds=_lease_seconds())
+    _release_other_claims(user_id, entry.id_projeto)
+    return codigo_projeto
+
+
+def claim_next_project(user_id, after_project_id=None):
+    """
+    Reserva para o revisor o próximo projeto da fila de revisão.
+
+    Segue a ordem de next_project: projetos classificados pela IA antes dos não
+    classificados, com ID maior que o projeto atual e, ao chegar ao fim, recomeçando do
+    início. Projetos reservados por outros revisores (ou bloqueados por uma reserva em
+    andamento) são pulados. Se a fila estiver vazia (ex.: tabela recém-criada), ela é
+    reconstruída uma vez a partir do status dos projetos.
+
+    Args:
+        user_id: ID do usuário revisor
+        after_project_id: ID do projeto atual (None para começar do início)
+
+    Returns:
+        Código do projeto reservado, ou None se não houver projetos disponíveis
+    """
+    attempts = [after_project_id, None] if after_project_id is not None else [None]
+    now = datetime.utcnow()
+    try:
+        for after in attempts:
+            codigo_projeto = _claim(user_id, after, now)
+            if codigo_projeto is not None:
+                db.session.commit()
+                return codigo_projeto
+
+        db.session.rollback()
+        if db.session.execute(select(FilaRevisao.id_projeto).limit(1)).first() is not None:
+            return None
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro ao reservar o próximo projeto da fila de revisão: {str(e)}")
+        return None
+
+    # Fila vazia: reconstruir e tentar novamente
+    if not rebuild_review_queue():
+        return None
+    return claim_next_project(user_id, after_project_id)
+
+
+def reserve_project(user_id, project_id):
+    """
+    Reserva para o revisor um projeto aberto diretamente (ex.: pela lista de projetos).
+
+    A reserva só é feita se o projeto estiver na fila e não estiver reservado por outro revisor.
+
+    Args:
+        user_id: ID do usuário revisor
+        project_id: ID do projeto
+
+    Returns:
+        True se o projeto ficou reservado para o revisor
+    """
+    now = datetime.utcnow()
+    try:
+        reserved = db.session.execute(
+            update(FilaRevisao).where(FilaRevisao.id_projeto == project_id, _available(user_id, now))
+            .values(reservado_por=user_id, reservado_ate=now + timedelta(seconds=_lease_seconds()))
+        ).rowcount
+        if reserved:
+            _release_other_claims(user_id, project_id)
+        db.session.commit()
+        return bool(reserved)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro ao reservar o projeto {project_id} na fila de revisão: {str(e)}")
+        return False
+
+
+def init_app(app):
+    """Registra o comando 'flask rebuild-review-queue'."""
+    @app.cli.command('rebuild-review-queue')
+    def rebuild_review_queue_command():
+        """Reconstrói a fila de revisão a partir do status dos projetos."""
+        changed = rebuild_review_queue()
+        click.echo(f"Fila de revisão sincronizada ({changed} alterações)")
@@ -1,8 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, session, Response
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models import Usuario, Projeto, Categoria, TecnologiaVerde, CategoriaLista, ClassificacaoAdicional, Log, AISuggestion, AIRating, db
 from app.forms import LoginForm, CategorizacaoForm, SettingsForm
 from app.ai_integration import OpenAIClient
+from app.suggestion_jobs import (EVENT_DONE, EVENT_FAILED, JOB_DONE, get_suggestion_prefetcher, get_suggestion_queue,
+                                 upcoming_projects_without_suggestion)
+from app.data_versions import (DOMINIO_CATEGORIAS, DOMINIO_LOGS, DOMINIO_PROJETOS, DOMINIO_TECVERDE,
+                               bump_data_versions)
+from app.taxonomy import get_taxonomy_snapshot, invalidate_taxonomy
+from app.taxonomy_service import get_categoria_lista_query, get_tecverde_classes, get_tecverde_subclasses
+from app.classification_status import refresh_classification_status
+from app.pagination import keyset_page
+from app.project_list import ProjectListItem, filter_by_status, get_suggestions_for_projects, project_list_query
+from app.project_search import project_search_filter
+from app.review_queue import claim_next_project, reserve_project
+from app.statistics_snapshot import get_statistics
 from config import Config
 import json
 import os
@@ -12,6 +24,9 @@ from sqlalchemy import func, distinct
 
 main = Blueprint('main', __name__)
 
+# Intervalo (segundos) entre comentários de keepalive no stream de sugestões
+SSE_KEEPALIVE_SECONDS = 15
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -36,11 +51,15 @@ def extract_name_from_email(email):
 
 # Métodos auxiliares para obter dados
 def _get_categories_lists():
+    """Obtém as listas de categorias a partir do snapshot da taxonomia."""
+    return get_taxonomy_snapshot('routes_categories_lists', _load_categories_lists)
+
+def _load_categories_lists():
     """Obtém as listas de categorias do banco de dados."""
     organized_lists = {}
     
     # Obter todas as categorias ativas usando a query segura
-    all_categories = _get_categoria_lista_query().filter_by(ativo=True).all()
+    all_categories = get_categoria_lista_query().filter_by(ativo=True).all()
     
     # Inicializar listas vazias para cada tipo
     for tipo in ['tecnologias_habilitadoras', 'areas_aplicacao', 'microarea', 'segmento', 'dominio']:
@@ -157,16 +176,6 @@ def _get_aia_data():
         }
     ]
 
-def _get_tecverde_classes():
-    """Obtém as classes de tecnologias verdes do banco de dados usando o método do OpenAIClient."""
-    openai_client = OpenAIClient(Config.get_openai_api_key())
-    return openai_client._get_tecverde_classes()
-
-def _get_tecverde_subclasses():
-    """Obtém as subclasses de tecnologias verdes do banco de dados usando o método do OpenAIClient."""
-    openai_client = OpenAIClient(Config.get_openai_api_key())
-    return openai_client._get_tecverde_subclasses()
-
 def _get_ai_ratings(project_id):
     """Obtém as avaliações mais recentes da IA para um projeto, independente do usuário."""
     from app.models import AIRating
@@ -255,59 +264,29 @@ def projects():
     try:
         # Obter parâmetros da requisição
         page = request.args.get('page', 1, type=int)
+        # Cursor opaco da página anterior (paginação por chave, sem OFFSET nem COUNT por página)
+        cursor = request.args.get('cursor', '')
         per_page = 20  # Reduzido para melhor desempenho com infinite scroll
         search = request.args.get('search', '')
         filter_type = request.args.get('filter', 'all')
         tecverde_filter = request.args.get('tecverde', 'all')
         is_ajax = request.args.get('ajax', '0') == '1'
         
-        # Obter classes e subclasses de tecnologias verdes do banco de dados
-        from app.ai_integration import OpenAIClient
-        openai_client = OpenAIClient(Config.get_openai_api_key())
-        tecverde_classes = openai_client._get_tecverde_classes()
-        tecverde_subclasses = openai_client._get_tecverde_subclasses()
-        
-        # Carregar projetos com eager loading para evitar consultas N+1
-        from sqlalchemy.orm import joinedload
-        from sqlalchemy import or_
-        
-        # Iniciar a consulta base
-        query = Projeto.query.options(
-            joinedload(Projeto.categoria)
-            # Removido joinedload(Projeto.ai_ratings) porque ai_ratings é lazy='dynamic'
-            # e não suporta eager loading
-        )
+        # Obter classes e subclasses de tecnologias verdes do snapshot da taxonomia
+        tecverde_classes = get_tecverde_classes()
+        tecverde_subclasses = get_tecverde_subclasses()
+        
+        # Iniciar a consulta base: apenas as colunas exibidas na listagem, com a existência de
+        # categoria e de sugestão da IA calculada por EXISTS (sem carregar objetos Projeto)
+        query = project_list_query()
         
         # Aplicar filtro de busca se fornecido
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Projeto.titulo.ilike(search_term),
-                    Projeto.codigo_projeto.ilike(search_term),
-                    Projeto.unidade_embrapii.ilike(search_term),
-                    Projeto._aia_n1_macroarea.ilike(search_term),
-                    Projeto._aia_n2_segmento.ilike(search_term)
-                )
-            )
+            query = query.filter(project_search_filter(search))
         
         # Aplicar filtro de categoria se fornecido
         if filter_type != 'all' and filter_type in ['uncategorized', 'ai_classified', 'human_validated']:
-            if filter_type == 'uncategorized':
-                # Projetos sem categoria e sem sugestão da IA
-                query = query.outerjoin(Categoria).outerjoin(AISuggestion).filter(
-                    Categoria.id_projeto == None,
-                    AISuggestion.id_projeto == None
-                )
-            elif filter_type == 'ai_classified':
-                # Projetos classificados por IA (tem sugestão da IA mas não tem categoria)
-                query = query.outerjoin(Categoria).outerjoin(AISuggestion).filter(
-                    Categoria.id_projeto == None,
-                    AISuggestion.id_projeto == Projeto.id
-                )
-            elif filter_type == 'human_validated':
-                # Projetos validados por humano (tem categoria)
-                query = query.join(Categoria)
+            query = filter_by_status(query, filter_type)
         
         # Aplicar filtro de Tec Verde se fornecido
         if tecverde_filter != 'all':
@@ -332,75 +311,47 @@ def projects():
                     Projeto.tecverde_subclasse == subclasse
                 )
         
-        # Executar a consulta com paginação
-        projects_query = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        projects_data = projects_query.items
-        
-        # Obter IDs dos projetos na página atual para filtrar sugestões da IA
-        project_ids = [p.id for p in projects_data]
-        
-        # Obter apenas as sugestões da IA para os projetos na página atual
-        ai_suggestions = AISuggestion.query.filter(
-            AISuggestion.id_projeto.in_(project_ids)
-        ).all()
-        
-        # Criar um dicionário de sugestões para acesso mais rápido
-        ai_suggestions_by_project = {s.id_projeto: s for s in ai_suggestions}
-        ai_suggestions_dict = [suggestion.to_dict() for suggestion in ai_suggestions]
-        
-        # Definir atributos para cada projeto
-        for project in projects_data:
-            # Verificar se o projeto tem categoria (já foi classificado)
-            project.categorizado = project.categoria is not None
-            
-            # Verificar se o projeto tem sugestão da IA usando o dicionário
-            project.ai_classified = project.id in ai_suggestions_by_project
-            
-            # Marcar o projeto como validado por humano apenas se tiver categoria
-            project.human_validated = project.categorizado
-            
-            # Log para depuração
-            if project.human_validated:
-                logger.info(f"Projeto {project.codigo_projeto} (ID: {project.id}) marcado como validado por humano")
+        # Executar a consulta paginada por Projeto.id; clientes que ainda enviam apenas o
+        # número da página recebem o deslocamento equivalente
+        offset = (page - 1) * per_page if page > 1 else None
+        rows, next_cursor = keyset_page(query, Projeto.id, cursor, per_page, offset=offset)
+        projects_data = [ProjectListItem(row) for row in rows]
+        has_next = next_cursor is not None
+        next_page = page + 1 if has_next else None
+        
+        # Total calculado apenas na primeira página; sem filtros, vem do snapshot de estatísticas
+        total = None
+        if not cursor and page <= 1:
+            if not search and filter_type == 'all' and tecverde_filter == 'all':
+                total = get_statistics()['total_projects']
+            else:
+                total = query.with_entities(Projeto.id).order_by(None).count()
         
         # Se for uma requisição AJAX, retornar apenas os dados dos projetos em formato JSON
         if is_ajax:
-            # Preparar dados para JSON
-            projects_json = []
-            for project in projects_data:
-                project_dict = {
-                    'id': project.id,
-                    'codigo_projeto': project.codigo_projeto,
-                    'titulo': project.titulo,
-                    'unidade_embrapii': project.unidade_embrapii,
-                    'data_contrato': project.data_contrato,
-                    '_aia_n1_macroarea': project._aia_n1_macroarea,
-                    '_aia_n2_segmento': project._aia_n2_segmento,
-                    'tecverde_se_aplica': project.tecverde_se_aplica,
-                    'tecverde_classe': project.tecverde_classe,
-                    'tecverde_subclasse': project.tecverde_subclasse,
-                    'human_validated': project.human_validated,
-                    'ai_classified': project.ai_classified
-                }
-                projects_json.append(project_dict)
+            projects_json = [project.to_dict() for project in projects_data]
             
-            return jsonify({
+            response = {
                 'projects': projects_json,
-                'has_next': projects_query.has_next,
-                'next_page': projects_query.next_num if projects_query.has_next else None,
-                'total': projects_query.total
-            })
+                'has_next': has_next,
+                'next_page': next_page,
+                'next_cursor': next_cursor
+            }
+            if total is not None:
+                response['total'] = total
+            return jsonify(response)
         
         # Para requisições normais, renderizar o template
         return render_template(
             'projects.html', 
             projects=projects_data, 
-            ai_suggestions=ai_suggestions_dict,
-            pagination=projects_query,
-            total_projects=projects_query.total,
-            has_next=projects_query.has_next,
-            next_page=projects_query.next_num if projects_query.has_next else None,
+            # Campos de tecnologia verde das sugestões da IA dos projetos da página
+            ai_suggestions=get_suggestions_for_projects([project.id for project in projects_data]),
+            current_page=page,
+            total_projects=total if total is not None else get_statistics()['total_projects'],
+            has_next=has_next,
+            next_page=next_page,
+            next_cursor=next_cursor,
             tecverde_classes=tecverde_classes,
             tecverde_subclasses=tecverde_subclasses
         )
@@ -455,6 +406,7 @@ def log_categorization(project_id, used_ai=False, validation_info=None, user_mod
             log.ai_rating_tecverde = tecverde_rating.rating
         
         db.session.add(log)
+        bump_data_versions(DOMINIO_LOGS)
         db.session.commit()
         
         logger.info(f"Log de categorização registrado para projeto {project_id}")
@@ -481,43 +433,6 @@ def get_project_logs(project_id):
         logger.error(f"Erro ao obter logs do projeto: {str(e)}")
         return []
 
-# Função para obter categorias do banco de dados de forma segura
-def _get_categoria_lista_query():
-    """
-    Retorna uma query para CategoriaLista que é segura mesmo se a coluna 'descricao' não existir.
-    """
-    try:
-        # Verificar se a coluna 'descricao' existe na tabela
-        from sqlalchemy import inspect
-        inspector = inspect(db.engine)
-        columns = [col['name'] for col in inspector.get_columns('categoria_listas', schema='gepes')]
-        
-        if 'descricao' in columns:
-            # Se a coluna existe, incluí-la na query
-            return CategoriaLista.query
-        else:
-            # Se a coluna não existe, criar uma query que não inclui a coluna
-            from sqlalchemy import select
-            from sqlalchemy.orm import aliased
-            
-            # Criar um alias para a tabela CategoriaLista
-            CategoriaListaAlias = aliased(CategoriaLista)
-            
-            # Criar uma query que seleciona apenas as colunas que existem
-            query = select(
-                CategoriaListaAlias.id,
-                CategoriaListaAlias.tipo,
-                CategoriaListaAlias.valor,
-                CategoriaListaAlias.ativo
-            ).select_from(CategoriaListaAlias)
-            
-            # Converter para uma query SQLAlchemy
-            return db.session.query(CategoriaListaAlias.id, CategoriaListaAlias.tipo, CategoriaListaAlias.valor, CategoriaListaAlias.ativo)
-    except Exception as e:
-        logger.error(f"Erro ao criar query para CategoriaLista: {str(e)}")
-        # Em caso de erro, retornar uma query simples que não inclui a coluna 'descricao'
-        return db.session.query(CategoriaLista.id, CategoriaLista.tipo, CategoriaLista.valor, CategoriaLista.ativo)
-
 # Rota para categorização de um projeto
 @main.route('/categorize/<project_id>', methods=['GET', 'POST'])
 @login_required
@@ -593,7 +508,9 @@ def categorize(project_id):
                     )
                     db.session.add(adicional)
             
-            # Salvar mudanças
+            # Salvar mudanças (incrementando as versões lidas pelo cache do chatbot)
+            refresh_classification_status([project.id])
+            bump_data_versions(DOMINIO_PROJETOS, DOMINIO_CATEGORIAS)
             db.session.commit()
             
             # Registrar log
@@ -605,6 +522,9 @@ def categorize(project_id):
         # Para requisição GET, mostrar formulário de categorização
         form = CategorizacaoForm()
         
+        # Reservar o projeto para este revisor, para que next_project não o ofereça a outros
+        reserve_project(current_user.id, project.id)
+        
         # Obter listas de categorias
         categories_lists = _get_categories_lists()
         
@@ -642,51 +562,20 @@ def categorize(project_id):
         if ai_suggestion:
             ai_suggestion = ai_suggestion.to_dict()
         
-        # Se não existe sugestão e o openai_api_key está configurado, gerar sugestão
-        if not ai_suggestion:
-            openai_api_key = Config.get_openai_api_key()
-            if openai_api_key:
-                try:
-                    # Criar cliente OpenAI
-                    openai_client = OpenAIClient(openai_api_key)
-                    
-                    # Obter dados de categorias do banco de dados
-                    # O método suggest_categories irá chamar _get_aia_data_from_db internamente
-                    ai_suggestion = openai_client.suggest_categories(project.__dict__)
-                    
-                    # Adicionar ID do projeto
-                    ai_suggestion['project_id'] = project.id
-                    
-                    # A função suggest_categories já deve ter salvo a sugestão no banco
-                    # Mas verificamos aqui como garantia
-                    if not AISuggestion.query.filter_by(id_projeto=project.id).first():
-                        suggestion = AISuggestion(
-                            id_projeto=project.id,
-                            _aia_n1_macroarea=ai_suggestion.get('_aia_n1_macroarea', ''),
-                            _aia_n2_segmento=ai_suggestion.get('_aia_n2_segmento', ''),
-                            _aia_n3_dominio_afeito=ai_suggestion.get('_aia_n3_dominio_afeito', ''),
-                            _aia_n3_dominio_outro=ai_suggestion.get('_aia_n3_dominio_outro', ''),
-                            confianca=ai_suggestion.get('confianca', ''),
-                            justificativa=ai_suggestion.get('justificativa', ''),
-                            tecverde_se_aplica=ai_suggestion.get('tecverde_se_aplica', False),
-                            tecverde_classe=ai_suggestion.get('tecverde_classe', ''),
-                            tecverde_subclasse=ai_suggestion.get('tecverde_subclasse', ''),
-                            tecverde_confianca=ai_suggestion.get('tecverde_confianca', ''),
-                            tecverde_justificativa=ai_suggestion.get('tecverde_justificativa', ''),
-                            timestamp=datetime.now()
-                        )
-                        
-                        # Log para depuração do valor de tecverde_se_aplica
-                        logger.info(f"Valor de tecverde_se_aplica recebido da IA: {ai_suggestion.get('tecverde_se_aplica')}, tipo: {type(ai_suggestion.get('tecverde_se_aplica'))}")
-                        logger.info(f"Valor de tecverde_se_aplica armazenado: {suggestion.tecverde_se_aplica}, tipo: {type(suggestion.tecverde_se_aplica)}")
-                        db.session.add(suggestion)
-                        db.session.commit()
-                except Exception as e:
-                    logger.error(f"Erro ao obter sugestão da IA: {str(e)}")
+        # Se não existe sugestão e o openai_api_key está configurado, enfileirar a geração em
+        # segundo plano; a página é exibida imediatamente e acompanha o job pelo stream
+        ai_suggestion_stream = None
+        if not ai_suggestion and Config.get_openai_api_key():
+            get_suggestion_queue().enqueue(current_app._get_current_object(), project.id)
+            ai_suggestion_stream = url_for('main.stream_suggest_categories', project_id=project.id)
+        
+        # Pré-gerar as sugestões dos próximos projetos que next_project vai abrir
+        if Config.get_openai_api_key():
+            _prefetch_next_suggestions(project.id)
         
         # Obter dados para tecnologias verdes
-        tecverde_classes = _get_tecverde_classes()
-        tecverde_subclasses = _get_tecverde_subclasses()
+        tecverde_classes = get_tecverde_classes()
+        tecverde_subclasses = get_tecverde_subclasses()
         
         # Obter avaliações da IA
         ai_ratings = _get_ai_ratings(project.id)
@@ -701,6 +590,8 @@ def categorize(project_id):
             categories_lists=categories_lists,
             existing=existing,
             ai_suggestion=ai_suggestion,
+            ai_suggestion_stream=ai_suggestion_stream,
+            suggestion_stream_enabled=current_app.config.get('SUGGESTION_STREAM_ENABLED', Config.SUGGESTION_STREAM_ENABLED),
             openai_enabled=bool(Config.get_openai_api_key()),
             project_logs=project_logs,
             tecverde_classes=tecverde_classes,
@@ -715,6 +606,28 @@ def categorize(project_id):
         logger.error(f"Erro na categorização: {str(e)}")
         return redirect(url_for('main.projects'))
 
+def _prefetch_next_suggestions(project_id):
+    """
+    Enfileira a geração das sugestões dos próximos projetos sem sugestão da fila de revisão.
+    
+    Args:
+        project_id: ID do projeto aberto pelo usuário
+    """
+    try:
+        ahead = current_app.config.get('SUGGESTION_PREFETCH_AHEAD', 0)
+        if ahead <= 0:
+            return
+        
+        project_ids = upcoming_projects_without_suggestion(project_id, ahead)
+        if project_ids:
+            enqueued = get_suggestion_prefetcher(current_app.config).prefetch(
+                current_app._get_current_object(), current_user.id, project_ids
+            )
+            if enqueued:
+                logger.info(f"Sugestões pré-geradas enfileiradas para os projetos {enqueued}")
+    except Exception as e:
+        logger.error(f"Erro ao pré-gerar sugestões dos próximos projetos: {str(e)}")
+
 # Rota para salvar tecnologias verdes
 @main.route('/save_tecverde/<project_id>', methods=['POST'])
 @login_required
@@ -753,6 +666,7 @@ def save_tecverde(project_id):
         tecverde.observacoes = data.get('tecverde_observacoes', '')
         
         # Salvar mudanças
+        bump_data_versions(DOMINIO_PROJETOS, DOMINIO_TECVERDE)
         db.session.commit()
         
         # Registrar log
@@ -796,10 +710,11 @@ def suggest_categories():
         
         # Obter sugestões de categorias
         # O método suggest_categories irá obter as categorias do banco de dados
-        suggestions = openai_client.suggest_categories(project.__dict__)
+        # ("force" ignora o cache de sugestões e consulta a API novamente)
+        suggestions = openai_client.suggest_categories(project.__dict__, force=bool(data.get('force', False)))
         
-        # Armazenar a sugestão na sessão para uso posterior
-        session['ai_suggestion'] = suggestions
+        # Armazenar a sugestão na sessão para uso posterior (com o projeto a que pertence)
+        session['ai_suggestion'] = dict(suggestions, project_id=project.id)
         
         return jsonify(suggestions)
         
@@ -807,6 +722,69 @@ def suggest_categories():
         logger.error(f"Erro ao sugerir categorias: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# Rotas da fila de sugestões em segundo plano
+@main.route('/api/suggestion-jobs', methods=['POST'])
+@login_required
+def enqueue_suggestion_job():
+    data = request.json or {}
+    project_id = data.get('project_id')
+    
+    if not project_id:
+        return jsonify({'error': 'ID do projeto não fornecido'}), 400
+    
+    if not Config.get_openai_api_key():
+        return jsonify({'error': 'Chave da API OpenAI não configurada'}), 400
+    
+    project = Projeto.query.get_or_404(project_id)
+    job, _ = get_suggestion_queue().enqueue(
+        current_app._get_current_object(), project.id, force=bool(data.get('force', False))
+    )
+    return jsonify(job.to_dict()), 202
+
+@main.route('/api/suggestion-jobs/<int:project_id>')
+@login_required
+def suggestion_job_status(project_id):
+    job = get_suggestion_queue().get(project_id)
+    if job is not None:
+        return jsonify(job.to_dict())
+    
+    # Sem job neste processo: a sugestão pode já ter sido gerada (por outro processo ou antes)
+    stored_suggestion = AISuggestion.query.filter_by(id_projeto=project_id).first()
+    if stored_suggestion:
+        return jsonify({'project_id': project_id, 'status': JOB_DONE, 'partial': {},
+                        'result': stored_suggestion.to_dict(), 'error': None})
+    
+    return jsonify({'project_id': project_id, 'status': None, 'partial': {}, 'result': None, 'error': None})
+
+# Rota para sugestão de categorias via server-sent events: cada etapa do job é enviada assim que validada
+@main.route('/api/suggest-categories/stream/<int:project_id>')
+@login_required
+def stream_suggest_categories(project_id):
+    if not Config.get_openai_api_key():
+        return jsonify({'error': 'Chave da API OpenAI não configurada'}), 400
+    
+    project = Projeto.query.get_or_404(project_id)
+    job, _ = get_suggestion_queue().enqueue(
+        current_app._get_current_object(), project.id, force=request.args.get('force') == '1'
+    )
+    
+    def generate():
+        received = 0
+        while True:
+            events = job.wait_events(received, SSE_KEEPALIVE_SECONDS)
+            if not events:
+                # Comentário SSE para manter a conexão aberta em proxies com timeout de inatividade
+                yield ": keepalive\n\n"
+                continue
+            received += len(events)
+            for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+                if event in (EVENT_DONE, EVENT_FAILED):
+                    return
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Rota para validação de sugestões da IA
 @main.route('/api/validate-suggestion', methods=['POST'])
 @login_required
@@ -830,8 +808,15 @@ def validate_suggestion():
         if not project_id:
             return jsonify({'error': 'ID do projeto não fornecido'}), 400
         
-        # Obter a sugestão da IA da sessão
+        # Obter a sugestão da IA da sessão, se for deste projeto (ou do banco, quando ela foi
+        # gerada pelo job em segundo plano ou a sessão guarda a sugestão de outro projeto)
         suggestion = session.get('ai_suggestion')
+        if suggestion and str(suggestion.get('project_id')) != str(project_id):
+            suggestion = None
+        if not suggestion:
+            stored_suggestion = AISuggestion.query.filter_by(id_projeto=project_id).first()
+            if stored_suggestion:
+                suggestion = stored_suggestion.to_dict()
         
         if not suggestion:
             return jsonify({'error': 'Nenhuma sugestão da IA encontrada na sessão'}), 400
@@ -868,6 +853,8 @@ def validate_suggestion():
         categoria.dominio_outros = result.get('_aia_n3_dominio_outro', '')
         
         # Salvar mudanças
+        refresh_classification_status([project.id])
+        bump_data_versions(DOMINIO_PROJETOS, DOMINIO_CATEGORIAS)
         db.session.commit()
         
         # Registrar log da categorização
@@ -900,7 +887,7 @@ def add_dominio():
         valor_dominio = f"{microarea}|{segmento}|{novo_dominio}"
         
         # Verificar se o domínio já existe
-        existente = _get_categoria_lista_query().filter_by(
+        existente = get_categoria_lista_query().filter_by(
             tipo='dominio', 
             valor=valor_dominio
         ).first()
@@ -915,13 +902,14 @@ def add_dominio():
             ativo=True
         )
         db.session.execute(dominio)
+        invalidate_taxonomy()
         db.session.commit()
         
         # Buscar domínios atualizados para esta combinação de macroárea e segmento
         dominios_por_microarea_segmento = {}
         
         # Obter todas as categorias de domínio ativas usando a query segura
-        all_dominios = _get_categoria_lista_query().filter_by(tipo='dominio', ativo=True).all()
+        all_dominios = get_categoria_lista_query().filter_by(tipo='dominio', ativo=True).all()
         
         # Processar cada domínio para extrair a estrutura hierárquica
         for cat in all_dominios:
@@ -1321,49 +1309,14 @@ def clear_chat():
 def next_project(current_project_id):
     try:
         # Buscar o projeto atual para obter seu ID
-        current_project = Projeto.query.filter_by(codigo_projeto=current_project_id).first_or_404()
+        current_project = db.session.query(Projeto.id).filter_by(codigo_projeto=current_project_id).first_or_404()
         
-        # Primeiro, tentar encontrar o próximo projeto classificado por IA mas não validado por humano
-        next_project = Projeto.query.join(
-            AISuggestion, Projeto.id == AISuggestion.id_projeto
-        ).outerjoin(
-            Categoria, Projeto.id == Categoria.id_projeto
-        ).filter(
-            Categoria.id_projeto == None,  # Não tem categoria (não validado por humano)
-            Projeto.id > current_project.id  # ID maior que o atual (próximo)
-        ).order_by(Projeto.id).first()
-        
-        # Se não encontrou, buscar qualquer projeto não classificado
-        if not next_project:
-            next_project = Projeto.query.outerjoin(
-                Categoria, Projeto.id == Categoria.id_projeto
-            ).filter(
-                Categoria.id_projeto == None,  # Não tem categoria (não classificado)
-                Projeto.id > current_project.id  # ID maior que o atual (próximo)
-            ).order_by(Projeto.id).first()
-            
-        # Se ainda não encontrou, pegar o primeiro projeto (recomeçar do início)
-        if not next_project:
-            # Primeiro tentar projetos classificados por IA mas não validados
-            next_project = Projeto.query.join(
-                AISuggestion, Projeto.id == AISuggestion.id_projeto
-            ).outerjoin(
-                Categoria, Projeto.id == Categoria.id_projeto
-            ).filter(
-                Categoria.id_projeto == None  # Não tem categoria (não validado por humano)
-            ).order_by(Projeto.id).first()
-            
-            # Se não encontrou, buscar qualquer projeto não classificado
-            if not next_project:
-                next_project = Projeto.query.outerjoin(
-                    Categoria, Projeto.id == Categoria.id_projeto
-                ).filter(
-                    Categoria.id_projeto == None  # Não tem categoria (não classificado)
-                ).order_by(Projeto.id).first()
-        
-        # Se encontrou um próximo projeto, redirecionar para ele
-        if next_project:
-            return redirect(url_for('main.categorize', project_id=next_project.codigo_projeto))
+        # Reservar o próximo projeto da fila de revisão (classificados por IA e ainda não
+        # validados primeiro, depois os não classificados; projetos reservados por outros
+        # revisores são pulados)
+        next_project_code = claim_next_project(current_user.id, current_project.id)
+        if next_project_code:
+            return redirect(url_for('main.categorize', project_id=next_project_code))
         
         # Se não encontrou nenhum projeto, voltar para a lista de projetos
         flash('Não há mais projetos para classificar.', 'info')
@@ -1412,8 +1365,8 @@ def view_categories():
             organized_categories[macroarea].append(category)
         
         # Obter dados de tecnologias verdes do banco de dados
-        tecverde_classes = _get_tecverde_classes()
-        tecverde_subclasses = _get_tecverde_subclasses()
+        tecverde_classes = get_tecverde_classes()
+        tecverde_subclasses = get_tecverde_subclasses()
         
         return render_template('categories.html', 
                               categories=organized_categories,
@@ -1508,6 +1461,7 @@ def lists():
                             nova_lista = CategoriaLista(tipo=db_tipo, valor=value, ativo=True)
                             db.session.add(nova_lista)
             
+            invalidate_taxonomy()
             db.session.commit()
             flash('Listas atualizadas com sucesso!', 'success')
             return redirect(url_for('main.lists'))
@@ -1525,7 +1479,7 @@ def lists():
         for column in ['tecnologias_habilitadoras', 'areas_aplicacao', 'microarea', 'segmento', 'dominio']:
             # Usar o mapeamento para obter o tipo correto no banco de dados
             db_tipo = tipo_mapping.get(column, column)
-            items = _get_categoria_lista_query().filter_by(tipo=db_tipo, ativo=True).all()
+            items = get_categoria_lista_query().filter_by(tipo=db_tipo, ativo=True).all()
             
             # Para segmentos e domínios, extrair apenas a parte relevante do valor
             if column == 'segmento' or column == 'dominio':
@@ -0,0 +1,63 @@
+from functools import wraps
+from flask import Blueprint, jsonify
+from flask_login import login_required, current_user
+from app.schema_capabilities import get_schema_capabilities, reprobe_schema
+from app.rag_cache import get_response_cache
+import logging
+import os
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+def admin_required(f):
+    """Restringe a rota a usuários com papel 'admin'."""
+    @wraps(f)
+    @login_required
+    def decorated(*args, **kwargs):
+        if getattr(current_user, 'role', None) != 'admin':
+            return jsonify({'success': False, 'error': 'Acesso restrito a administradores'}), 403
+        return f(*args, **kwargs)
+    return decorated
+
+@admin_bp.route('/schema', methods=['GET'])
+@admin_required
+def schema_capabilities():
+    """Retorna as colunas detectadas na inspeção do schema."""
+    return jsonify({'success': True, 'schema': get_schema_capabilities().to_dict()})
+
+@admin_bp.route('/schema/reprobe', methods=['POST'])
+@admin_required
+def schema_reprobe():
+    """Inspeciona novamente o schema do banco (ex.: após uma migração do Alembic)."""
+    try:
+        capabilities = reprobe_schema()
+        logger.info(f"Schema inspecionado novamente por {current_user.email}")
+        return jsonify({'success': True, 'schema': capabilities.to_dict()})
+    except Exception as e:
+        logger.error(f"Erro ao inspecionar o schema: {str(e)}")
+        return jsonify({'success': False, 'error': f'Erro ao inspecionar o schema: {str(e)}'}), 500
+
+@admin_bp.route('/rag-cache', methods=['GET'])
+@admin_required
+def rag_cache_stats():
+    """Retorna os contadores de acertos/falhas do cache do chatbot (deste processo) e o tamanho de cada backend."""
+    try:
+        return jsonify({'success': True, 'pid': os.getpid(), 'cache': get_response_cache().to_dict()})
+    except Exception as e:
+        logger.error(f"Erro ao obter estatísticas do cache do chatbot: {str(e)}")
+        return jsonify({'success': False, 'error': f'Erro ao obter estatísticas do cache: {str(e)}'}), 500
+
+@admin_bp.route('/rag-cache/clear', methods=['POST'])
+@admin_required
+def rag_cache_clear():
+    """Remove todas as respostas do cache do chatbot (a memória dos demais processos expira pelo TTL)."""
+    try:
+        get_response_cache().clear()
+        logger.info(f"Cache do chatbot limpo por {current_user.email}")
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.error(f"Erro ao limpar o cache do chatbot: {str(e)}")
+        return jsonify({'success': False, 'error': f'Erro ao limpar o cache: {str(e)}'}), 500
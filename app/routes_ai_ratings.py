@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from app.models import AIRating, Projeto, db
+from app.data_versions import DOMINIO_AI_RATINGS, DOMINIO_PROJETOS, bump_data_versions
 from datetime import datetime
 import logging
 
@@ -166,6 +167,7 @@ def save_rating():
                 projeto.ai_rating_tecverde_observacoes = observacoes
         
         # Salvar mudanças
+        bump_data_versions(DOMINIO_AI_RATINGS, DOMINIO_PROJETOS)
         db.session.commit()
         
         return jsonify({
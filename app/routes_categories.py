@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required
 from app.models import CategoriaLista, db
+from app.taxonomy import invalidate_taxonomy
 import logging
 
 # Configurar logging
@@ -84,6 +85,7 @@ def add_category():
         # Criar nova categoria
         nova_categoria = CategoriaLista(tipo=tipo, valor=valor_completo, ativo=True)
         db.session.add(nova_categoria)
+        invalidate_taxonomy()
         db.session.commit()
         
         return jsonify({
@@ -152,6 +154,7 @@ def edit_category(id):
             else:
                 return jsonify({'success': False, 'error': 'Formato inválido para subclasse'})
         
+        invalidate_taxonomy()
         db.session.commit()
         return jsonify({'success': True, 'message': 'Categoria atualizada com sucesso'})
     except Exception as e:
@@ -181,6 +184,7 @@ def delete_category(id):
         
         # Desativar a categoria em si (não excluímos do banco, apenas marcamos como inativa)
         categoria.ativo = False
+        invalidate_taxonomy()
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Categoria excluída com sucesso'})
@@ -1,9 +1,9 @@
 from flask import Blueprint, render_template, jsonify
-from flask_login import login_required, current_user
-from app.models import Projeto, Categoria, TecnologiaVerde, Log, AIRating, Usuario, CategoriaLista, AISuggestion, ClassificacaoAdicional, db
-from sqlalchemy import func, desc, distinct, and_, or_
+from flask_login import login_required
+from app.models import Projeto, Log, AIRating, db
+from sqlalchemy import func, desc
+from app.statistics_snapshot import get_charts_data as get_snapshot_charts_data, get_statistics, percentage
 import json
-from datetime import datetime, timedelta
 import logging
 
 # Configurar logging
@@ -59,59 +59,29 @@ def get_general_stats():
     Obtém estatísticas gerais sobre os projetos.
     """
     try:
-        # Total de projetos
-        total_projects = Projeto.query.count()
-        
-        # Projetos categorizados (com registro na tabela Categoria)
-        categorized_projects = db.session.query(Categoria.id_projeto).distinct().count()
-        
-        # Projetos não categorizados
-        uncategorized_projects = total_projects - categorized_projects
-        
-        # Projetos com tecnologia verde
-        tecverde_projects = Projeto.query.filter(Projeto.tecverde_se_aplica == True).count()
-        
-        # Projetos sem tecnologia verde
-        non_tecverde_projects = Projeto.query.filter(or_(
-            Projeto.tecverde_se_aplica == False,
-            Projeto.tecverde_se_aplica == None
-        )).count()
-        
-        # Projetos com sugestão da IA (apenas os que não foram validados por humanos)
-        ai_suggested_projects = db.session.query(AISuggestion.id_projeto).filter(
-            ~AISuggestion.id_projeto.in_(db.session.query(Categoria.id_projeto))
-        ).distinct().count()
-        
-        # Projetos com classificações adicionais
-        additional_classifications = db.session.query(ClassificacaoAdicional.id_projeto).distinct().count()
-        
-        # Total de usuários
-        total_users = Usuario.query.count()
-        
-        # Total de logs
-        total_logs = Log.query.count()
-        
-        # Projetos por período (últimos 30 dias)
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_projects = Projeto.query.filter(Projeto.data_criacao >= thirty_days_ago).count()
+        stats = get_statistics()
+        total_projects = stats['total_projects']
         
         return {
             'total_projects': total_projects,
-            'categorized_projects': categorized_projects,
-            'uncategorized_projects': uncategorized_projects,
-            'categorized_percentage': round((categorized_projects / total_projects * 100) if total_projects > 0 else 0, 1),
-            'tecverde_projects': tecverde_projects,
-            'non_tecverde_projects': non_tecverde_projects,
-            'tecverde_percentage': round((tecverde_projects / total_projects * 100) if total_projects > 0 else 0, 1),
-            'ai_suggested_projects': ai_suggested_projects,
-            'ai_suggested_percentage': round((ai_suggested_projects / total_projects * 100) if total_projects > 0 else 0, 1),
-            'additional_classifications': additional_classifications,
-            'total_users': total_users,
-            'total_logs': total_logs,
-            'recent_projects': recent_projects
+            'categorized_projects': stats['categorized_projects'],
+            'uncategorized_projects': stats['uncategorized_projects'],
+            'categorized_percentage': percentage(stats['categorized_projects'], total_projects),
+            'tecverde_projects': stats['tecverde_projects'],
+            # Projetos sem tecnologia verde (inclui os ainda não avaliados)
+            'non_tecverde_projects': stats['non_tecverde_projects'] + stats['unclassified_tecverde_projects'],
+            'tecverde_percentage': percentage(stats['tecverde_projects'], total_projects),
+            # Projetos com sugestão da IA (apenas os que não foram validados por humanos)
+            'ai_suggested_projects': stats['ai_suggested_projects'],
+            'ai_suggested_percentage': percentage(stats['ai_suggested_projects'], total_projects),
+            'additional_classifications': stats['additional_classifications'],
+            'total_users': stats['total_users'],
+            'total_logs': stats['total_logs'],
+            'recent_projects': stats['recent_projects']
         }
     except Exception as e:
         logger.error(f"Erro ao obter estatísticas gerais: {str(e)}")
+        db.session.rollback()
         return {
             'total_projects': 0,
             'categorized_projects': 0,
@@ -133,89 +103,10 @@ def get_charts_data():
     Obtém dados para os gráficos do dashboard.
     """
     try:
-        # Distribuição por macroárea
-        macroareas_data = db.session.query(
-            Projeto._aia_n1_macroarea,
-            func.count(Projeto.id).label('count')
-        ).filter(Projeto._aia_n1_macroarea != None, Projeto._aia_n1_macroarea != '').group_by(Projeto._aia_n1_macroarea).all()
-        
-        macroareas = {
-            'labels': [m[0] for m in macroareas_data],
-            'values': [m[1] for m in macroareas_data]
-        }
-        
-        # Distribuição por segmento (top 10)
-        segmentos_data = db.session.query(
-            Projeto._aia_n2_segmento,
-            func.count(Projeto.id).label('count')
-        ).filter(Projeto._aia_n2_segmento != None, Projeto._aia_n2_segmento != '').group_by(Projeto._aia_n2_segmento).order_by(desc('count')).limit(10).all()
-        
-        segmentos = {
-            'labels': [s[0] for s in segmentos_data],
-            'values': [s[1] for s in segmentos_data]
-        }
-        
-        # Distribuição por tecnologia verde (classes)
-        tecverde_data = db.session.query(
-            Projeto.tecverde_se_aplica,
-            func.count(Projeto.id).label('count')
-        ).filter(Projeto.tecverde_se_aplica.in_([True, False])).group_by(Projeto.tecverde_se_aplica).all()
-        
-        # Mapear True/False para "Sim"/"Não" para melhor visualização
-        tecverde_labels = ["Sim" if t[0] else "Não" for t in tecverde_data]
-        
-        tecverde = {
-            'labels': tecverde_labels,
-            'values': [t[1] for t in tecverde_data]
-        }
-        
-        # Top 10 classes de tecnologia verde
-        tecverde_classes_data = db.session.query(
-            Projeto.tecverde_classe,
-            func.count(Projeto.id).label('count')
-        ).filter(
-            Projeto.tecverde_se_aplica == True,
-            Projeto.tecverde_classe != None,
-            Projeto.tecverde_classe != ''
-        ).group_by(Projeto.tecverde_classe).order_by(desc('count')).limit(10).all()
-        
-        tecverde_classes = {
-            'labels': [t[0] for t in tecverde_classes_data],
-            'values': [t[1] for t in tecverde_classes_data]
-        }
-        
-        # Timeline de projetos por data de contrato (agrupados por mês)
-        timeline_data = db.session.query(
-            func.date_trunc('month', func.to_timestamp(Projeto.data_contrato / 1000)).label('month'),
-            func.count(Projeto.id).label('count')
-        ).filter(Projeto.data_contrato != None).group_by('month').order_by('month').all()
-        
-        timeline = {
-            'labels': [t[0].strftime('%b %Y') if t[0] else 'Desconhecido' for t in timeline_data],
-            'values': [t[1] for t in timeline_data]
-        }
-        
-        # Distribuição por status de projeto
-        status_data = db.session.query(
-            Projeto.status,
-            func.count(Projeto.id).label('count')
-        ).filter(Projeto.status != None, Projeto.status != '').group_by(Projeto.status).all()
-        
-        status = {
-            'labels': [s[0] for s in status_data],
-            'values': [s[1] for s in status_data]
-        }
-        
-        return {
-            'macroareas': macroareas,
-            'segmentos': segmentos,
-            'tecverde': tecverde,
-            'tecverde_classes': tecverde_classes,
-            'timeline': timeline,
-            'status': status
-        }
+        return get_snapshot_charts_data()
     except Exception as e:
         logger.error(f"Erro ao obter dados para gráficos: {str(e)}")
+        db.session.rollback()
         return {
             'macroareas': {'labels': [], 'values': []},
             'segmentos': {'labels': [], 'values': []},
@@ -331,15 +222,14 @@ def get_status_distribution():
     Obtém a distribuição de projetos por status de categorização.
     """
     try:
-        total_projects = Projeto.query.count()
+        stats = get_statistics()
+        total_projects = stats['total_projects']
         
         # Projetos categorizados por humanos (com registro na tabela Categoria)
-        human_validated = db.session.query(Categoria.id_projeto).distinct().count()
+        human_validated = stats['categorized_projects']
         
         # Projetos com sugestão da IA mas sem categorização por humanos
-        ai_classified = db.session.query(AISuggestion.id_projeto).filter(
-            ~AISuggestion.id_projeto.in_(db.session.query(Categoria.id_projeto))
-        ).distinct().count()
+        ai_classified = stats['ai_suggested_projects']
         
         # Projetos não categorizados
         uncategorized = total_projects - human_validated - ai_classified
@@ -348,12 +238,13 @@ def get_status_distribution():
             'human_validated': human_validated,
             'ai_classified': ai_classified,
             'uncategorized': uncategorized,
-            'human_validated_percentage': round((human_validated / total_projects * 100) if total_projects > 0 else 0, 1),
-            'ai_classified_percentage': round((ai_classified / total_projects * 100) if total_projects > 0 else 0, 1),
-            'uncategorized_percentage': round((uncategorized / total_projects * 100) if total_projects > 0 else 0, 1)
+            'human_validated_percentage': percentage(human_validated, total_projects),
+            'ai_classified_percentage': percentage(ai_classified, total_projects),
+            'uncategorized_percentage': percentage(uncategorized, total_projects)
         }
     except Exception as e:
         logger.error(f"Erro ao obter distribuição por status: {str(e)}")
+        db.session.rollback()
         return {
             'human_validated': 0,
             'ai_classified': 0,
@@ -368,27 +259,23 @@ def get_tecverde_distribution():
     Obtém a distribuição de projetos por tecnologia verde.
     """
     try:
-        total_projects = Projeto.query.count()
-        
-        # Projetos com tecnologia verde
-        tecverde_projects = Projeto.query.filter(Projeto.tecverde_se_aplica == True).count()
-        
-        # Projetos sem tecnologia verde
-        non_tecverde_projects = Projeto.query.filter(Projeto.tecverde_se_aplica == False).count()
-        
-        # Projetos sem classificação de tecnologia verde
-        unclassified_tecverde = total_projects - tecverde_projects - non_tecverde_projects
+        stats = get_statistics()
+        total_projects = stats['total_projects']
+        tecverde_projects = stats['tecverde_projects']
+        non_tecverde_projects = stats['non_tecverde_projects']
+        unclassified_tecverde = stats['unclassified_tecverde_projects']
         
         return {
             'tecverde': tecverde_projects,
             'non_tecverde': non_tecverde_projects,
             'unclassified': unclassified_tecverde,
-            'tecverde_percentage': round((tecverde_projects / total_projects * 100) if total_projects > 0 else 0, 1),
-            'non_tecverde_percentage': round((non_tecverde_projects / total_projects * 100) if total_projects > 0 else 0, 1),
-            'unclassified_percentage': round((unclassified_tecverde / total_projects * 100) if total_projects > 0 else 0, 1)
+            'tecverde_percentage': percentage(tecverde_projects, total_projects),
+            'non_tecverde_percentage': percentage(non_tecverde_projects, total_projects),
+            'unclassified_percentage': percentage(unclassified_tecverde, total_projects)
         }
     except Exception as e:
         logger.error(f"Erro ao obter distribuição por tecnologia verde: {str(e)}")
+        db.session.rollback()
         return {
             'tecverde': 0,
             'non_tecverde': 0,
@@ -0,0 +1,132 @@
+import threading
+import logging
+import click
+from flask import current_app
+from sqlalchemy import inspect
+from app import db
+from app.data_versions import DOMINIO_ESQUEMA, bump_data_version, get_data_version
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Schema do banco de dados inspecionado
+SCHEMA = 'gepes'
+
+_probe_lock = threading.Lock()
+
+
+class SchemaCapabilities:
+    """
+    Resultado da inspeção do schema: colunas existentes em cada tabela.
+    
+    Criado uma vez em create_app e guardado em app.extensions['schema_capabilities'],
+    evitando consultas ao catálogo do banco a cada requisição.
+    """
+    
+    def __init__(self, columns_by_table=None, version=None):
+        self.columns_by_table = columns_by_table or {}
+        self.version = version
+    
+    @property
+    def probed(self):
+        return bool(self.columns_by_table)
+    
+    def has_column(self, table, column):
+        return column in self.columns_by_table.get(table, ())
+    
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'tables': {table: sorted(columns) for table, columns in sorted(self.columns_by_table.items())}
+        }
+
+
+def probe_schema(app=None):
+    """
+    Inspeciona as tabelas do schema 'gepes' e guarda as colunas encontradas na aplicação.
+    
+    Deve ser chamada dentro do contexto da aplicação.
+    
+    Args:
+        app: Aplicação Flask (padrão: current_app)
+        
+    Returns:
+        Objeto SchemaCapabilities
+    """
+    app = app or current_app._get_current_object()
+    version = get_data_version(DOMINIO_ESQUEMA)
+    
+    try:
+        inspector = inspect(db.engine)
+        columns_by_table = {}
+        for table in inspector.get_table_names(schema=SCHEMA):
+            columns_by_table[table] = frozenset(col['name'] for col in inspector.get_columns(table, schema=SCHEMA))
+        capabilities = SchemaCapabilities(columns_by_table, version)
+        logger.info(f"Schema '{SCHEMA}' inspecionado: {len(columns_by_table)} tabelas")
+    except Exception as e:
+        logger.error(f"Erro ao inspecionar o schema '{SCHEMA}': {str(e)}")
+        # Sem resultado: a próxima chamada a get_schema_capabilities tentará novamente
+        capabilities = SchemaCapabilities(version=version)
+    
+    app.extensions['schema_capabilities'] = capabilities
+    return capabilities
+
+
+def get_schema_capabilities():
+    """
+    Retorna as capacidades do schema guardadas na aplicação.
+    
+    O schema é inspecionado novamente apenas se a inspeção inicial falhou ou se outro
+    processo registrou uma nova inspeção (versão do domínio 'esquema' alterada).
+    """
+    app = current_app._get_current_object()
+    capabilities = app.extensions.get('schema_capabilities')
+    
+    if capabilities is not None and capabilities.probed:
+        version = get_data_version(DOMINIO_ESQUEMA)
+        if version is None or version == capabilities.version:
+            return capabilities
+    
+    with _probe_lock:
+        capabilities = app.extensions.get('schema_capabilities')
+        if capabilities is None or not capabilities.probed or capabilities.version != get_data_version(DOMINIO_ESQUEMA):
+            capabilities = probe_schema(app)
+    return capabilities
+
+
+def has_column(table, column):
+    """Verifica se a coluna existe na tabela do schema 'gepes' (sem consultar o catálogo)."""
+    return get_schema_capabilities().has_column(table, column)
+
+
+def reprobe_schema():
+    """
+    Inspeciona o schema novamente (ex.: após aplicar uma migração do Alembic).
+    
+    Incrementa a versão do domínio 'esquema' para que os demais processos da aplicação
+    também refaçam a inspeção na próxima requisição, e descarta o snapshot da taxonomia,
+    cujas consultas dependem das colunas disponíveis.
+    
+    Returns:
+        Objeto SchemaCapabilities
+    """
+    from app.taxonomy import taxonomy_cache
+    
+    bump_data_version(DOMINIO_ESQUEMA)
+    db.session.commit()
+    taxonomy_cache.clear()
+    return probe_schema()
+
+
+def init_app(app):
+    """Faz a inspeção inicial do schema e registra o comando 'flask reprobe-schema'."""
+    with app.app_context():
+        probe_schema(app)
+    
+    @app.cli.command('reprobe-schema')
+    def reprobe_schema_command():
+        """Inspeciona novamente o schema do banco (use após 'flask db upgrade')."""
+        capabilities = reprobe_schema()
+        for table, columns in capabilities.to_dict()['tables'].items():
+            click.echo(f"{table}: {', '.join(columns)}")
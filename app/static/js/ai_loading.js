@@ -180,6 +180,24 @@ const aiLoading = (function() {
             console.log("Mensagens do overlay atualizadas");
         },
         
+        // Definir o progresso real (por exemplo, etapas concluídas), interrompendo a simulação
+        setProgress: function(value, message, submessage) {
+            if (!overlayElement) {
+                this.show(message, submessage);
+            } else {
+                this.updateMessage(message, submessage);
+            }
+            
+            // Limpar o intervalo de simulação
+            if (progressInterval) {
+                clearInterval(progressInterval);
+                progressInterval = null;
+            }
+            
+            progressValue = Math.max(0, Math.min(100, value));
+            updateProgressBar();
+        },
+        
         // Completar o progresso e esconder o overlay
         completeProgress: function() {
             if (!overlayElement) return;
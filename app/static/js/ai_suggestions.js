@@ -38,6 +38,9 @@ function initAiSuggestions() {
             
             // Aplicar automaticamente as sugestões aos campos do formulário
             applyAllAiSuggestions(aiSuggestions);
+        } else if (typeof aiSuggestionStream !== 'undefined' && aiSuggestionStream) {
+            // Sugestão ainda não gerada: receber as etapas conforme ficam prontas
+            streamAiSuggestions(aiSuggestionStream);
         } else {
             console.log("Nenhuma sugestão da IA disponível");
             
@@ -55,6 +58,164 @@ function initAiSuggestions() {
         }
     }
     
+    /**
+     * Função para receber as sugestões da IA do job em segundo plano, exibindo o resultado de cada
+     * etapa assim que ele é validado no servidor (etapa1: macroárea/segmento/domínio, etapa2:
+     * domínios afeitos outros, etapa3: tecnologias verdes). Consulta o endpoint de status ou,
+     * com useStream, recebe as etapas via server-sent events
+     * @param {Object} config - URLs do job (url do stream, statusUrl, enqueueUrl), useStream e ID do projeto (projectId)
+     */
+    function streamAiSuggestions(config) {
+        const partial = { project_id: config.projectId, is_ai_suggestion: true };
+        const mensagens = {
+            etapa1: ["Macroárea e segmento identificados", "Selecionando os domínios afeitos outros"],
+            etapa2: ["Domínios afeitos outros selecionados", "Aguardando a classificação de tecnologias verdes"],
+            etapa3: ["Tecnologias verdes classificadas", "Aguardando as demais etapas"]
+        };
+        let etapasConcluidas = 0;
+        let overlayAtivo = typeof aiLoading !== 'undefined';
+        
+        if (overlayAtivo) {
+            aiLoading.setProgress(5, "Gerando sugestões da IA...", "Analisando o projeto e identificando a macroárea e o segmento");
+        }
+        
+        // Esconder o overlay assim que houver um resultado parcial para exibir
+        function fecharOverlay() {
+            if (overlayAtivo) {
+                overlayAtivo = false;
+                aiLoading.completeProgress();
+            }
+        }
+        
+        // Resultado final: mesmo fluxo das sugestões carregadas pelo template
+        function concluir(data) {
+            aiSuggestionData = data;
+            $('#used_ai').val('true');
+            displayAiSuggestions(data);
+            applyAllAiSuggestions(data);
+            fecharOverlay();
+        }
+        
+        function falhar(message) {
+            console.error("Erro ao gerar sugestões da IA:", message);
+            fecharOverlay();
+        }
+        
+        // Exibir os campos de uma etapa concluída
+        function receberEtapa(etapa, fields) {
+            Object.assign(partial, fields);
+            etapasConcluidas += 1;
+            console.log(`Sugestão da IA - ${etapa} concluída:`, partial);
+            
+            if (overlayAtivo) {
+                aiLoading.setProgress(5 + etapasConcluidas * 30, mensagens[etapa][0], mensagens[etapa][1]);
+            }
+            
+            // Exibir o resultado parcial quando a macroárea/segmento já estiver disponível
+            if (partial._aia_n1_macroarea !== undefined) {
+                fecharOverlay();
+                displayAiSuggestions(Object.assign({}, partial));
+            }
+        }
+        
+        // Por padrão o status do job é consultado periodicamente: o stream mantém um worker do
+        // servidor ocupado até o fim do job e só é usado quando habilitado (workers em threads)
+        if (!config.useStream || typeof EventSource === 'undefined') {
+            pollAiSuggestionJob(config, receberEtapa, concluir, falhar);
+            return;
+        }
+        
+        const source = new EventSource(config.url);
+        
+        Object.keys(mensagens).forEach(function(etapa) {
+            source.addEventListener(etapa, function(event) {
+                receberEtapa(etapa, JSON.parse(event.data));
+            });
+        });
+        
+        source.addEventListener('done', function(event) {
+            source.close();
+            concluir(JSON.parse(event.data));
+        });
+        
+        source.addEventListener('failed', function(event) {
+            source.close();
+            falhar(JSON.parse(event.data).error);
+        });
+        
+        // Erro de conexão: o job continua no servidor, então passar a consultar o status
+        source.onerror = function() {
+            if (source.readyState !== EventSource.CLOSED) {
+                source.close();
+                console.warn("Stream de sugestões interrompido, consultando o status do job");
+                pollAiSuggestionJob(config, receberEtapa, concluir, falhar);
+            }
+        };
+    }
+    
+    /**
+     * Função para acompanhar o job de sugestão consultando o endpoint de status
+     * @param {Object} config - URLs do job (statusUrl, enqueueUrl) e ID do projeto (projectId)
+     * @param {Function} onEtapa - Chamada com (etapa, campos) para cada etapa nova
+     * @param {Function} onDone - Chamada com o resultado final
+     * @param {Function} onFail - Chamada com a mensagem de erro
+     */
+    function pollAiSuggestionJob(config, onEtapa, onDone, onFail) {
+        // Campo que indica a conclusão de cada etapa no resultado parcial
+        const camposDaEtapa = {
+            etapa1: '_aia_n1_macroarea',
+            etapa2: '_aia_n3_dominio_outro',
+            etapa3: 'tecverde_se_aplica'
+        };
+        const camposRecebidos = {};
+        let enfileirado = false;
+        
+        function consultar() {
+            $.getJSON(config.statusUrl)
+                .done(function(job) {
+                    if (job.status === 'concluido') {
+                        onDone(job.result);
+                        return;
+                    }
+                    if (job.status === 'erro') {
+                        onFail(job.error);
+                        return;
+                    }
+                    
+                    // Job desconhecido neste processo do servidor: enfileirar novamente (deduplicado)
+                    if (!job.status && !enfileirado) {
+                        enfileirado = true;
+                        $.ajax({
+                            url: config.enqueueUrl,
+                            type: 'POST',
+                            contentType: 'application/json',
+                            data: JSON.stringify({ project_id: config.projectId })
+                        });
+                    }
+                    
+                    // Repassar as etapas que ficaram prontas desde a última consulta
+                    const novos = {};
+                    Object.keys(job.partial || {}).forEach(function(campo) {
+                        if (!(campo in camposRecebidos)) {
+                            novos[campo] = camposRecebidos[campo] = job.partial[campo];
+                        }
+                    });
+                    Object.keys(camposDaEtapa).forEach(function(etapa) {
+                        if (camposDaEtapa[etapa] in novos) {
+                            onEtapa(etapa, novos);
+                        }
+                    });
+                    
+                    setTimeout(consultar, 2000);
+                })
+                .fail(function(xhr) {
+                    onFail(xhr.responseText);
+                });
+        }
+        
+        consultar();
+    }
+    
     /**
      * Função para exibir as informações da sugestão da IA com efeitos visuais
      * @param {Object} data - Dados de sugestão da IA
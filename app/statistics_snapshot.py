@@ -0,0 +1,310 @@
+"""
+Snapshot das estatísticas do sistema, compartilhado pelo dashboard e pelo chatbot.
+
+As contagens gerais (projetos, categorizações, tecnologias verdes, sugestões da IA, usuários
+e logs) são calculadas em uma única consulta e os dados dos gráficos em outra, que agrupa
+gepes.projetos com GROUPING SETS em uma única varredura; o resultado fica em memória no processo até que a versão de um dos domínios de
+dados mude (app.data_versions) ou o tempo de vida expire. O tempo de vida curto cobre o que
+não é versionado: usuários, a janela de projetos recentes e escritas feitas fora da aplicação.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import case, desc, distinct, func, select
+from app.models import (
+    AISuggestion, Categoria, ClassificacaoAdicional, Log, Projeto, TecnologiaVerde, Usuario, db
+)
+from app.classification_status import (
+    STATUS_CLASSIFICADO_IA, STATUS_VALIDADO_HUMANO, status_column, status_column_available
+)
+from app.data_versions import (
+    DOMINIO_AI_SUGESTOES, DOMINIO_CATEGORIAS, DOMINIO_LOGS, DOMINIO_PROJETOS, DOMINIO_TECVERDE,
+    get_data_versions
+)
+from config import Config
+import logging
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Domínios de dados lidos pelas estatísticas; uma nova versão de qualquer um descarta o snapshot
+STATISTICS_DOMAINS = (
+    DOMINIO_PROJETOS, DOMINIO_CATEGORIAS, DOMINIO_TECVERDE, DOMINIO_AI_SUGESTOES, DOMINIO_LOGS
+)
+
+# Janela usada na contagem de projetos recentes
+RECENT_PROJECTS_DAYS = 30
+
+
+class StatisticsSnapshotCache:
+    """
+    Snapshot em memória das estatísticas, compartilhado pelo processo.
+
+    Cada estrutura (contagens, gráficos, distribuição de classes de tecnologia verde) é
+    construída uma única vez por combinação de versões dos domínios em STATISTICS_DOMAINS e
+    reaproveitada por no máximo `ttl` segundos. Se as versões não puderem ser lidas, vale
+    apenas o tempo de vida.
+
+    Os valores retornados são compartilhados entre requisições e não devem ser modificados.
+    """
+
+    def __init__(self, ttl=None):
+        self._lock = threading.Lock()
+        self._ttl = ttl
+        self._versions = None
+        self._values = {}
+
+    def _get_ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        if has_app_context():
+            return current_app.config.get('STATISTICS_SNAPSHOT_TTL_SECONDS', Config.STATISTICS_SNAPSHOT_TTL_SECONDS)
+        return Config.STATISTICS_SNAPSHOT_TTL_SECONDS
+
+    def get(self, key, loader):
+        """
+        Retorna a estrutura `key` do snapshot, construindo-a com `loader()` se necessário.
+
+        Args:
+            key: Nome da estrutura no snapshot
+            loader: Função sem argumentos que calcula a estrutura a partir do banco
+
+        Returns:
+            Estrutura correspondente às versões atuais dos dados
+        """
+        versions = get_data_versions(STATISTICS_DOMAINS)
+        now = time.monotonic()
+
+        with self._lock:
+            if self._versions != versions:
+                self._versions = versions
+                self._values = {}
+            else:
+                entry = self._values.get(key)
+                if entry is not None and entry[1] > now:
+                    return entry[0]
+
+        value = loader()
+
+        with self._lock:
+            # Só armazenar se os dados não mudaram enquanto a estrutura era calculada
+            if self._versions == versions:
+                self._values[key] = (value, time.monotonic() + self._get_ttl())
+
+        return value
+
+    def clear(self):
+        """Descarta o snapshot deste processo."""
+        with self._lock:
+            self._versions = None
+            self._values = {}
+
+
+statistics_cache = StatisticsSnapshotCache()
+
+
+def _count_distinct(column, *criteria):
+    """Subconsulta escalar com COUNT(DISTINCT column) para uso na consulta de contagens."""
+    query = select(func.count(distinct(column)))
+    if criteria:
+        query = query.where(*criteria)
+    return query.scalar_subquery()
+
+
+def _count_if(condition):
+    """Soma condicional sobre gepes.projetos (0 quando a tabela está vazia)."""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _load_counts():
+    """
+    Calcula todas as contagens gerais em uma única consulta.
+
+    Returns:
+        Dicionário com as contagens absolutas (percentuais ficam a cargo de quem exibe)
+    """
+    recent_since = datetime.now() - timedelta(days=RECENT_PROJECTS_DAYS)
+    if status_column_available():
+        # Status gravado na linha do projeto: as contagens saem da mesma varredura
+        categorized = _count_if(status_column() == STATUS_VALIDADO_HUMANO)
+        ai_suggested = _count_if(status_column() == STATUS_CLASSIFICADO_IA)
+    else:
+        categorized = _count_distinct(Categoria.id_projeto)
+        ai_suggested = _count_distinct(
+            AISuggestion.id_projeto, ~AISuggestion.id_projeto.in_(select(Categoria.id_projeto))
+        )
+
+    query = select(
+        func.count(Projeto.id).label('total_projects'),
+        _count_if(Projeto.tecverde_se_aplica == True).label('tecverde_projects'),
+        _count_if(Projeto.tecverde_se_aplica == False).label('non_tecverde_projects'),
+        _count_if(Projeto.data_criacao >= recent_since).label('recent_projects'),
+        categorized.label('categorized_projects'),
+        _count_distinct(
+            Categoria.id_projeto,
+            Categoria.id_projeto.in_(select(Projeto.id).where(Projeto.ai_rating_aia_user != None))
+        ).label('human_validated_projects'),
+        _count_distinct(AISuggestion.id_projeto).label('projects_with_ai_suggestions'),
+        ai_suggested.label('ai_suggested_projects'),
+        _count_distinct(ClassificacaoAdicional.id_projeto).label('additional_classifications'),
+        _count_distinct(TecnologiaVerde.id_projeto, TecnologiaVerde.se_aplica == True).label('tecverde_registered_projects'),
+        _count_distinct(
+            TecnologiaVerde.id, TecnologiaVerde.se_aplica == True, TecnologiaVerde.classe != None
+        ).label('tecverde_with_class'),
+        _count_distinct(
+            TecnologiaVerde.id, TecnologiaVerde.se_aplica == True, TecnologiaVerde.subclasse != None
+        ).label('tecverde_with_subclass'),
+        select(func.count(Usuario.id)).scalar_subquery().label('total_users'),
+        select(func.count(Log.id)).scalar_subquery().label('total_logs')
+    ).select_from(Projeto)
+
+    row = db.session.execute(query).one()
+    counts = {name: int(value or 0) for name, value in row._mapping.items()}
+    counts['uncategorized_projects'] = counts['total_projects'] - counts['categorized_projects']
+    counts['unclassified_tecverde_projects'] = (
+        counts['total_projects'] - counts['tecverde_projects'] - counts['non_tecverde_projects']
+    )
+    return counts
+
+
+def _chart_dimensions():
+    """
+    Expressões agrupadas em cada gráfico do dashboard, na ordem das colunas da agregação.
+
+    Os filtros específicos de cada gráfico viram NULL na própria expressão (ex.: a classe só
+    conta para projetos com tecnologia verde) e os grupos NULL são descartados depois.
+    """
+    return [
+        ('macroareas', Projeto._aia_n1_macroarea),
+        ('segmentos', Projeto._aia_n2_segmento),
+        ('tecverde', Projeto.tecverde_se_aplica),
+        ('tecverde_classes', case((Projeto.tecverde_se_aplica == True, Projeto.tecverde_classe))),
+        ('timeline', func.date_trunc('month', func.to_timestamp(Projeto.data_contrato / 1000))),
+        ('status', Projeto.status)
+    ]
+
+
+def _charts_query():
+    """
+    Monta a consulta que calcula todas as distribuições dos gráficos em uma única varredura.
+
+    As expressões são calculadas uma vez em uma subconsulta e agrupadas com GROUPING SETS,
+    um conjunto por gráfico; GROUPING() identifica a qual gráfico cada linha pertence.
+    """
+    dimensions = _chart_dimensions()
+    projected = select(*[expression.label(name) for name, expression in dimensions]).subquery('projetos_graficos')
+    columns = [projected.c[name] for name, _ in dimensions]
+
+    return select(
+        *columns,
+        func.grouping(*columns).label('grouping_id'),
+        func.count().label('count')
+    ).group_by(func.grouping_sets(*columns))
+
+
+def _top(items, limit=None):
+    items = sorted(items, key=lambda item: (-item[1], str(item[0])))
+    return items[:limit] if limit else items
+
+
+def _labels_values(items):
+    return {'labels': [item[0] for item in items], 'values': [item[1] for item in items]}
+
+
+def _load_charts_data():
+    """
+    Calcula as distribuições exibidas nos gráficos do dashboard em uma única consulta.
+
+    Returns:
+        Dicionário no formato de /dashboard/api/charts-data
+    """
+    names = [name for name, _ in _chart_dimensions()]
+    # Em GROUPING(c0, ..., cn) o bit de cada coluna vale 1 quando ela não faz parte do conjunto
+    all_bits = (1 << len(names)) - 1
+    dimension_by_grouping = {all_bits ^ (1 << (len(names) - 1 - i)): name for i, name in enumerate(names)}
+
+    groups = {name: [] for name in names}
+    for row in db.session.execute(_charts_query()):
+        name = dimension_by_grouping.get(row.grouping_id)
+        value = row[names.index(name)] if name else None
+        if value is None or value == '':
+            continue
+        groups[name].append((value, row.count))
+
+    return {
+        'macroareas': _labels_values(_top(groups['macroareas'])),
+        'segmentos': _labels_values(_top(groups['segmentos'], 10)),
+        # Mapear True/False para "Sim"/"Não" para melhor visualização
+        'tecverde': _labels_values([("Sim" if value else "Não", count) for value, count in _top(groups['tecverde'])]),
+        'tecverde_classes': _labels_values(_top(groups['tecverde_classes'], 10)),
+        'timeline': _labels_values([(month.strftime('%b %Y'), count) for month, count in sorted(groups['timeline'])]),
+        'status': _labels_values(_top(groups['status']))
+    }
+
+
+def _load_tecverde_class_counts():
+    """
+    Conta as tecnologias verdes aplicáveis por classe (gepes.tecnologias_verdes).
+
+    Returns:
+        Lista de tuplas (classe, quantidade) em ordem decrescente de quantidade
+    """
+    rows = db.session.query(
+        TecnologiaVerde.classe,
+        func.count(TecnologiaVerde.id).label('count')
+    ).filter(
+        TecnologiaVerde.se_aplica == True,
+        TecnologiaVerde.classe != None
+    ).group_by(TecnologiaVerde.classe).order_by(desc('count')).all()
+    return [(row[0], row[1]) for row in rows]
+
+
+def get_statistics():
+    """
+    Retorna as contagens gerais do sistema a partir do snapshot.
+
+    Returns:
+        Dicionário com total_projects, categorized_projects, uncategorized_projects,
+        tecverde_projects, non_tecverde_projects, unclassified_tecverde_projects,
+        ai_suggested_projects (sugestões ainda sem validação humana),
+        projects_with_ai_suggestions, human_validated_projects, additional_classifications,
+        tecverde_registered_projects, tecverde_with_class, tecverde_with_subclass,
+        total_users, total_logs e recent_projects
+    """
+    return statistics_cache.get('contagens', _load_counts)
+
+
+def get_charts_data():
+    """
+    Retorna os dados dos gráficos do dashboard a partir do snapshot.
+
+    Returns:
+        Dicionário com macroareas, segmentos, tecverde, tecverde_classes, timeline e status
+    """
+    return statistics_cache.get('graficos', _load_charts_data)
+
+
+def get_tecverde_class_counts():
+    """
+    Retorna a distribuição das tecnologias verdes por classe a partir do snapshot.
+
+    Returns:
+        Lista de tuplas (classe, quantidade)
+    """
+    return statistics_cache.get('tecverde_classes', _load_tecverde_class_counts)
+
+
+def percentage(part, total):
+    """
+    Calcula o percentual de `part` em `total` com uma casa decimal.
+
+    Args:
+        part: Quantidade parcial
+        total: Quantidade total
+
+    Returns:
+        Percentual arredondado (0 quando total é 0)
+    """
+    return round((part / total * 100) if total > 0 else 0, 1)
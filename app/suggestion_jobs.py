@@ -0,0 +1,302 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from app.ai_integration import OpenAIClient
+from app.classification_status import STATUS_NAO_CLASSIFICADO, status_is
+from app.models import Projeto, db
+from config import Config
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Número de projetos classificados simultaneamente em segundo plano
+SUGGESTION_JOB_WORKERS = 4
+
+# Tempo (segundos) que um job concluído permanece consultável antes de ser descartado
+SUGGESTION_JOB_RETENTION_SECONDS = 600
+
+# Estados de um job de sugestão
+JOB_PENDING = 'pendente'
+JOB_RUNNING = 'executando'
+JOB_DONE = 'concluido'
+JOB_FAILED = 'erro'
+
+# Janela (segundos) do limite de pré-gerações por usuário
+PREFETCH_USER_WINDOW_SECONDS = 3600
+
+# Eventos finais publicados por um job (os demais são os nomes das etapas)
+EVENT_DONE = 'done'
+EVENT_FAILED = 'failed'
+
+
+class SuggestionJob:
+    """
+    Geração da sugestão da IA de um projeto em segundo plano.
+
+    Os campos de cada etapa são publicados como eventos assim que validados, para que o
+    stream e a consulta de status exibam resultados parciais.
+    """
+
+    def __init__(self, project_id, force=False, prefetch=False):
+        self.project_id = project_id
+        self.force = force
+        self.prefetch = prefetch
+        self.status = JOB_PENDING
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._events = []
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def publish(self, event, data):
+        """Registra um evento (etapa concluída ou resultado final) e acorda quem está aguardando."""
+        with self._condition:
+            # A Etapa 3 paralela pode terminar depois do resultado final, que já a contém
+            if self.finished:
+                return
+            if event == EVENT_DONE:
+                self.status, self.result = JOB_DONE, data
+            elif event == EVENT_FAILED:
+                self.status, self.error = JOB_FAILED, data.get('error', '')
+            else:
+                self.partial.update(data)
+            if self.finished:
+                self.finished_at = time.time()
+            self._events.append((event, data))
+            self._condition.notify_all()
+
+    def wait_events(self, start, timeout):
+        """
+        Aguarda eventos posteriores à posição start.
+
+        Args:
+            start: Número de eventos já recebidos por quem consulta
+            timeout: Tempo máximo de espera em segundos
+
+        Returns:
+            Lista de tuplas (evento, dados), vazia se o tempo se esgotar
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._events) > start, timeout=timeout)
+            return list(self._events[start:])
+
+    def to_dict(self):
+        """Estado do job para a consulta de status."""
+        with self._condition:
+            return {
+                'project_id': self.project_id,
+                'status': self.status,
+                'partial': dict(self.partial),
+                'result': self.result,
+                'error': self.error
+            }
+
+
+class SuggestionJobQueue:
+    """
+    Fila de jobs de sugestão executada em um pool de threads do próprio processo.
+
+    Há no máximo um job por projeto: enfileirar um projeto que já está pendente, em execução
+    ou concluído com sucesso há pouco tempo retorna o job existente; um job que terminou com
+    erro é substituído.
+    """
+
+    def __init__(self, max_workers=SUGGESTION_JOB_WORKERS, retention_seconds=SUGGESTION_JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-sugestao')
+
+    def enqueue(self, app, project_id, force=False, prefetch=False):
+        """
+        Enfileira a geração da sugestão de um projeto.
+
+        Args:
+            app: Aplicação Flask (o job roda no contexto dela)
+            project_id: ID do projeto
+            force: Se True, ignora o cache de sugestões e um job concluído anteriormente
+            prefetch: Se True, o job é uma pré-geração (contabilizada nos limites do prefetcher)
+
+        Returns:
+            Tupla (job, criado) - criado é False quando um job existente foi reaproveitado
+        """
+        with self._lock:
+            self._discard_expired()
+            job = self._jobs.get(project_id)
+            # Jobs com erro não são reaproveitados: uma nova tentativa gera outro job
+            if job is not None and job.status != JOB_FAILED and not (force and job.finished):
+                return job, False
+
+            job = SuggestionJob(project_id, force, prefetch)
+            self._jobs[project_id] = job
+
+        self._executor.submit(self._run, app, job)
+        logger.info(f"Sugestão do projeto {project_id} enfileirada")
+        return job, True
+
+    def get(self, project_id):
+        """Retorna o job do projeto, se houver um ativo ou concluído recentemente."""
+        with self._lock:
+            self._discard_expired()
+            return self._jobs.get(project_id)
+
+    def active_jobs(self):
+        """Retorna os jobs pendentes ou em execução."""
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.finished]
+
+    def _discard_expired(self):
+        limit = time.time() - self.retention_seconds
+        for project_id in [pid for pid, job in self._jobs.items() if job.finished and job.finished_at < limit]:
+            del self._jobs[project_id]
+
+    def _run(self, app, job):
+        with app.app_context():
+            try:
+                job.status = JOB_RUNNING
+                openai_api_key = Config.get_openai_api_key()
+                if not openai_api_key:
+                    job.publish(EVENT_FAILED, {'error': 'Chave da API OpenAI não configurada'})
+                    return
+
+                project = db.session.get(Projeto, job.project_id)
+                if project is None:
+                    job.publish(EVENT_FAILED, {'error': 'Projeto não encontrado'})
+                    return
+                project_data = {key: value for key, value in project.__dict__.items() if not key.startswith('_sa_')}
+
+                result = OpenAIClient(openai_api_key).suggest_categories(
+                    project_data, force=job.force, on_etapa=job.publish
+                )
+                result['project_id'] = job.project_id
+                job.publish(EVENT_FAILED if 'error' in result else EVENT_DONE, result)
+            except Exception as e:
+                logger.error(f"Erro ao gerar sugestão do projeto {job.project_id} em segundo plano: {str(e)}")
+                job.publish(EVENT_FAILED, {'error': str(e)})
+            finally:
+                db.session.remove()
+
+
+class SuggestionPrefetcher:
+    """
+    Pré-geração das sugestões dos próximos projetos da fila de revisão.
+
+    Para limitar o gasto com a API, cada usuário pode disparar no máximo max_per_user
+    pré-gerações por hora e o processo mantém no máximo max_active pré-gerações em andamento.
+    """
+
+    def __init__(self, job_queue, max_per_user, max_active):
+        self.job_queue = job_queue
+        self.max_per_user = max_per_user
+        self.max_active = max_active
+        self._history = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, app, user_id, project_ids):
+        """
+        Enfileira a pré-geração dos projetos, respeitando os limites.
+
+        Args:
+            app: Aplicação Flask
+            user_id: ID do usuário que está revisando
+            project_ids: IDs dos próximos projetos sem sugestão, em ordem de prioridade
+
+        Returns:
+            Lista com os IDs dos projetos efetivamente enfileirados
+        """
+        enqueued = []
+        with self._lock:
+            history = self._history.setdefault(user_id, deque())
+            limit = time.time() - PREFETCH_USER_WINDOW_SECONDS
+            while history and history[0] < limit:
+                history.popleft()
+
+            active = sum(1 for job in self.job_queue.active_jobs() if job.prefetch)
+            for project_id in project_ids:
+                if self.job_queue.get(project_id) is not None:
+                    continue
+                if len(history) >= self.max_per_user:
+                    logger.info(f"Limite de pré-gerações por hora atingido para o usuário {user_id}")
+                    break
+                if active >= self.max_active:
+                    break
+
+                _, created = self.job_queue.enqueue(app, project_id, prefetch=True)
+                if created:
+                    history.append(time.time())
+                    active += 1
+                    enqueued.append(project_id)
+        return enqueued
+
+
+def upcoming_projects_without_suggestion(current_project_id, limit):
+    """
+    Retorna os próximos projetos da fila de revisão (não validados) que ainda não têm sugestão.
+
+    Segue a ordem de next_project: IDs maiores que o atual e, ao chegar ao fim, recomeça do início.
+
+    Args:
+        current_project_id: ID do projeto aberto
+        limit: Número máximo de projetos
+
+    Returns:
+        Lista de IDs de projetos
+    """
+    def query(after=None, before=None, count=limit):
+        stmt = db.session.query(Projeto.id).filter(status_is(STATUS_NAO_CLASSIFICADO))
+        if after is not None:
+            stmt = stmt.filter(Projeto.id > after)
+        if before is not None:
+            stmt = stmt.filter(Projeto.id < before)
+        return [row.id for row in stmt.order_by(Projeto.id).limit(count)]
+
+    if limit <= 0:
+        return []
+    project_ids = query(after=current_project_id)
+    if len(project_ids) < limit:
+        project_ids += query(before=current_project_id, count=limit - len(project_ids))
+    return project_ids
+
+
+_suggestion_queue = None
+_suggestion_prefetcher = None
+_suggestion_queue_lock = threading.Lock()
+
+
+def get_suggestion_queue():
+    """Retorna a fila de sugestões compartilhada pelo processo (criada sob demanda)."""
+    global _suggestion_queue
+    if _suggestion_queue is None:
+        with _suggestion_queue_lock:
+            if _suggestion_queue is None:
+                _suggestion_queue = SuggestionJobQueue()
+    return _suggestion_queue
+
+
+def get_suggestion_prefetcher(config):
+    """
+    Retorna o prefetcher compartilhado pelo processo (criado sob demanda).
+
+    Args:
+        config: Configuração da aplicação (limites SUGGESTION_PREFETCH_*)
+    """
+    global _suggestion_prefetcher
+    if _suggestion_prefetcher is None:
+        job_queue = get_suggestion_queue()
+        with _suggestion_queue_lock:
+            if _suggestion_prefetcher is None:
+                _suggestion_prefetcher = SuggestionPrefetcher(
+                    job_queue,
+                    max_per_user=config.get('SUGGESTION_PREFETCH_MAX_PER_USER_HOUR', 30),
+                    max_active=config.get('SUGGESTION_PREFETCH_MAX_ACTIVE', 2)
+                )
+    return _suggestion_prefetcher
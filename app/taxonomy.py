@@ -0,0 +1,108 @@
+import threading
+import logging
+from app.data_versions import DOMINIO_TAXONOMIA, bump_data_version, get_data_version
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Uncached:
+    """
+    Resultado de um loader que deve ser usado, mas não armazenado no snapshot.
+    
+    Os loaders retornam Uncached(valor) quando recorrem a dados predefinidos ou parciais
+    após um erro de banco; assim a próxima requisição tenta carregar a taxonomia de novo.
+    """
+    __slots__ = ('value',)
+    
+    def __init__(self, value):
+        self.value = value
+
+
+def _unwrap(value):
+    return value.value if isinstance(value, Uncached) else value
+
+
+class TaxonomySnapshotCache:
+    """
+    Snapshot em memória da taxonomia (gepes.categoria_listas), compartilhado pelo processo.
+    
+    Cada estrutura derivada (listas de categorias, dados AIA, classes e subclasses de
+    tecnologias verdes) é construída uma única vez por versão da taxonomia. A versão é lida
+    da tabela gepes.versoes_dados uma vez por requisição; quando outro processo altera a
+    taxonomia, a versão muda e o snapshot é reconstruído sob demanda.
+    
+    Os valores retornados são compartilhados entre requisições e não devem ser modificados.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._values = {}
+    
+    def get(self, key, loader, keep_uncached=False):
+        """
+        Retorna a estrutura `key` do snapshot, construindo-a com `loader()` se necessário.
+        
+        Args:
+            key: Nome da estrutura no snapshot
+            loader: Função sem argumentos que constrói a estrutura a partir do banco (ou
+                retorna Uncached em caso de falha)
+            keep_uncached: Se True, um resultado Uncached é devolvido sem desembrulhar, para
+                que loaders compostos saibam que a estrutura de origem falhou
+            
+        Returns:
+            Estrutura correspondente à versão atual da taxonomia
+        """
+        version = get_data_version(DOMINIO_TAXONOMIA)
+        if version is None:
+            # Sem como verificar a versão (ex.: fora do contexto da aplicação): não usar cache
+            value = loader()
+            return value if keep_uncached else _unwrap(value)
+        
+        with self._lock:
+            if self._version != version:
+                logger.info(f"Taxonomia alterada (versão {self._version} -> {version}), descartando snapshot")
+                self._version = version
+                self._values = {}
+            elif key in self._values:
+                return self._values[key]
+        
+        value = loader()
+        if isinstance(value, Uncached):
+            logger.warning(f"Estrutura '{key}' da taxonomia carregada com falha; não armazenada no snapshot")
+            return value if keep_uncached else value.value
+        
+        with self._lock:
+            # Só armazenar se a versão não mudou enquanto a estrutura era construída
+            if self._version == version:
+                self._values[key] = value
+        
+        return value
+    
+    def clear(self):
+        """Descarta o snapshot deste processo."""
+        with self._lock:
+            self._version = None
+            self._values = {}
+
+
+taxonomy_cache = TaxonomySnapshotCache()
+
+
+def get_taxonomy_snapshot(key, loader, keep_uncached=False):
+    """Atalho para taxonomy_cache.get(key, loader, keep_uncached)."""
+    return taxonomy_cache.get(key, loader, keep_uncached)
+
+
+def invalidate_taxonomy():
+    """
+    Marca a taxonomia como alterada.
+    
+    Incrementa a versão na sessão atual (deve ser chamada antes do commit da escrita em
+    gepes.categoria_listas) e descarta o snapshot deste processo. Os demais processos
+    detectam a nova versão na próxima requisição.
+    """
+    bump_data_version(DOMINIO_TAXONOMIA)
+    taxonomy_cache.clear()
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import logging
+from collections import Counter
+from app.text_utils import tokenize
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Arquivo onde o índice é persistido entre reinícios (pasta instance/ criada em create_app)
+INDEX_CACHE_PATH = os.path.join('instance', 'taxonomy_tfidf.json')
+INDEX_FORMAT_VERSION = 1
+
+# Similaridade mínima do melhor candidato e vantagem sobre o segundo para considerar a
+# recuperação local decisiva
+DEFAULT_SKIP_THRESHOLD = 0.35
+DECISIVE_MARGIN = 1.5
+
+
+def _entry_key(item):
+    return f"{item.get('Macroárea', '')}|{item.get('Segmento', '')}"
+
+
+def _entry_text(item):
+    return " ".join([item.get('Macroárea', ''), item.get('Segmento', ''), item.get('Domínios Afeitos', '')])
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _split_dominios(item):
+    return [d.strip() for d in item.get('Domínios Afeitos', '').split(';') if d.strip()]
+
+
+class TaxonomyRetrievalIndex:
+    """
+    Índice TF-IDF (somente CPU, sem dependências externas) sobre as entradas da taxonomia.
+    
+    Cada entrada é um par macroárea/segmento com seus domínios afeitos. A contagem de termos
+    de cada entrada é guardada junto com o hash do seu texto, de modo que uma reconstrução só
+    reprocessa as entradas alteradas; os pesos IDF são recalculados a partir das contagens.
+    """
+    
+    def __init__(self):
+        self.items = []
+        self.term_counts = {}   # chave da entrada -> {"hash": ..., "counts": {termo: n}}
+        self.idf = {}
+        self.vectors = []       # vetores TF-IDF normalizados, na ordem de self.items
+        self.fingerprint = None
+    
+    @staticmethod
+    def compute_fingerprint(aia_data):
+        """Hash do conteúdo da taxonomia, usado para detectar alterações."""
+        digest = hashlib.sha1()
+        for item in aia_data:
+            digest.update(_entry_text(item).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def build(self, aia_data, previous_counts=None):
+        """
+        (Re)constrói o índice, reutilizando as contagens de termos das entradas inalteradas.
+        
+        Args:
+            aia_data: Lista de categorias do AIA
+            previous_counts: Contagens de uma versão anterior do índice (opcional)
+            
+        Returns:
+            Número de entradas que precisaram ser reprocessadas
+        """
+        previous_counts = previous_counts or {}
+        term_counts = {}
+        rebuilt = 0
+        
+        for item in aia_data:
+            key = _entry_key(item)
+            text = _entry_text(item)
+            text_hash = _text_hash(text)
+            previous = previous_counts.get(key)
+            if previous and previous.get('hash') == text_hash:
+                term_counts[key] = previous
+            else:
+                term_counts[key] = {'hash': text_hash, 'counts': dict(Counter(tokenize(text)))}
+                rebuilt += 1
+        
+        # IDF suavizado sobre todas as entradas
+        document_frequency = Counter()
+        for entry in term_counts.values():
+            document_frequency.update(entry['counts'].keys())
+        total = len(term_counts) or 1
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1.0 for term, df in document_frequency.items()}
+        
+        self.items = list(aia_data)
+        self.term_counts = term_counts
+        self.vectors = [self._weigh(term_counts[_entry_key(item)]['counts']) for item in self.items]
+        self.fingerprint = self.compute_fingerprint(aia_data)
+        return rebuilt
+    
+    def _weigh(self, counts):
+        vector = {term: (1.0 + math.log(n)) * self.idf.get(term, 0.0) for term, n in counts.items() if n > 0}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {term: w / norm for term, w in vector.items()} if norm else {}
+    
+    def _query_vector(self, text):
+        return self._weigh(Counter(term for term in tokenize(text) if term in self.idf))
+    
+    @staticmethod
+    def _cosine(query, vector):
+        if len(query) > len(vector):
+            query, vector = vector, query
+        return sum(w * vector.get(term, 0.0) for term, w in query.items())
+    
+    def rank(self, text, top_n=None):
+        """
+        Ordena as entradas da taxonomia pela similaridade com o texto.
+        
+        Args:
+            text: Texto do projeto
+            top_n: Número máximo de entradas retornadas (None = todas)
+            
+        Returns:
+            Lista de tuplas (similaridade, item) em ordem decrescente
+        """
+        query = self._query_vector(text)
+        scored = [(self._cosine(query, vector), item) for vector, item in zip(self.vectors, self.items)]
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored[:top_n] if top_n else scored
+    
+    def rank_dominios(self, text, item):
+        """Ordena os domínios afeitos de uma entrada pela similaridade com o texto."""
+        query = self._query_vector(text)
+        scored = []
+        for dominio in _split_dominios(item):
+            vector = self._weigh(Counter(term for term in tokenize(dominio) if term in self.idf))
+            scored.append((self._cosine(query, vector), dominio))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored
+    
+    def save(self, path=INDEX_CACHE_PATH):
+        """Grava as contagens de termos em disco."""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'format': INDEX_FORMAT_VERSION, 'fingerprint': self.fingerprint,
+                           'entries': self.term_counts}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o índice da taxonomia em {path}: {str(e)}")
+    
+    @staticmethod
+    def load_counts(path=INDEX_CACHE_PATH):
+        """Lê as contagens de termos gravadas em disco (ou {} se não existirem)."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') != INDEX_FORMAT_VERSION:
+                return {}
+            return data.get('entries', {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Índice da taxonomia em {path} ignorado: {str(e)}")
+            return {}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_retrieval_index(aia_data):
+    """
+    Retorna o índice do processo para a taxonomia informada, reconstruindo-o
+    incrementalmente (a partir do índice em memória ou do arquivo em disco) se ela mudou.
+    """
+    global _index
+    fingerprint = TaxonomyRetrievalIndex.compute_fingerprint(aia_data)
+    index = _index
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+    
+    with _index_lock:
+        if _index is not None and _index.fingerprint == fingerprint:
+            return _index
+        
+        previous_counts = _index.term_counts if _index is not None else TaxonomyRetrievalIndex.load_counts()
+        index = TaxonomyRetrievalIndex()
+        rebuilt = index.build(aia_data, previous_counts)
+        logger.info(f"Índice TF-IDF da taxonomia construído: {len(index.items)} entradas ({rebuilt} reprocessadas)")
+        if rebuilt:
+            index.save()
+        _index = index
+        return index
+
+
+def project_text(project):
+    """Texto do projeto usado na recuperação (título, objetivo, descrição pública e tags)."""
+    return " ".join(str(project.get(field) or '') for field in
+                    ('titulo', 'titulo_publico', 'objetivo', 'descricao_publica', 'tags'))
+
+
+def retrieve_candidates(project, aia_data, top_n, skip_threshold=None):
+    """
+    Seleciona localmente as entradas da taxonomia mais similares ao projeto.
+    
+    Args:
+        project: Dicionário com informações do projeto
+        aia_data: Lista completa de categorias do AIA
+        top_n: Número de entradas mantidas para a Etapa 1
+        skip_threshold: Similaridade mínima para dispensar a Etapa 1 (None = nunca dispensar)
+        
+    Returns:
+        Tupla (candidatos, resultado_local). resultado_local é um resultado da Etapa 1 com
+        confiança ALTA quando a similaridade é decisiva, ou None caso contrário.
+    """
+    index = get_retrieval_index(aia_data)
+    text = project_text(project)
+    ranked = index.rank(text)
+    candidates = [item for score, item in ranked[:top_n] if score > 0]
+    
+    if not candidates:
+        logger.info("Recuperação local sem termos em comum com a taxonomia. Usando a taxonomia completa.")
+        return aia_data, None
+    
+    logger.info(f"Recuperação local: {len(candidates)} candidatos, melhor similaridade {ranked[0][0]:.3f}")
+    
+    if skip_threshold is None:
+        return candidates, None
+    
+    best_score, best_item = ranked[0]
+    second_score = ranked[1][0] if len(ranked) > 1 else 0.0
+    if best_score < skip_threshold or best_score < DECISIVE_MARGIN * second_score:
+        return candidates, None
+    
+    dominios = [dominio for score, dominio in index.rank_dominios(text, best_item)[:3] if score > 0]
+    if not dominios:
+        return candidates, None
+    
+    logger.info(f"Recuperação local decisiva ({best_score:.3f} vs {second_score:.3f}): Etapa 1 dispensada")
+    return candidates, {
+        "_aia_n1_macroarea": best_item.get('Macroárea', ''),
+        "_aia_n2_segmento": best_item.get('Segmento', ''),
+        "_aia_n3_dominio_afeito": ";".join(dominios),
+        "confianca": "ALTA",
+        "justificativa": f"Classificação por similaridade textual com a taxonomia (similaridade {best_score:.2f})."
+    }
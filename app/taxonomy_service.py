@@ -0,0 +1,546 @@
+"""
+Acesso à taxonomia (gepes.categoria_listas) usado pela classificação com IA, pelas rotas e
+pelos scripts: listas de categorias, dados AIA e classes/subclasses de tecnologias verdes.
+
+As estruturas vêm do snapshot da taxonomia (app.taxonomy) e não dependem de um cliente da
+API OpenAI.
+"""
+
+import json
+import logging
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app.models import CategoriaLista, db
+from app.schema_capabilities import has_column
+from app.taxonomy import Uncached, get_taxonomy_snapshot
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def get_categoria_lista_query():
+    """
+    Retorna uma query para CategoriaLista que é segura mesmo se a coluna 'descricao' não existir.
+    """
+    try:
+        # Verificar se a coluna 'descricao' existe na tabela (resultado da inspeção feita no startup)
+        if has_column('categoria_listas', 'descricao'):
+            # Se a coluna existe, incluí-la na query
+            return CategoriaLista.query
+        else:
+            # Se a coluna não existe, criar uma query que não inclui a coluna
+            # Criar um alias para a tabela CategoriaLista
+            CategoriaListaAlias = aliased(CategoriaLista)
+            
+            # Criar uma query que seleciona apenas as colunas que existem
+            query = select(
+                CategoriaListaAlias.id,
+                CategoriaListaAlias.tipo,
+                CategoriaListaAlias.valor,
+                CategoriaListaAlias.ativo
+            ).select_from(CategoriaListaAlias)
+            
+            # Converter para uma query SQLAlchemy
+            return db.session.query(CategoriaListaAlias.id, CategoriaListaAlias.tipo, CategoriaListaAlias.valor, CategoriaListaAlias.ativo)
+    except Exception as e:
+        logger.error(f"Erro ao criar query para CategoriaLista: {str(e)}")
+        # Em caso de erro, retornar uma query simples que não inclui a coluna 'descricao'
+        return db.session.query(CategoriaLista.id, CategoriaLista.tipo, CategoriaLista.valor, CategoriaLista.ativo)
+
+
+def get_categories_lists():
+    """Obtém as listas de categorias a partir do snapshot da taxonomia."""
+    return get_taxonomy_snapshot('categories_lists', _load_categories_lists)
+
+
+def _load_categories_lists():
+    """Obtém as listas de categorias do banco de dados."""
+    organized_lists = {}
+    
+    # Inicializar listas vazias para cada tipo
+    for tipo in ['tecnologias_habilitadoras', 'areas_aplicacao', 'microarea', 'segmento', 'dominio']:
+        organized_lists[tipo] = []
+    
+    # Mapeamento de tipos para consulta no banco de dados
+    tipo_mapping = {
+        'microarea': 'macroárea',
+        'segmento': 'segmento',
+        'dominio': 'dominio'
+    }
+    
+    # Estrutura para armazenar domínios por microárea e segmento
+    dominios_por_microarea_segmento = {}
+    failed = False
+    
+    try:
+        # Obter todas as categorias ativas usando a query segura, em ordem estável
+        # (o texto da taxonomia no prompt deve ser idêntico entre processos para o cache de prompt)
+        all_categories = sorted(get_categoria_lista_query().filter_by(ativo=True).all(), key=lambda c: c.id)
+        
+        # Log para depuração
+        logger.info(f"Recuperadas {len(all_categories)} categorias ativas do banco de dados")
+        
+        # Verificar se há categorias suficientes
+        if not all_categories or len(all_categories) < 100:  # Verificar se temos pelo menos 100 categorias
+            logger.warning(f"Poucas categorias encontradas no banco de dados: {len(all_categories)}. Adicionando categorias de exemplo.")
+            
+            # Adicionar categorias de exemplo para evitar erros
+            logger.info("Adicionando categorias de exemplo para complementar as existentes")
+            
+            # Adicionar macroáreas de exemplo (complementando as existentes)
+            example_macroareas = ["Energia renovável", "Construção", "Saúde", "Agro e Alimentos", "Telecomunicações", 
+                                 "Relações B2B/B2C", "Serviços Industriais de Utilidade Pública", 
+                                 "Indústria de base e transformação", "Engenharia de Produção", 
+                                 "Defesa e aeroespacial", "Petróleo e gás"]
+            for macroarea in example_macroareas:
+                organized_lists['microarea'].append(macroarea)
+                dominios_por_microarea_segmento[macroarea] = {}
+            
+            # Adicionar segmentos de exemplo (complementando os existentes)
+            example_segmentos = {
+                "Energia renovável": ["Energia solar fotovoltaica", "Energia eólica", "Biomossa (biodiesel) e biogás", "Energia hidrelétrica", "Hidrogênio verde"],
+                "Construção": ["Construção de Edifícios", "Obras de Infraestrutura", "Serviços Especializados para Construção"],
+                "Saúde": ["Assistência à Saúde", "Dispositivos Médicos e Biomateriais", "Gestão e Inteligência em Saúde Pública", "Produtos Farmacêuticos e Insumos Estratégicos"],
+                "Agro e Alimentos": ["Agricultura", "Alimentos e Bebidas", "Pecuária"],
+                "Telecomunicações": ["Comunicação por Satélite", "Redes de Comunicação Terrestre"],
+                "Relações B2B/B2C": ["Soluções de CRM", "E-commerce e Experiências Digitais", "SaaS e Microserviços"],
+                "Indústria de base e transformação": ["Indústria química", "Indústria automobilística", "Indústria têxtil e de vestuário"],
+                "Engenharia de Produção": ["Gestão da Produção e Operações", "Logística e Cadeias de Suprimento"]
+            }
+            
+            for macroarea, segmentos in example_segmentos.items():
+                for segmento in segmentos:
+                    if segmento not in organized_lists['segmento']:
+                        organized_lists['segmento'].append(segmento)
+                    dominios_por_microarea_segmento[macroarea][segmento] = []
+            
+            # Adicionar domínios de exemplo (complementando os existentes)
+            example_dominios = {
+                "Energia solar fotovoltaica": ["Painéis bifaciais e de alta eficiência", "Integração com edificações e infraestrutura urbana", "Inversores e sistemas de controle", "Armazenamento em baterias"],
+                "Energia eólica": ["Turbinas onshore e offshore", "Integração com redes elétricas", "Sistemas de controle e conversão de energia", "Armazenamento complementar"],
+                "Biomossa (biodiesel) e biogás": ["Produção de biodiesel", "Digestores anaeróbicos", "Purificação e refino de biogás"],
+                "Energia hidrelétrica": ["Micro e minihidrelétricas", "Sistemas de modernização de usinas existentes"],
+                "Hidrogênio verde": ["Eletrólise com energia renovável", "Células a combustível"],
+                "Construção de Edifícios": ["Edificações sustentáveis", "Automação predial e IoT em edifícios", "Materiais estruturais avançados"],
+                "Obras de Infraestrutura": ["Infraestruturas inteligentes", "Monitoramento estrutural"],
+                "Assistência à Saúde": ["Telemedicina", "Sistemas de gestão hospitalar", "Aplicativos de suporte ao cuidado"],
+                "Dispositivos Médicos e Biomateriais": ["Equipamentos de diagnóstico", "Dispositivos vestíveis"],
+                "Agricultura": ["Agricultura de precisão e automação agrícola", "Melhoramento genético vegetal"],
+                "Alimentos e Bebidas": ["Processamento de alimentos e bebidas", "Segurança e conservação alimentar"],
+                "Redes de Comunicação Terrestre": ["Redes 5G e futuras gerações (6G)", "Conectividade móvel"],
+                "SaaS e Microserviços": ["Plataformas web com entrega de software como serviço", "Desenvolvimento de APIs e interfaces para integração de serviços"]
+            }
+            
+            for segmento, dominios in example_dominios.items():
+                for macroarea, segmentos in dominios_por_microarea_segmento.items():
+                    if segmento in segmentos:
+                        for dominio in dominios:
+                            if dominio not in organized_lists['dominio']:
+                                organized_lists['dominio'].append(dominio)
+                            dominios_por_microarea_segmento[macroarea][segmento].append(dominio)
+            
+            # Adicionar a estrutura hierárquica ao resultado
+            organized_lists['dominios_por_microarea_segmento'] = dominios_por_microarea_segmento
+            
+            # Log para depuração
+            logger.info(f"Categorias de exemplo adicionadas: microarea={len(organized_lists['microarea'])}, segmento={len(organized_lists['segmento'])}, dominio={len(organized_lists['dominio'])}")
+            
+            return organized_lists
+        
+        # Processar cada categoria
+        for categoria in all_categories:
+            tipo = categoria.tipo
+            valor = categoria.valor
+            
+            # Log para depuração
+            logger.debug(f"Processando categoria: tipo={tipo}, valor={valor}")
+            
+            # Mapear o tipo do banco de dados para o tipo usado na interface
+            if tipo in tipo_mapping.values():
+                # Encontrar a chave correspondente ao valor
+                for ui_tipo, db_tipo in tipo_mapping.items():
+                    if db_tipo == tipo:
+                        # Adicionar à lista correspondente
+                        if valor not in organized_lists[ui_tipo]:
+                            organized_lists[ui_tipo].append(valor)
+                        break
+            elif tipo in organized_lists:
+                # Para outros tipos que não estão no mapeamento
+                if valor not in organized_lists[tipo]:
+                    organized_lists[tipo].append(valor)
+            
+            # Processar categorias para a estrutura hierárquica
+            if tipo == 'macroárea':
+                # Macroárea é adicionada diretamente
+                if valor not in organized_lists['microarea']:
+                    organized_lists['microarea'].append(valor)
+                
+                # Inicializar a estrutura para esta macroárea
+                if valor not in dominios_por_microarea_segmento:
+                    dominios_por_microarea_segmento[valor] = {}
+            
+            elif tipo == 'segmento':
+                # Segmento está no formato "Macroárea|Segmento"
+                if '|' in valor:
+                    parts = valor.split('|')
+                    if len(parts) >= 2:
+                        macroárea = parts[0]
+                        segmento = parts[1]
+                        
+                        # Adicionar à lista de segmentos
+                        if segmento not in organized_lists['segmento']:
+                            organized_lists['segmento'].append(segmento)
+                        
+                        # Adicionar à estrutura hierárquica
+                        if macroárea not in dominios_por_microarea_segmento:
+                            dominios_por_microarea_segmento[macroárea] = {}
+                        
+                        if segmento not in dominios_por_microarea_segmento[macroárea]:
+                            dominios_por_microarea_segmento[macroárea][segmento] = []
+            
+            elif tipo == 'dominio':
+                # Domínio está no formato "Macroárea|Segmento|Domínio"
+                if '|' in valor:
+                    parts = valor.split('|')
+                    if len(parts) >= 3:
+                        macroárea = parts[0]
+                        segmento = parts[1]
+                        dominio = parts[2]
+                        
+                        # Adicionar à lista de domínios
+                        if dominio not in organized_lists['dominio']:
+                            organized_lists['dominio'].append(dominio)
+                        
+                        # Adicionar à estrutura hierárquica
+                        if macroárea not in dominios_por_microarea_segmento:
+                            dominios_por_microarea_segmento[macroárea] = {}
+                        
+                        if segmento not in dominios_por_microarea_segmento[macroárea]:
+                            dominios_por_microarea_segmento[macroárea][segmento] = []
+                        
+                        if dominio not in dominios_por_microarea_segmento[macroárea][segmento]:
+                            dominios_por_microarea_segmento[macroárea][segmento].append(dominio)
+        
+        # Log para depuração
+        logger.info(f"Categorias processadas: microarea={len(organized_lists['microarea'])}, segmento={len(organized_lists['segmento'])}, dominio={len(organized_lists['dominio'])}")
+        
+    except Exception as e:
+        logger.error(f"Erro ao obter categorias do banco de dados: {str(e)}")
+        failed = True
+    
+    # Adicionar a estrutura hierárquica ao resultado
+    organized_lists['dominios_por_microarea_segmento'] = dominios_por_microarea_segmento
+    
+    # Listas parciais (erro no meio da leitura) não ficam no snapshot
+    return Uncached(organized_lists) if failed else organized_lists
+
+
+def get_tecverde_classes():
+    """Obtém as classes de tecnologias verdes a partir do snapshot da taxonomia."""
+    return get_taxonomy_snapshot('tecverde_classes', _load_tecverde_classes)
+
+
+def _load_tecverde_classes():
+    """Obtém as classes de tecnologias verdes do banco de dados."""
+    tecverde_classes = {}
+    failed = False
+    
+    try:
+        # Buscar classes de tecnologias verdes no banco de dados usando a query segura
+        classes = sorted(get_categoria_lista_query().filter_by(tipo='tecverde_classe', ativo=True).all(), key=lambda c: c.id)
+        
+        # Se não encontrou nenhuma classe, usar dados predefinidos para exemplo
+        if not classes:
+            logger.warning("Nenhuma classe de tecnologia verde encontrada no banco de dados. Usando dados predefinidos.")
+            tecverde_classes = {
+                "Energias alternativas": "Tecnologias relacionadas a fontes de energia alternativas",
+                "Gestão Ambiental": "Tecnologias de gerenciamento e controle do impacto ambiental",
+                "Transporte": "Tecnologias de transporte com menor impacto ambiental",
+                "Conservação": "Tecnologias para conservação de recursos naturais",
+                "Agricultura Sustentável": "Métodos agrícolas que minimizam impacto ambiental"
+            }
+        else:
+            # Processar as classes encontradas no banco de dados
+            for classe in classes:
+                # O valor contém o nome da classe
+                nome_classe = classe.valor
+                
+                # A descrição pode estar em um campo adicional ou ser extraída do valor
+                # Verificar se o atributo 'descricao' existe no objeto e na tabela
+                try:
+                    descricao = classe.descricao if hasattr(classe, 'descricao') else "Tecnologia verde"
+                except Exception as e:
+                    # Se ocorrer um erro ao acessar o atributo (por exemplo, se a coluna não existir no banco de dados)
+                    logger.warning(f"Erro ao acessar atributo 'descricao': {str(e)}. Usando valor padrão.")
+                    descricao = "Tecnologia verde"
+                
+                tecverde_classes[nome_classe] = descricao
+            
+            logger.info(f"Carregadas {len(tecverde_classes)} classes de tecnologias verdes do banco de dados")
+    except Exception as e:
+        logger.error(f"Erro ao obter classes de tecnologias verdes do banco de dados: {str(e)}")
+        failed = True
+        # Em caso de erro, usar dados predefinidos (fora do snapshot)
+        tecverde_classes = {
+            "Energias alternativas": "Tecnologias relacionadas a fontes de energia alternativas",
+            "Gestão Ambiental": "Tecnologias de gerenciamento e controle do impacto ambiental",
+            "Transporte": "Tecnologias de transporte com menor impacto ambiental",
+            "Conservação": "Tecnologias para conservação de recursos naturais",
+            "Agricultura Sustentável": "Métodos agrícolas que minimizam impacto ambiental"
+        }
+    
+    logger.info(f"Classes de tecnologias verdes disponíveis: {list(tecverde_classes.keys())}")
+    return Uncached(tecverde_classes) if failed else tecverde_classes
+
+
+def get_tecverde_subclasses():
+    """Obtém as subclasses de tecnologias verdes a partir do snapshot da taxonomia."""
+    return get_taxonomy_snapshot('tecverde_subclasses', _load_tecverde_subclasses)
+
+
+def _load_tecverde_subclasses():
+    """Obtém as subclasses de tecnologias verdes do banco de dados."""
+    tecverde_subclasses = {}
+    failed = False
+    
+    try:
+        # Buscar subclasses de tecnologias verdes no banco de dados usando a query segura
+        subclasses = sorted(get_categoria_lista_query().filter_by(tipo='tecverde_subclasse', ativo=True).all(), key=lambda c: c.id)
+        
+        # Se não encontrou nenhuma subclasse, usar dados predefinidos para exemplo
+        if not subclasses:
+            logger.warning("Nenhuma subclasse de tecnologia verde encontrada no banco de dados. Usando dados predefinidos.")
+            tecverde_subclasses = {
+                "Energias alternativas": "Solar; Eólica; Biomassa; Geotérmica; Hidrogênio",
+                "Gestão Ambiental": "Tratamento de resíduos; Controle de poluição; Monitoramento ambiental; Remediação",
+                "Transporte": "Veículos elétricos; Biocombustíveis; Mobilidade urbana sustentável",
+                "Conservação": "Conservação de água; Conservação de biodiversidade; Reflorestamento",
+                "Agricultura Sustentável": "Agricultura orgânica; Agricultura de precisão; Agroecologia; Sistemas agroflorestais"
+            }
+        else:
+            # Processar as subclasses encontradas no banco de dados
+            for subclasse in subclasses:
+                # O valor contém o nome da classe e as subclasses no formato "Classe|Subclasse1; Subclasse2; Subclasse3"
+                valor = subclasse.valor
+                
+                # Verificar se o atributo 'descricao' existe no objeto e na tabela
+                try:
+                    # Tentar acessar o atributo 'descricao' (não usado neste método, mas verificamos para consistência)
+                    _ = subclasse.descricao if hasattr(subclasse, 'descricao') else None
+                except Exception as e:
+                    # Se ocorrer um erro ao acessar o atributo, logar o erro
+                    logger.warning(f"Erro ao acessar atributo 'descricao': {str(e)}. Isso não afeta o processamento de subclasses.")
+                
+                if '|' in valor:
+                    partes = valor.split('|')
+                    if len(partes) >= 2:
+                        classe = partes[0].strip()
+                        subclasses_str = partes[1].strip()
+                        
+                        # Adicionar as subclasses para esta classe
+                        tecverde_subclasses[classe] = subclasses_str
+                else:
+                    logger.warning(f"Formato inválido para subclasse: {valor}. Esperado formato 'Classe|Subclasse1; Subclasse2'")
+            
+            logger.info(f"Carregadas subclasses para {len(tecverde_subclasses)} classes de tecnologias verdes do banco de dados")
+    except Exception as e:
+        logger.error(f"Erro ao obter subclasses de tecnologias verdes do banco de dados: {str(e)}")
+        failed = True
+        # Em caso de erro, usar dados predefinidos (fora do snapshot)
+        tecverde_subclasses = {
+            "Energias alternativas": "Solar; Eólica; Biomassa; Geotérmica; Hidrogênio",
+            "Gestão Ambiental": "Tratamento de resíduos; Controle de poluição; Monitoramento ambiental; Remediação",
+            "Transporte": "Veículos elétricos; Biocombustíveis; Mobilidade urbana sustentável",
+            "Conservação": "Conservação de água; Conservação de biodiversidade; Reflorestamento",
+            "Agricultura Sustentável": "Agricultura orgânica; Agricultura de precisão; Agroecologia; Sistemas agroflorestais"
+        }
+    
+    # Logar as subclasses disponíveis para cada classe
+    for classe, subclasses in tecverde_subclasses.items():
+        if isinstance(subclasses, str):
+            if ';' in subclasses:
+                subclasses_list = subclasses.split(';')
+            elif ',' in subclasses:
+                subclasses_list = subclasses.split(',')
+            else:
+                subclasses_list = [subclasses]
+            subclasses_list = [s.strip() for s in subclasses_list if s.strip()]
+            logger.info(f"Subclasses disponíveis para '{classe}': {subclasses_list}")
+    
+    return Uncached(tecverde_subclasses) if failed else tecverde_subclasses
+
+
+def get_aia_data():
+    """Obtém os dados de AIA a partir do snapshot da taxonomia."""
+    return get_taxonomy_snapshot('aia_data', _load_aia_data)
+
+
+def _load_aia_data():
+    """
+    Obtém os dados de AIA (Áreas de Interesse Aplicado) do banco de dados.
+    
+    Returns:
+        Lista de dicionários com as categorias do AIA
+    """
+    try:
+        # Obter as categorias do banco de dados (listas parciais tornam os dados AIA parciais)
+        categories_lists = get_taxonomy_snapshot('categories_lists', _load_categories_lists, keep_uncached=True)
+        failed = isinstance(categories_lists, Uncached)
+        if failed:
+            categories_lists = categories_lists.value
+        
+        # Log para depuração
+        logger.info(f"Estrutura de categorias recuperada: microarea={len(categories_lists.get('microarea', []))}, segmento={len(categories_lists.get('segmento', []))}, dominio={len(categories_lists.get('dominio', []))}")
+        
+        dominios_por_microarea_segmento = categories_lists.get('dominios_por_microarea_segmento', {})
+        
+        # Log para depuração
+        logger.info(f"Número de macroáreas na estrutura hierárquica: {len(dominios_por_microarea_segmento)}")
+        for macroarea, segmentos in dominios_por_microarea_segmento.items():
+            logger.info(f"Macroárea '{macroarea}' tem {len(segmentos)} segmentos")
+        
+        aia_data = []
+        
+        # Converter a estrutura hierárquica para o formato esperado pelo método _build_prompt_etapa1
+        # Garantir que todas as combinações de macroárea e segmento sejam incluídas
+        for macroarea, segmentos in dominios_por_microarea_segmento.items():
+            for segmento, dominios in segmentos.items():
+                dominios_str = "; ".join(dominios) if dominios else ""
+                aia_data.append({
+                    "Macroárea": macroarea,
+                    "Segmento": segmento,
+                    "Domínios Afeitos": dominios_str
+                })
+        
+        # Verificar se temos categorias suficientes
+        if len(aia_data) < 10:
+            logger.warning(f"Poucas categorias encontradas: {len(aia_data)}. Adicionando categorias de produção.")
+            
+            # Adicionar categorias de produção
+            production_categories = [
+                # Macroáreas e segmentos da lista_categories.py
+                {
+                    "Macroárea": "Construção",
+                    "Segmento": "Construção de Edifícios",
+                    "Domínios Afeitos": "Edificações sustentáveis; Automação predial e IoT em edifícios; Materiais estruturais avançados"
+                },
+                {
+                    "Macroárea": "Relações B2B/B2C",
+                    "Segmento": "SaaS e Microserviços",
+                    "Domínios Afeitos": "Plataformas web com entrega de software como serviço; Desenvolvimento de APIs e interfaces para integração de serviços"
+                },
+                {
+                    "Macroárea": "Telecomunicações",
+                    "Segmento": "Redes de Comunicação Terrestre",
+                    "Domínios Afeitos": "Redes 5G e futuras gerações (6G); Conectividade móvel"
+                },
+                {
+                    "Macroárea": "Agro e Alimentos",
+                    "Segmento": "Agricultura",
+                    "Domínios Afeitos": "Agricultura de precisão e automação agrícola; Melhoramento genético vegetal"
+                },
+                {
+                    "Macroárea": "Saúde",
+                    "Segmento": "Assistência à Saúde",
+                    "Domínios Afeitos": "Telemedicina; Sistemas de gestão hospitalar"
+                },
+                {
+                    "Macroárea": "Energia renovável",
+                    "Segmento": "Energia solar fotovoltaica",
+                    "Domínios Afeitos": "Integração com edificações e infraestrutura urbana; Painéis bifaciais e de alta eficiência"
+                },
+                {
+                    "Macroárea": "Energia renovável",
+                    "Segmento": "Energia eólica",
+                    "Domínios Afeitos": "Integração com redes elétricas; Armazenamento complementar; Integração com outras fontes renováveis"
+                },
+                {
+                    "Macroárea": "Engenharia de Produção",
+                    "Segmento": "Gestão da Produção e Operações",
+                    "Domínios Afeitos": "Planejamento de processos produtivos; Controle de produção em tempo real"
+                },
+                {
+                    "Macroárea": "Indústria de base e transformação",
+                    "Segmento": "Indústria química",
+                    "Domínios Afeitos": "Desenvolvimento de novos polímeros e compósitos; Processos sustentáveis para síntese química"
+                },
+                {
+                    "Macroárea": "Petróleo e gás",
+                    "Segmento": "Exploração e produção de petróleo",
+                    "Domínios Afeitos": "Tecnologias para prospecção geofísica e sísmica; Perfuração de poços em águas profundas e ultraprofundas"
+                }
+            ]
+            
+            # Adicionar categorias de produção à lista existente
+            for category in production_categories:
+                if not any(item["Macroárea"] == category["Macroárea"] and 
+                          item["Segmento"] == category["Segmento"] for item in aia_data):
+                    aia_data.append(category)
+            
+            logger.info(f"Adicionadas {len(production_categories)} categorias de produção. Total agora: {len(aia_data)}")
+        
+        # Logar as categorias disponíveis
+        logger.info(f"Total de categorias disponíveis para classificação: {len(aia_data)}")
+        logger.debug(f"Primeiras 5 categorias disponíveis para classificação: {json.dumps(aia_data[:5], indent=2, ensure_ascii=False)}")
+        
+        # Verificar se estamos usando apenas 50 categorias (que é o padrão)
+        if len(aia_data) == 50:
+            logger.warning("Detectado limite de 50 categorias. Removendo limite para usar todas as categorias disponíveis.")
+            # Reconstruir aia_data com todas as categorias disponíveis
+            aia_data = []
+            for macroarea, segmentos in dominios_por_microarea_segmento.items():
+                for segmento, dominios in segmentos.items():
+                    dominios_str = "; ".join(dominios) if dominios else ""
+                    aia_data.append({
+                        "Macroárea": macroarea,
+                        "Segmento": segmento,
+                        "Domínios Afeitos": dominios_str
+                    })
+            logger.info(f"Reconstruído aia_data com todas as categorias. Total agora: {len(aia_data)}")
+        
+        # Usar todas as categorias disponíveis para classificação
+        # Não limitar o número de categorias usadas
+        
+        # Garantir que temos pelo menos as categorias básicas
+        if not any(item["Macroárea"] == "Energia renovável" for item in aia_data):
+            logger.warning("Categoria 'Energia renovável' não encontrada. Adicionando manualmente.")
+            aia_data.append({
+                "Macroárea": "Energia renovável",
+                "Segmento": "Energia solar fotovoltaica",
+                "Domínios Afeitos": "Integração com edificações e infraestrutura urbana"
+            })
+        
+        return Uncached(aia_data) if failed else aia_data
+        
+    except Exception as e:
+        logger.error(f"Erro ao obter dados AIA do banco de dados: {str(e)}")
+        # Em caso de erro, retornar dados de exemplo (fora do snapshot)
+        logger.warning("Retornando dados de exemplo devido a erro")
+        return Uncached([
+            {
+                "Macroárea": "Energia renovável",
+                "Segmento": "Energia solar fotovoltaica",
+                "Domínios Afeitos": "Integração com edificações e infraestrutura urbana"
+            },
+            {
+                "Macroárea": "Energia renovável",
+                "Segmento": "Energia eólica",
+                "Domínios Afeitos": "Integração com redes elétricas; Armazenamento complementar; Integração com outras fontes renováveis"
+            },
+            {
+                "Macroárea": "Construção",
+                "Segmento": "Construção de Edifícios",
+                "Domínios Afeitos": "Edificações sustentáveis; Automação predial e IoT em edifícios"
+            },
+            {
+                "Macroárea": "Saúde",
+                "Segmento": "Assistência à Saúde",
+                "Domínios Afeitos": "Telemedicina; Sistemas de gestão hospitalar"
+            },
+            {
+                "Macroárea": "Agro e Alimentos",
+                "Segmento": "Agricultura",
+                "Domínios Afeitos": "Agricultura de precisão e automação agrícola; Melhoramento genético vegetal"
+            }
+        ])
@@ -0,0 +1,40 @@
+import re
+import unicodedata
+
+# Palavras muito frequentes em português que não ajudam a distinguir categorias
+STOPWORDS_PT = frozenset("""
+a ao aos as com como da das de do dos e em entre na nas no nos o os ou para pela pelas pelo pelos
+por que se sem sob sobre um uma umas uns sua suas seu seus ser sao foi mais menos muito outros
+outras este esta estes estas esse essa isso aquele aquela nao tambem ja ate apos cada qual quais
+""".split())
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def fold_accents(text):
+    """Remove acentos e cedilhas ('Saúde' -> 'Saude')."""
+    normalized = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in normalized if not unicodedata.combining(c))
+
+
+def normalize_text(text):
+    """Normaliza texto para comparação: minúsculas, sem acentos e com espaços simples."""
+    return _SPACES_RE.sub(' ', fold_accents(str(text or '')).lower()).strip()
+
+
+def tokenize(text, min_length=3):
+    """
+    Divide o texto em termos normalizados, descartando stopwords e termos curtos.
+    
+    Args:
+        text: Texto de entrada
+        min_length: Tamanho mínimo dos termos
+        
+    Returns:
+        Lista de termos
+    """
+    return [
+        word for word in _WORD_RE.findall(normalize_text(text))
+        if len(word) >= min_length and word not in STOPWORDS_PT
+    ]
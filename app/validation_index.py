@@ -0,0 +1,206 @@
+import threading
+import logging
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from app.text_utils import normalize_text
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Similaridade mínima (coeficiente de Dice sobre trigramas) para aceitar uma correção aproximada
+MIN_FUZZY_SIMILARITY = 0.5
+
+# Número de candidatos por trigramas desempatados por SequenceMatcher
+FUZZY_RERANK_CANDIDATES = 5
+
+# Índices mantidos em memória (um por objeto de taxonomia; o snapshot cria um objeto por versão)
+VALIDATION_INDEX_CACHE_SIZE = 4
+
+# Tipos de correspondência retornados por FuzzyVocabulary.match
+MATCH_EXACT = 'exata'
+MATCH_NORMALIZED = 'normalizada'
+MATCH_FUZZY = 'aproximada'
+
+
+def _trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyVocabulary:
+    """
+    Conjunto de valores válidos com busca exata, normalizada (sem acentos/maiúsculas) e aproximada.
+
+    A busca aproximada usa um índice invertido de trigramas: apenas os valores que compartilham
+    trigramas com a entrada são pontuados (coeficiente de Dice) e os melhores são desempatados
+    por SequenceMatcher.
+    """
+
+    def __init__(self, values):
+        self.values = []
+        self._exact = {}
+        self._normalized = {}
+        self._grams = []
+        self._postings = {}
+
+        for value in values:
+            if not value or value in self._exact:
+                continue
+            position = len(self.values)
+            normalized = normalize_text(value)
+            grams = _trigrams(normalized)
+            self.values.append(value)
+            self._exact[value] = value
+            self._normalized.setdefault(normalized, value)
+            self._grams.append((normalized, grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(position)
+
+    def __contains__(self, value):
+        return value in self._exact
+
+    def __len__(self):
+        return len(self.values)
+
+    def match(self, value, min_similarity=MIN_FUZZY_SIMILARITY):
+        """
+        Encontra o valor válido correspondente.
+
+        Args:
+            value: Valor retornado pela IA
+            min_similarity: Similaridade mínima para a correspondência aproximada
+
+        Returns:
+            Tupla (valor válido ou None, tipo de correspondência ou None)
+        """
+        value = (value or '').strip()
+        if not value:
+            return None, None
+        if value in self._exact:
+            return value, MATCH_EXACT
+
+        normalized = normalize_text(value)
+        if normalized in self._normalized:
+            return self._normalized[normalized], MATCH_NORMALIZED
+
+        grams = _trigrams(normalized)
+        shared = {}
+        for gram in grams:
+            for position in self._postings.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        if not shared:
+            return None, None
+
+        scored = sorted(
+            ((2.0 * count / (len(grams) + len(self._grams[position][1])), position) for position, count in shared.items()),
+            key=lambda item: (-item[0], item[1])
+        )[:FUZZY_RERANK_CANDIDATES]
+        best_score, best_position = max(
+            scored,
+            key=lambda item: (item[0] + SequenceMatcher(None, normalized, self._grams[item[1]][0]).ratio(), -item[1])
+        )
+        if best_score < min_similarity:
+            return None, None
+        return self.values[best_position], MATCH_FUZZY
+
+
+class TaxonomyValidationIndex:
+    """Índice de validação das categorias do AIA (macroárea -> segmento -> domínios)."""
+
+    def __init__(self, aia_data):
+        segmentos_por_macroarea = OrderedDict()
+        dominios_por_segmento = {}
+        pares_por_segmento = OrderedDict()
+
+        for item in aia_data or []:
+            macroarea = (item.get('Macroárea') or '').strip()
+            segmento = (item.get('Segmento') or '').strip()
+            if not macroarea:
+                continue
+            segmentos = segmentos_por_macroarea.setdefault(macroarea, [])
+            if not segmento:
+                continue
+            if segmento not in segmentos:
+                segmentos.append(segmento)
+            pares_por_segmento.setdefault(segmento, []).append(macroarea)
+            dominios = dominios_por_segmento.setdefault((macroarea, segmento), [])
+            for dominio in (item.get('Domínios Afeitos') or '').split(';'):
+                dominio = dominio.strip()
+                if dominio and dominio not in dominios:
+                    dominios.append(dominio)
+
+        self.macroareas = FuzzyVocabulary(segmentos_por_macroarea)
+        self.segmentos = {macroarea: FuzzyVocabulary(segmentos) for macroarea, segmentos in segmentos_por_macroarea.items()}
+        self.dominios = {par: FuzzyVocabulary(dominios) for par, dominios in dominios_por_segmento.items()}
+        # Segmentos de todas as macroáreas, para deduzir a macroárea quando apenas ela está errada
+        self.todos_segmentos = FuzzyVocabulary(pares_por_segmento)
+        self._macroareas_do_segmento = pares_por_segmento
+
+    def macroarea_do_segmento(self, segmento):
+        """Retorna a macroárea do segmento se ele pertencer a uma única macroárea, senão None."""
+        macroareas = self._macroareas_do_segmento.get(segmento, [])
+        return macroareas[0] if len(set(macroareas)) == 1 else None
+
+
+class TecverdeValidationIndex:
+    """Índice de validação das classes e subclasses de tecnologias verdes."""
+
+    def __init__(self, tecverde_classes, tecverde_subclasses):
+        self.classes = FuzzyVocabulary(tecverde_classes or {})
+        self.subclasses = {}
+        for classe in self.classes.values:
+            subclasses = (tecverde_subclasses or {}).get(classe, '')
+            if isinstance(subclasses, str):
+                separador = ';' if ';' in subclasses else ','
+                subclasses = subclasses.split(separador)
+            self.subclasses[classe] = FuzzyVocabulary(s.strip() for s in subclasses if s and s.strip())
+
+
+class _IdentityCache:
+    """
+    Cache de índices pela identidade dos objetos de origem.
+
+    Os objetos de taxonomia vêm do snapshot (app.taxonomy), que cria objetos novos a cada versão;
+    assim cada índice é construído uma vez por versão da taxonomia, sem recalcular hashes.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sources, build):
+        key = tuple(id(source) for source in sources)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and all(a is b for a, b in zip(entry[0], sources)):
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        index = build()
+
+        with self._lock:
+            # Guardar as referências impede que os ids sejam reutilizados por outros objetos
+            self._entries[key] = (sources, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return index
+
+
+_taxonomy_indexes = _IdentityCache(VALIDATION_INDEX_CACHE_SIZE)
+_tecverde_indexes = _IdentityCache(VALIDATION_INDEX_CACHE_SIZE)
+
+
+def get_taxonomy_validation_index(aia_data):
+    """Retorna o índice de validação para os dados do AIA (construído uma vez por objeto)."""
+    return _taxonomy_indexes.get((aia_data,), lambda: TaxonomyValidationIndex(aia_data))
+
+
+def get_tecverde_validation_index(tecverde_classes, tecverde_subclasses):
+    """Retorna o índice de validação das tecnologias verdes (construído uma vez por objeto)."""
+    return _tecverde_indexes.get(
+        (tecverde_classes, tecverde_subclasses),
+        lambda: TecverdeValidationIndex(tecverde_classes, tecverde_subclasses)
+    )
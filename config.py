@@ -9,6 +9,42 @@ class Config:
                              'postgresql://localhost/gepes_classify'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+    
+    # Pré-geração de sugestões da IA para os próximos projetos da fila de revisão
+    SUGGESTION_PREFETCH_AHEAD = int(os.environ.get('SUGGESTION_PREFETCH_AHEAD', 3))
+    # Máximo de projetos pré-gerados por usuário a cada hora
+    SUGGESTION_PREFETCH_MAX_PER_USER_HOUR = int(os.environ.get('SUGGESTION_PREFETCH_MAX_PER_USER_HOUR', 30))
+    # Máximo de pré-gerações em andamento no processo (deixa threads livres para a página aberta)
+    SUGGESTION_PREFETCH_MAX_ACTIVE = int(os.environ.get('SUGGESTION_PREFETCH_MAX_ACTIVE', 2))
+    # Acompanhar os jobs de sugestão por server-sent events em vez de consultar o status: cada
+    # stream ocupa um worker enquanto o job roda, então só habilitar com workers em threads/gevent
+    SUGGESTION_STREAM_ENABLED = os.environ.get('SUGGESTION_STREAM_ENABLED', '').lower() in ('1', 'true', 'sim')
+
+    # Pool HTTP compartilhado pelos clientes da API OpenAI (app.openai_clients)
+    OPENAI_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_TIMEOUT_SECONDS', 60))
+    OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_CONNECT_TIMEOUT_SECONDS', 5))
+    # Conexões simultâneas com a API (cobrir os workers das etapas e da fila de sugestões)
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+    OPENAI_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY_SECONDS', 60))
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 2))
+
+    # Cache de respostas do chatbot (app.rag_cache): 'tiered' (memória + banco), 'memory' ou 'database'
+    RAG_CACHE_BACKEND = os.environ.get('RAG_CACHE_BACKEND', 'tiered')
+    # Entradas mantidas no LRU em memória de cada processo
+    RAG_CACHE_MAX_ENTRIES = int(os.environ.get('RAG_CACHE_MAX_ENTRIES', 500))
+    # Tempo de vida das respostas sem versão dos dados (ex.: quando as versões não puderam ser lidas)
+    RAG_CACHE_TTL_SECONDS = int(os.environ.get('RAG_CACHE_TTL_SECONDS', 3600))
+    # Respostas versionadas são descartadas quando os dados mudam, então podem viver bem mais
+    RAG_CACHE_VERSIONED_TTL_SECONDS = int(os.environ.get('RAG_CACHE_VERSIONED_TTL_SECONDS', 7 * 24 * 3600))
+
+    # Tempo máximo de reaproveitamento do snapshot de estatísticas (app.statistics_snapshot);
+    # mudanças versionadas nos dados invalidam o snapshot antes disso
+    STATISTICS_SNAPSHOT_TTL_SECONDS = int(os.environ.get('STATISTICS_SNAPSHOT_TTL_SECONDS', 60))
+
+    # Tempo de reserva de um projeto da fila de revisão para o revisor que o abriu
+    # (app.review_queue); depois disso o projeto volta a ser oferecido aos demais
+    REVIEW_QUEUE_LEASE_SECONDS = int(os.environ.get('REVIEW_QUEUE_LEASE_SECONDS', 30 * 60))
 
     @staticmethod
     def get_openai_api_key():
@@ -0,0 +1,49 @@
+"""add busca tsvector to projetos
+
+Revision ID: add_busca_to_projetos
+Revises: add_versoes_to_rag_cache
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_busca_to_projetos'
+down_revision = 'add_versoes_to_rag_cache'
+branch_labels = None
+depends_on = None
+
+
+# Mesma expressão de app.project_search.SEARCH_VECTOR_SQL no momento desta migração
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('portuguese', coalesce(titulo, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(codigo_projeto, '')), 'A') || "
+    "setweight(to_tsvector('portuguese', coalesce(unidade_embrapii, '') || ' ' || "
+    "coalesce(_aia_n1_macroarea, '') || ' ' || coalesce(_aia_n2_segmento, '')), 'B') || "
+    "setweight(to_tsvector('portuguese', coalesce(objetivo, '')), 'C') || "
+    "setweight(to_tsvector('portuguese', coalesce(descricao_publica, '')), 'D')"
+)
+
+
+def upgrade():
+    # Índice de trigramas para buscas por trecho do código do projeto
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Coluna gerada: o PostgreSQL a recalcula em cada INSERT/UPDATE de projetos
+    op.execute(
+        "ALTER TABLE gepes.projetos ADD COLUMN IF NOT EXISTS busca tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_projetos_busca ON gepes.projetos USING gin (busca)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_projetos_codigo_projeto_trgm "
+        "ON gepes.projetos USING gin (codigo_projeto gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS gepes.ix_projetos_codigo_projeto_trgm")
+    op.execute("DROP INDEX IF EXISTS gepes.ix_projetos_busca")
+    op.execute("ALTER TABLE gepes.projetos DROP COLUMN IF EXISTS busca")
@@ -0,0 +1,69 @@
+"""add status_classificacao to projetos
+
+Revision ID: add_status_classificacao_to_projetos
+Revises: add_busca_to_projetos
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_status_classificacao_to_projetos'
+down_revision = 'add_busca_to_projetos'
+branch_labels = None
+depends_on = None
+
+
+# Mesma expressão de app.classification_status.STATUS_SQL no momento desta migração
+STATUS_SQL = """
+    CASE
+        WHEN EXISTS (SELECT 1 FROM gepes.categorias c WHERE c.id_projeto = p.id) THEN 'validado_humano'
+        WHEN EXISTS (SELECT 1 FROM gepes.ai_suggestions s WHERE s.id_projeto = p.id) THEN 'classificado_ia'
+        ELSE 'nao_classificado'
+    END
+"""
+
+# Índices parciais por status (fila de revisão e filtros da listagem, ordenados por id)
+STATUS_INDEXES = {
+    'ix_projetos_status_nao_classificado': 'nao_classificado',
+    'ix_projetos_status_classificado_ia': 'classificado_ia',
+    'ix_projetos_status_validado_humano': 'validado_humano',
+}
+
+# Índices parciais do filtro de tecnologia verde (tecverde_se_aplica: sim, não ou não avaliado)
+TECVERDE_INDEXES = {
+    'ix_projetos_tecverde_sim': ('id', 'tecverde_se_aplica = true'),
+    'ix_projetos_tecverde_nao': ('id', 'tecverde_se_aplica = false'),
+    'ix_projetos_tecverde_pendente': ('id', 'tecverde_se_aplica IS NULL'),
+    'ix_projetos_tecverde_classe': ('tecverde_classe, id', 'tecverde_se_aplica = true'),
+}
+
+
+def upgrade():
+    op.execute(
+        "ALTER TABLE gepes.projetos ADD COLUMN IF NOT EXISTS status_classificacao text "
+        "NOT NULL DEFAULT 'nao_classificado' "
+        "CONSTRAINT ck_projetos_status_classificacao "
+        "CHECK (status_classificacao IN ('nao_classificado', 'classificado_ia', 'validado_humano'))"
+    )
+
+    # Preencher o status dos projetos existentes
+    op.execute(f"UPDATE gepes.projetos p SET status_classificacao = {STATUS_SQL}")
+
+    for name, status in STATUS_INDEXES.items():
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON gepes.projetos (id) "
+            f"WHERE status_classificacao = '{status}'"
+        )
+    for name, (columns, predicate) in TECVERDE_INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON gepes.projetos ({columns}) WHERE {predicate}")
+
+    op.execute("ANALYZE gepes.projetos")
+
+
+def downgrade():
+    for name in list(TECVERDE_INDEXES) + list(STATUS_INDEXES):
+        op.execute(f"DROP INDEX IF EXISTS gepes.{name}")
+    op.execute("ALTER TABLE gepes.projetos DROP COLUMN IF EXISTS status_classificacao")
@@ -0,0 +1,36 @@
+"""add versoes to rag_cache
+
+Revision ID: add_versoes_to_rag_cache
+Revises: alter_valor_column_to_text
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_versoes_to_rag_cache'
+down_revision = 'alter_valor_column_to_text'
+branch_labels = None
+depends_on = None
+
+
+def _rag_cache_columns():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('rag_cache', schema='gepes'):
+        return None
+    return {column['name'] for column in inspector.get_columns('rag_cache', schema='gepes')}
+
+
+def upgrade():
+    # A tabela é criada por db.create_all(); só bancos que já a tinham precisam da nova coluna
+    columns = _rag_cache_columns()
+    if columns is not None and 'versoes' not in columns:
+        op.add_column('rag_cache', sa.Column('versoes', sa.Text(), nullable=True), schema='gepes')
+
+
+def downgrade():
+    columns = _rag_cache_columns()
+    if columns is not None and 'versoes' in columns:
+        op.drop_column('rag_cache', 'versoes', schema='gepes')
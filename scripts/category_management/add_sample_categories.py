@@ -1,5 +1,6 @@
 from app import create_app, db
 from app.models import CategoriaLista
+from app.taxonomy import invalidate_taxonomy
 
 def add_sample_categories():
     """
@@ -83,7 +84,9 @@ def add_sample_categories():
                 db.session.add(nova_categoria)
                 added_count += 1
         
-        # Salvar as alterações
+        # Salvar as alterações (incrementando a versão da taxonomia para que a aplicação
+        # descarte o snapshot em cache)
+        invalidate_taxonomy()
         db.session.commit()
         
         print(f"Foram adicionadas {added_count} categorias de exemplo ao banco de dados.")
@@ -1,6 +1,5 @@
-import os
 import json
-from app.ai_integration import OpenAIClient
+from app.taxonomy_service import get_aia_data, get_categories_lists, get_tecverde_classes, get_tecverde_subclasses
 from dotenv import load_dotenv
 from app import create_app, db
 from app.models import CategoriaLista
@@ -10,7 +9,7 @@ load_dotenv()
 
 def debug_categories():
     """
-    Depura a função _get_categories_lists() para verificar se está obtendo corretamente
+    Depura a função get_categories_lists() para verificar se está obtendo corretamente
     as categorias do banco de dados e mantendo a estrutura hierárquica.
     """
     # Criar a aplicação Flask
@@ -18,19 +17,9 @@ def debug_categories():
     
     # Criar um contexto de aplicação
     with app.app_context():
-        # Obter a chave da API OpenAI do ambiente
-        api_key = os.getenv('OPENAI_API_KEY')
-        
-        if not api_key:
-            print("Aviso: Chave da API OpenAI não encontrada. Usando uma chave fictícia para teste.")
-            api_key = "fake_key"
-        
-        # Criar um cliente OpenAI
-        client = OpenAIClient(api_key)
-        
         # Obter as categorias do banco de dados
         print("Obtendo categorias do banco de dados...")
-        categories_lists = client._get_categories_lists()
+        categories_lists = get_categories_lists()
         
         # Imprimir as listas de categorias
         print("\nListas de categorias:")
@@ -57,17 +46,17 @@ def debug_categories():
         
         # Obter os dados de AIA
         print("\nDados de AIA:")
-        aia_data = client._get_aia_data_from_db() if hasattr(client, '_get_aia_data_from_db') else []
+        aia_data = get_aia_data()
         print(json.dumps(aia_data, indent=2, ensure_ascii=False))
         
         # Obter as classes e subclasses de tecnologias verdes
         print("\nClasses de Tecnologias Verdes:")
-        tecverde_classes = client._get_tecverde_classes()
+        tecverde_classes = get_tecverde_classes()
         for classe, descricao in tecverde_classes.items():
             print(f"  - {classe}: {descricao}")
         
         print("\nSubclasses de Tecnologias Verdes:")
-        tecverde_subclasses = client._get_tecverde_subclasses()
+        tecverde_subclasses = get_tecverde_subclasses()
         for classe, subclasses in tecverde_subclasses.items():
             print(f"  - {classe}: {subclasses}")
         
@@ -2,6 +2,7 @@ import os
 import sys
 from app import create_app, db
 from app.models import CategoriaLista
+from app.taxonomy import invalidate_taxonomy
 
 def import_production_categories():
     """
@@ -89,7 +90,8 @@ def import_production_categories():
                         db.session.add(new_category)
                         print(f"Added category: {category['tipo']} - {category['valor']}")
                 
-                # Commit the changes
+                # Commit the changes (bumping the taxonomy version so the app drops its cached snapshot)
+                invalidate_taxonomy()
                 db.session.commit()
                 print("Categories imported successfully!")
                 
@@ -1,12 +1,18 @@
 import os
 import json
+import time
+import random
 import logging
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
+from flask import current_app
 from app import create_app, db
 from app.models import Projeto, AISuggestion
-from app.ai_integration import OpenAIClient
+from app.ai_integration import OpenAIClient, TAXONOMY_MODE_FULL, TAXONOMY_MODE_HIERARCHICAL
+from app.batch_classification import BatchClassifier
 
 # Configure logging
 logging.basicConfig(
@@ -70,89 +76,176 @@ def format_project_for_classification(project):
         'tags': project.tags
     }
 
-def classify_projects(api_key, limit=100, filter_type=None, dry_run=False):
+class TokenBucket:
     """
-    Classify projects using the OpenAI API.
+    Thread-safe token bucket that refills continuously at `rate_per_minute`.
+    
+    acquire() blocks until enough capacity is available.
+    """
+    
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate_per_second = float(rate_per_minute) / 60.0
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate_per_second)
+        self.last_refill = now
+    
+    def acquire(self, amount=1):
+        # A single request larger than the bucket can never fit; cap it so it waits for a full bucket
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate_per_second
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Combined requests-per-minute and tokens-per-minute limiter shared by all workers.
+    
+    Passed to OpenAIClient, which calls acquire() before every API request.
+    """
+    
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+    
+    def acquire(self, tokens):
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+
+
+def classify_project_with_retry(client, project_data, max_retries=3, retry_backoff=2.0, suggest_options=None):
+    """
+    Classify a single project, retrying with exponential backoff on errors.
     
     Args:
-        api_key: OpenAI API key
-        limit: Maximum number of projects to classify
-        filter_type: Type of filter to apply ('unclassified', 'all', or None)
-        dry_run: If True, don't save results to database
+        client: OpenAIClient instance
+        project_data: Project dictionary from format_project_for_classification
+        max_retries: Number of retries after the first attempt
+        retry_backoff: Base delay in seconds (doubled on each retry, with jitter)
+        suggest_options: Extra keyword arguments for OpenAIClient.suggest_categories
         
     Returns:
-        Dictionary with statistics about the classification process
+        Suggestion dictionary from OpenAIClient.suggest_categories (may contain 'error')
     """
-    # Create OpenAI client
-    client = OpenAIClient(api_key)
+    suggestion = None
+    for attempt in range(max_retries + 1):
+        try:
+            suggestion = client.suggest_categories(project_data, **(suggest_options or {}))
+        except Exception as e:
+            suggestion = {"error": str(e)}
+        
+        if 'error' not in suggestion:
+            return suggestion
+        
+        if attempt < max_retries:
+            delay = retry_backoff * (2 ** attempt) + random.uniform(0, retry_backoff)
+            logger.warning(f"Attempt {attempt + 1} failed for project {project_data['id']}: {suggestion['error']}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
     
-    # Get projects to classify
-    projects = get_projects_to_classify(limit, filter_type)
+    return suggestion
+
+
+def select_projects_for_tecverde_batch(client, projects_data, filter_type=None, suggest_options=None):
+    """
+    Keep only the projects whose suggestion will actually be requested from the API.
     
-    if not projects:
-        logger.warning("No projects found to classify")
-        return {
-            "total": 0,
-            "success": 0,
-            "error": 0,
-            "skipped": 0
+    process_project skips projects that already have a suggestion (unless filter_type is
+    'all'), and suggest_categories serves unchanged projects from the suggestion cache
+    (unless force is set); batching Etapa 3 for those projects would be paid for and dropped.
+    
+    Args:
+        client: OpenAIClient instance
+        projects_data: Project dictionaries from format_project_for_classification
+        filter_type: Same filter passed to process_project
+        suggest_options: Same options passed to suggest_categories
+        
+    Returns:
+        List of project dictionaries to send to classify_tecverde_batch
+    """
+    options = dict(suggest_options or {})
+    force = options.pop('force', False)
+    
+    existing = set()
+    if filter_type != 'all':
+        project_ids = [project_data['id'] for project_data in projects_data]
+        existing = {
+            row.id_projeto
+            for row in db.session.query(AISuggestion.id_projeto).filter(AISuggestion.id_projeto.in_(project_ids))
         }
     
-    # Statistics
-    stats = {
-        "total": len(projects),
-        "success": 0,
-        "error": 0,
-        "skipped": 0,
-        "results": []
-    }
+    selected = []
+    for project_data in projects_data:
+        if project_data['id'] in existing:
+            continue
+        if not force and client.has_cached_suggestion(project_data, **options):
+            continue
+        selected.append(project_data)
+    return selected
+
+
+def process_project(app, client, project_data, filter_type=None, dry_run=False, max_retries=3, retry_backoff=2.0,
+                    suggest_options=None, tecverde_results=None):
+    """
+    Classify and save one project inside its own application context.
+    
+    Each call pushes a new app context, so Flask-SQLAlchemy gives the worker its own
+    scoped session; the session is removed when the context is torn down.
+    
+    tecverde_results holds green-technology fields already computed by the batched
+    Etapa 3 (project id -> tecverde_* fields); those projects skip their own Etapa 3 call.
     
-    # Process each project
-    for i, project in enumerate(projects):
+    Returns:
+        Tuple (status, result_entry) where status is 'success', 'error' or 'skipped'
+    """
+    project_id = project_data['id']
+    with app.app_context():
         try:
-            logger.info(f"Processing project {i+1}/{len(projects)}: ID={project.id}, Title='{project.titulo}'")
-            
-            # Format project for classification
-            project_data = format_project_for_classification(project)
-            
             # Check if project already has a suggestion
-            existing_suggestion = AISuggestion.query.filter_by(id_projeto=project.id).first()
+            existing_suggestion = AISuggestion.query.filter_by(id_projeto=project_id).first()
             if existing_suggestion and filter_type != 'all':
-                logger.info(f"Project {project.id} already has a suggestion, skipping")
-                stats["skipped"] += 1
-                continue
+                logger.info(f"Project {project_id} already has a suggestion, skipping")
+                return "skipped", None
             
             # Classify project
-            logger.info(f"Classifying project {project.id}")
-            suggestion = client.suggest_categories(project_data)
+            logger.info(f"Classifying project {project_id}")
+            options = dict(suggest_options or {})
+            if tecverde_results and project_id in tecverde_results:
+                options['tecverde_result'] = tecverde_results[project_id]
+            suggestion = classify_project_with_retry(client, project_data, max_retries, retry_backoff, options)
             
             # Check for errors
             if 'error' in suggestion:
-                logger.error(f"Error classifying project {project.id}: {suggestion['error']}")
-                stats["error"] += 1
-                stats["results"].append({
-                    "project_id": project.id,
+                logger.error(f"Error classifying project {project_id}: {suggestion['error']}")
+                return "error", {
+                    "project_id": project_id,
                     "status": "error",
                     "error": suggestion['error']
-                })
-                continue
+                }
             
             # Save suggestion to database if not dry run
             if not dry_run:
-                success = client._save_suggestion_to_db(project.id, suggestion)
+                success = client._save_suggestion_to_db(project_id, suggestion)
                 if success:
-                    logger.info(f"Successfully saved suggestion for project {project.id}")
+                    logger.info(f"Successfully saved suggestion for project {project_id}")
                 else:
-                    logger.error(f"Failed to save suggestion for project {project.id}")
-                    stats["error"] += 1
-                    continue
+                    logger.error(f"Failed to save suggestion for project {project_id}")
+                    return "error", None
             else:
-                logger.info(f"Dry run - not saving suggestion for project {project.id}")
+                logger.info(f"Dry run - not saving suggestion for project {project_id}")
             
-            # Update statistics
-            stats["success"] += 1
-            stats["results"].append({
-                "project_id": project.id,
+            return "success", {
+                "project_id": project_id,
                 "status": "success",
                 "suggestion": {
                     "microarea": suggestion.get('_aia_n1_macroarea', ''),
@@ -161,25 +254,181 @@ def classify_projects(api_key, limit=100, filter_type=None, dry_run=False):
                     "dominio_outro": suggestion.get('_aia_n3_dominio_outro', ''),
                     "tecverde_se_aplica": suggestion.get('tecverde_se_aplica', False)
                 }
-            })
-            
-            # Log progress
-            logger.info(f"Completed {i+1}/{len(projects)} projects")
-            
+            }
         except Exception as e:
-            logger.error(f"Unexpected error processing project {project.id}: {str(e)}")
-            stats["error"] += 1
-            stats["results"].append({
-                "project_id": project.id,
+            logger.error(f"Unexpected error processing project {project_id}: {str(e)}")
+            return "error", {
+                "project_id": project_id,
                 "status": "error",
                 "error": str(e)
-            })
+            }
+
+
+def classify_projects(api_key, limit=100, filter_type=None, dry_run=False, concurrency=1,
+                      requests_per_minute=500, tokens_per_minute=300000,
+                      max_retries=3, retry_backoff=2.0, taxonomy_mode=TAXONOMY_MODE_FULL, top_k=3,
+                      retrieval_top_n=None, retrieval_skip_threshold=None, force=False, tecverde_batch_size=None):
+    """
+    Classify projects using the OpenAI API with a bounded pool of worker threads.
+    
+    Must be called inside an application context.
+    
+    Args:
+        api_key: OpenAI API key
+        limit: Maximum number of projects to classify
+        filter_type: Type of filter to apply ('unclassified', 'all', or None)
+        dry_run: If True, don't save results to database
+        concurrency: Number of projects classified at the same time
+        requests_per_minute: OpenAI requests allowed per minute (shared by all workers)
+        tokens_per_minute: OpenAI tokens allowed per minute (estimated, shared by all workers)
+        max_retries: Retries per project after the first failed attempt
+        retry_backoff: Base delay in seconds for the exponential backoff
+        taxonomy_mode: 'full' (whole taxonomy in Etapa 1) or 'hierarchical' (pre-select top_k segments first)
+        top_k: Number of macroárea/segmento candidates kept in hierarchical mode
+        retrieval_top_n: Keep only the N taxonomy entries most similar to the project (local TF-IDF); None disables
+        retrieval_skip_threshold: Skip the Etapa 1 API call when local similarity is decisive above this score
+        force: Ignore the suggestion cache and always call the API
+        tecverde_batch_size: Classify green technologies for this many projects per request (catalog sent
+                             once per request) before the per-project chain; None keeps one Etapa 3 call per project
+        
+    Returns:
+        Dictionary with statistics about the classification process
+    """
+    # Create OpenAI client shared by all workers (the underlying HTTP client is thread-safe)
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    client = OpenAIClient(api_key, rate_limiter=rate_limiter)
+    app = current_app._get_current_object()
+    
+    # Get projects to classify
+    projects = get_projects_to_classify(limit, filter_type)
+    
+    if not projects:
+        logger.warning("No projects found to classify")
+        return {
+            "total": 0,
+            "success": 0,
+            "error": 0,
+            "skipped": 0
+        }
+    
+    # Format projects up front so workers only receive plain dictionaries, not ORM objects
+    # bound to the main thread's session
+    projects_data = [format_project_for_classification(project) for project in projects]
+    
+    # Statistics
+    stats = {
+        "total": len(projects_data),
+        "success": 0,
+        "error": 0,
+        "skipped": 0,
+        "results": []
+    }
+    
+    suggest_options = {
+        "taxonomy_mode": taxonomy_mode,
+        "top_k": top_k,
+        "retrieval_top_n": retrieval_top_n,
+        "retrieval_skip_threshold": retrieval_skip_threshold,
+        "force": force
+    }
+    # Batched Etapa 3: green technologies up front, several projects per request, only for the
+    # projects that will not be skipped or served from the suggestion cache
+    tecverde_results = None
+    if tecverde_batch_size:
+        batch_projects = select_projects_for_tecverde_batch(client, projects_data, filter_type, suggest_options)
+        logger.info(f"Classifying green technologies for {len(batch_projects)} of {len(projects_data)} projects "
+                    f"in batches of {tecverde_batch_size}")
+        if batch_projects:
+            tecverde_results = client.classify_tecverde_batch(batch_projects, tecverde_batch_size)
+    
+    logger.info(f"Classifying {len(projects_data)} projects with concurrency={concurrency}, taxonomy_mode={taxonomy_mode}")
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='classify') as executor:
+        futures = {
+            executor.submit(process_project, app, client, project_data, filter_type, dry_run,
+                            max_retries, retry_backoff, suggest_options, tecverde_results): project_data
+            for project_data in projects_data
+        }
+        
+        for completed, future in enumerate(as_completed(futures), start=1):
+            project_data = futures[future]
+            status, result_entry = future.result()
+            stats[status] += 1
+            if result_entry:
+                stats["results"].append(result_entry)
+            
+            # Log progress
+            logger.info(f"Completed {completed}/{len(projects_data)} projects (last: ID={project_data['id']}, {status})")
+    
+    # Keep results in project order regardless of completion order
+    stats["results"].sort(key=lambda entry: entry["project_id"])
+    
+    # Token usage, including prompt tokens served from the provider's prompt cache
+    stats["usage"] = client.get_usage_stats()
+    logger.info(f"Token usage: {stats['usage']}")
     
     # Log final statistics
     logger.info(f"Classification complete. Total: {stats['total']}, Success: {stats['success']}, Error: {stats['error']}, Skipped: {stats['skipped']}")
     
     return stats
 
+def classify_projects_bulk(api_key, limit=100, filter_type=None, dry_run=False,
+                           state_file='auto_classify_batch_state.json', poll_interval=60):
+    """
+    Classify projects through the OpenAI Batch API (results within 24h, at lower cost).
+    
+    Etapa 1 and Etapa 3 requests of all projects are submitted as one batch, Etapa 2 as a
+    second batch, and the suggestions are bulk-upserted at the end. If an unfinished state
+    file exists, the previous run is resumed instead of selecting new projects.
+    
+    Must be called inside an application context.
+    
+    Args:
+        api_key: OpenAI API key
+        limit: Maximum number of projects to classify
+        filter_type: Type of filter to apply ('unclassified', 'all', or None)
+        dry_run: If True, don't save results to database
+        state_file: JSON file used to resume after a crash
+        poll_interval: Seconds between batch status checks
+        
+    Returns:
+        Dictionary with statistics about the classification process
+    """
+    client = OpenAIClient(api_key)
+    projects_data = [format_project_for_classification(project) for project in get_projects_to_classify(limit, filter_type)]
+    
+    classifier = BatchClassifier(client, state_file, poll_interval=poll_interval)
+    results, errors = classifier.run(projects_data, save=not dry_run)
+    
+    stats = {
+        "total": len(classifier.state["projetos"]),
+        "success": len(results),
+        "error": len(errors),
+        "skipped": 0,
+        "results": []
+    }
+    for project_id, suggestion in results.items():
+        stats["results"].append({
+            "project_id": int(project_id),
+            "status": "success",
+            "suggestion": {
+                "microarea": suggestion.get('_aia_n1_macroarea', ''),
+                "segmento": suggestion.get('_aia_n2_segmento', ''),
+                "dominio": suggestion.get('_aia_n3_dominio_afeito', ''),
+                "dominio_outro": suggestion.get('_aia_n3_dominio_outro', ''),
+                "tecverde_se_aplica": suggestion.get('tecverde_se_aplica', False)
+            }
+        })
+    for project_id, error in errors.items():
+        stats["results"].append({"project_id": int(project_id), "status": "error", "error": error})
+    stats["results"].sort(key=lambda entry: entry["project_id"])
+    
+    stats["usage"] = client.get_usage_stats()
+    logger.info(f"Token usage: {stats['usage']}")
+    logger.info(f"Bulk classification complete. Total: {stats['total']}, Success: {stats['success']}, Error: {stats['error']}")
+    
+    return stats
+
 def save_results_to_file(stats, filename=None):
     """
     Save classification results to a JSON file.
@@ -213,6 +462,26 @@ def main():
                         help='Filter projects to classify (unclassified: only projects without suggestions, all: all projects)')
     parser.add_argument('--dry-run', action='store_true', help='Run without saving results to database')
     parser.add_argument('--output', type=str, help='Output file for results (default: auto_classify_results_TIMESTAMP.json)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Number of projects classified in parallel (default: 1)')
+    parser.add_argument('--rpm', type=int, default=500, help='Maximum OpenAI requests per minute across all workers (default: 500)')
+    parser.add_argument('--tpm', type=int, default=300000, help='Maximum OpenAI tokens per minute across all workers (default: 300000)')
+    parser.add_argument('--max-retries', type=int, default=3, help='Retries per project after a failed attempt (default: 3)')
+    parser.add_argument('--retry-backoff', type=float, default=2.0, help='Base delay in seconds for exponential backoff between retries (default: 2.0)')
+    parser.add_argument('--taxonomy-mode', choices=[TAXONOMY_MODE_FULL, TAXONOMY_MODE_HIERARCHICAL], default=TAXONOMY_MODE_FULL,
+                        help='full: send the whole taxonomy in Etapa 1; hierarchical: pre-select macroárea/segmento candidates first (default: full)')
+    parser.add_argument('--top-k', type=int, default=3, help='Candidates kept by the hierarchical pre-selection (default: 3)')
+    parser.add_argument('--retrieval-top-n', type=int, help='Send only the N taxonomy entries most similar to the project (local TF-IDF index) to Etapa 1')
+    parser.add_argument('--retrieval-skip-threshold', type=float,
+                        help='With --retrieval-top-n, resolve Etapa 1 locally (confidence ALTA) when the best similarity is at least this value and clearly ahead of the runner-up')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Submit the requests through the OpenAI Batch API instead of calling the API per project (results within 24h)')
+    parser.add_argument('--state-file', type=str, default='auto_classify_batch_state.json',
+                        help='With --bulk, file used to resume an interrupted run (default: auto_classify_batch_state.json)')
+    parser.add_argument('--poll-interval', type=int, default=60, help='With --bulk, seconds between batch status checks (default: 60)')
+    parser.add_argument('--force', action='store_true',
+                        help='Ignore cached suggestions and call the API even when the project and taxonomy are unchanged')
+    parser.add_argument('--tecverde-batch-size', type=int,
+                        help='Classify green technologies for N projects per request (e.g. 5-20, max 20) instead of one request per project')
     args = parser.parse_args()
     
     # Load environment variables
@@ -228,8 +497,28 @@ def main():
     
     with app.app_context():
         # Run classification
-        logger.info(f"Starting classification with limit={args.limit}, filter={args.filter}, dry_run={args.dry_run}")
-        stats = classify_projects(api_key, args.limit, args.filter, args.dry_run)
+        logger.info(f"Starting classification with limit={args.limit}, filter={args.filter}, dry_run={args.dry_run}, concurrency={args.concurrency}")
+        if args.bulk:
+            stats = classify_projects_bulk(
+                api_key, args.limit, args.filter, args.dry_run,
+                state_file=args.state_file,
+                poll_interval=args.poll_interval
+            )
+        else:
+            stats = classify_projects(
+                api_key, args.limit, args.filter, args.dry_run,
+                concurrency=args.concurrency,
+                requests_per_minute=args.rpm,
+                tokens_per_minute=args.tpm,
+                max_retries=args.max_retries,
+                retry_backoff=args.retry_backoff,
+                taxonomy_mode=args.taxonomy_mode,
+                top_k=args.top_k,
+                retrieval_top_n=args.retrieval_top_n,
+                retrieval_skip_threshold=args.retrieval_skip_threshold,
+                force=args.force,
+                tecverde_batch_size=args.tecverde_batch_size
+            )
         
         # Save results to file
         save_results_to_file(stats, args.output)
@@ -240,6 +529,9 @@ def main():
         print(f"Successfully classified: {stats['success']}")
         print(f"Errors: {stats['error']}")
         print(f"Skipped (already classified): {stats['skipped']}")
+        if 'usage' in stats:
+            usage = stats['usage']
+            print(f"Prompt cache hit rate: {usage['cache_hit_rate']:.1%} ({usage['cached_tokens']}/{usage['prompt_tokens']} prompt tokens)")
 
 if __name__ == "__main__":
     main()
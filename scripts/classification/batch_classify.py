@@ -9,7 +9,9 @@ import argparse
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
+from app import create_app
 from app.ai_integration import OpenAIClient
+from app.batch_classification import BatchClassifier
 
 # Configure logging
 logging.basicConfig(
@@ -170,8 +172,93 @@ def classify_projects(api_key, projects, limit=100):
                 "error": str(e)
             })
     
+    # Token usage, including prompt tokens served from the provider's prompt cache
+    results["usage"] = client.get_usage_stats()
+    
     # Log final statistics
     logger.info(f"Classification complete. Total: {results['total']}, Success: {results['success']}, Error: {results['error']}")
+    logger.info(f"Token usage: {results['usage']}")
+    
+    return results
+
+def classify_projects_bulk(api_key, projects, limit=100, state_file='batch_classify_state.json', poll_interval=60, save=False):
+    """
+    Classify projects through the OpenAI Batch API (results within 24h, at lower cost).
+    
+    Etapa 1 and Etapa 3 requests are submitted as one batch and Etapa 2 as a second batch.
+    Results only go to the output file unless save is True. With save, only projects that
+    carry an explicit database 'id' are classified and their suggestions are bulk-upserted
+    into AISuggestion; projects without an 'id' are skipped, since numbering them would
+    overwrite the suggestions of unrelated projects.
+    An unfinished state file is resumed instead of starting a new run.
+    
+    Must be called inside an application context (taxonomy and suggestions live in the database).
+    
+    Args:
+        api_key: OpenAI API key
+        projects: List of project dictionaries
+        limit: Maximum number of projects to classify
+        state_file: JSON file used to resume after a crash
+        poll_interval: Seconds between batch status checks
+        save: If True, save the suggestions of projects with an explicit 'id' to the database
+        
+    Returns:
+        Dictionary with classification results
+    """
+    client = OpenAIClient(api_key)
+    
+    projects_to_process = []
+    for i, project in enumerate(projects[:limit]):
+        project = dict(project)
+        if 'id' not in project:
+            if save:
+                logger.warning(f"Project {i+1} ('{project.get('titulo', 'Unknown')}') has no id and cannot be saved; skipping it")
+                continue
+            # Results only go to the output file; number them like classify_projects does
+            project['id'] = i + 1
+        projects_to_process.append(project)
+    
+    classifier = BatchClassifier(client, state_file, poll_interval=poll_interval)
+    suggestions, errors = classifier.run(projects_to_process, save=save)
+    
+    results = {
+        "total": len(classifier.state["projetos"]),
+        "success": len(suggestions),
+        "error": len(errors),
+        "classifications": []
+    }
+    for project_id, project in classifier.state["projetos"].items():
+        if project_id in errors:
+            results["classifications"].append({
+                "project_id": project['id'],
+                "title": project.get('titulo', 'Unknown'),
+                "status": "error",
+                "error": errors[project_id]
+            })
+        elif project_id in suggestions:
+            suggestion = suggestions[project_id]
+            results["classifications"].append({
+                "project_id": project['id'],
+                "title": project.get('titulo', 'Unknown'),
+                "status": "success",
+                "classification": {
+                    "microarea": suggestion.get('_aia_n1_macroarea', ''),
+                    "segmento": suggestion.get('_aia_n2_segmento', ''),
+                    "dominio": suggestion.get('_aia_n3_dominio_afeito', ''),
+                    "dominio_outro": suggestion.get('_aia_n3_dominio_outro', ''),
+                    "confianca": suggestion.get('confianca', ''),
+                    "justificativa": suggestion.get('justificativa', ''),
+                    "tecverde_se_aplica": suggestion.get('tecverde_se_aplica', False),
+                    "tecverde_classe": suggestion.get('tecverde_classe', ''),
+                    "tecverde_subclasse": suggestion.get('tecverde_subclasse', ''),
+                    "tecverde_confianca": suggestion.get('tecverde_confianca', ''),
+                    "tecverde_justificativa": suggestion.get('tecverde_justificativa', '')
+                }
+            })
+    
+    results["usage"] = client.get_usage_stats()
+    logger.info(f"Bulk classification complete. Total: {results['total']}, Success: {results['success']}, Error: {results['error']}")
+    logger.info(f"Token usage: {results['usage']}")
     
     return results
 
@@ -182,6 +269,13 @@ def main():
     parser.add_argument('input_file', help='JSON file containing projects to classify')
     parser.add_argument('--limit', type=int, default=100, help='Maximum number of projects to classify (default: 100)')
     parser.add_argument('--output', type=str, help='Output file for results (default: batch_results_TIMESTAMP.json)')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Submit the requests through the OpenAI Batch API (results within 24h)')
+    parser.add_argument('--save', action='store_true',
+                        help='With --bulk, bulk-upsert the suggestions of projects that have a database id (default: output file only)')
+    parser.add_argument('--state-file', type=str, default='batch_classify_state.json',
+                        help='With --bulk, file used to resume an interrupted run (default: batch_classify_state.json)')
+    parser.add_argument('--poll-interval', type=int, default=60, help='With --bulk, seconds between batch status checks (default: 60)')
     args = parser.parse_args()
     
     # Load environment variables
@@ -200,8 +294,13 @@ def main():
         return
     
     # Run classification
-    logger.info(f"Starting batch classification with limit={args.limit}")
-    results = classify_projects(api_key, projects, args.limit)
+    logger.info(f"Starting batch classification with limit={args.limit}, bulk={args.bulk}, save={args.save}")
+    if args.bulk:
+        app = create_app()
+        with app.app_context():
+            results = classify_projects_bulk(api_key, projects, args.limit, args.state_file, args.poll_interval, args.save)
+    else:
+        results = classify_projects(api_key, projects, args.limit)
     
     # Save results to file
     output_file = save_results_to_file(results, args.output)
@@ -211,6 +310,7 @@ def main():
     print(f"Total projects processed: {results['total']}")
     print(f"Successfully classified: {results['success']}")
     print(f"Errors: {results['error']}")
+    print(f"Prompt cache hit rate: {results['usage']['cache_hit_rate']:.1%} ({results['usage']['cached_tokens']}/{results['usage']['prompt_tokens']} prompt tokens)")
     if output_file:
         print(f"Results saved to: {output_file}")
 
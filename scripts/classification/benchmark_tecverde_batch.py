@@ -0,0 +1,181 @@
+"""
+Benchmark of the batched Etapa 3 (green technologies) against the single-project path.
+
+Projects whose green-technology fields were saved by a reviewer are used as ground truth.
+Each mode classifies the same projects with a fresh client, and the script reports accuracy,
+agreement with the single-project results, request count, token usage, estimated cost and
+elapsed time. Nothing is written to the database.
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app import create_app
+from app.models import Projeto
+from app.ai_integration import OpenAIClient, PROJECT_PROMPT_FIELDS
+
+# Configure logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens for gpt-4o (input, cached input, output); override with the command line flags
+DEFAULT_PRICES = (2.50, 1.25, 10.00)
+
+
+def get_reviewed_projects(limit):
+    """
+    Get projects whose green-technology classification was saved by a reviewer.
+
+    Returns:
+        List of (project dictionary, expected tecverde fields)
+    """
+    projects = Projeto.query.filter(
+        Projeto.tecverde_se_aplica.isnot(None)
+    ).order_by(Projeto.id).limit(limit).all()
+
+    return [
+        (
+            dict({'id': project.id}, **{field: getattr(project, field) for field in PROJECT_PROMPT_FIELDS}),
+            {
+                'tecverde_se_aplica': bool(project.tecverde_se_aplica),
+                'tecverde_classe': project.tecverde_classe or '',
+                'tecverde_subclasse': project.tecverde_subclasse or ''
+            }
+        )
+        for project in projects
+    ]
+
+
+def run_single(api_key, projects, concurrency):
+    """Classify each project with its own Etapa 3 request."""
+    client = OpenAIClient(api_key)
+    tecverde_classes = client._get_tecverde_classes()
+    tecverde_subclasses = client._get_tecverde_subclasses()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        results = list(executor.map(
+            lambda project: client._classify_tecverde(project, tecverde_classes, tecverde_subclasses), projects
+        ))
+    elapsed = time.perf_counter() - start
+
+    return {project['id']: result for project, result in zip(projects, results)}, client.get_usage_stats(), elapsed
+
+
+def run_batched(api_key, projects, batch_size):
+    """Classify the projects with classify_tecverde_batch."""
+    client = OpenAIClient(api_key)
+    start = time.perf_counter()
+    results = client.classify_tecverde_batch(projects, batch_size)
+    elapsed = time.perf_counter() - start
+    return results, client.get_usage_stats(), elapsed
+
+
+def _matches(field, value, expected_value):
+    if field == 'tecverde_se_aplica':
+        return bool(value) == bool(expected_value)
+    return (value or '') == (expected_value or '')
+
+
+def score(results, expected, reference=None):
+    """
+    Compare classifications with the reviewer's answers (and optionally with another mode).
+
+    Returns:
+        Dictionary with accuracy for se_aplica (all projects), classe and subclasse (projects
+        the reviewer marked as green technology), plus the rate of identical answers to the
+        reference mode
+    """
+    def accuracy(project_ids, field, answers):
+        if not project_ids:
+            return 0.0
+        hits = sum(_matches(field, results.get(pid, {}).get(field), answers.get(pid, {}).get(field)) for pid in project_ids)
+        return hits / len(project_ids)
+
+    all_ids = list(expected)
+    applies = [pid for pid in all_ids if expected[pid]['tecverde_se_aplica']]
+    metrics = {
+        'se_aplica_accuracy': accuracy(all_ids, 'tecverde_se_aplica', expected),
+        'classe_accuracy': accuracy(applies, 'tecverde_classe', expected),
+        'subclasse_accuracy': accuracy(applies, 'tecverde_subclasse', expected)
+    }
+    if reference is not None:
+        fields = ('tecverde_se_aplica', 'tecverde_classe', 'tecverde_subclasse')
+        identical = sum(
+            all(_matches(field, results.get(pid, {}).get(field), reference.get(pid, {}).get(field)) for field in fields)
+            for pid in all_ids
+        )
+        metrics['agreement_with_single'] = identical / len(all_ids) if all_ids else 0.0
+    return metrics
+
+
+def estimate_cost(usage, prices):
+    """Estimated cost in USD from the usage counters of an OpenAIClient."""
+    input_price, cached_price, output_price = prices
+    uncached = usage['prompt_tokens'] - usage['cached_tokens']
+    return (uncached * input_price + usage['cached_tokens'] * cached_price + usage['completion_tokens'] * output_price) / 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare batched and single-project Etapa 3 (green technologies)')
+    parser.add_argument('--limit', type=int, default=40, help='Number of reviewed projects to classify (default: 40)')
+    parser.add_argument('--batch-sizes', type=str, default='5,10,20', help='Comma-separated batch sizes to test (default: 5,10,20)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Parallel requests in the single-project path (default: 4)')
+    parser.add_argument('--input-price', type=float, default=DEFAULT_PRICES[0], help='USD per 1M uncached input tokens')
+    parser.add_argument('--cached-price', type=float, default=DEFAULT_PRICES[1], help='USD per 1M cached input tokens')
+    parser.add_argument('--output-price', type=float, default=DEFAULT_PRICES[2], help='USD per 1M output tokens')
+    parser.add_argument('--output', type=str, help='Write the report to this JSON file')
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        logger.error("OpenAI API key not found. Set the OPENAI_API_KEY environment variable.")
+        return
+
+    prices = (args.input_price, args.cached_price, args.output_price)
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',') if size.strip()]
+
+    app = create_app()
+    with app.app_context():
+        reviewed = get_reviewed_projects(args.limit)
+        if not reviewed:
+            print("No projects with reviewed green-technology fields found")
+            return
+
+        projects = [project for project, _ in reviewed]
+        expected = {project['id']: fields for project, fields in reviewed}
+
+        report = []
+        single_results, usage, elapsed = run_single(api_key, projects, args.concurrency)
+        report.append(dict(mode='single', usage=usage, elapsed_seconds=round(elapsed, 2),
+                           cost_usd=round(estimate_cost(usage, prices), 4), **score(single_results, expected)))
+
+        for batch_size in batch_sizes:
+            results, usage, elapsed = run_batched(api_key, projects, batch_size)
+            report.append(dict(mode=f'batch_{batch_size}', usage=usage, elapsed_seconds=round(elapsed, 2),
+                               cost_usd=round(estimate_cost(usage, prices), 4),
+                               **score(results, expected, single_results)))
+
+    print(f"\nEtapa 3 benchmark on {len(projects)} reviewed projects")
+    print(f"{'mode':<10} {'requests':>8} {'prompt':>9} {'cached':>8} {'output':>8} {'cost $':>8} {'time s':>7} "
+          f"{'aplica':>7} {'classe':>7} {'subcl.':>7} {'=single':>8}")
+    for row in report:
+        usage = row['usage']
+        agreement = f"{row['agreement_with_single']:.1%}" if 'agreement_with_single' in row else '-'
+        print(f"{row['mode']:<10} {usage['requests']:>8} {usage['prompt_tokens']:>9} {usage['cached_tokens']:>8} "
+              f"{usage['completion_tokens']:>8} {row['cost_usd']:>8.4f} {row['elapsed_seconds']:>7.1f} "
+              f"{row['se_aplica_accuracy']:>7.1%} {row['classe_accuracy']:>7.1%} {row['subclasse_accuracy']:>7.1%} {agreement:>8}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nReport saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark of /dashboard/api/charts-data: one GROUPING SETS scan against six GROUP BY queries.
+
+The script creates a scratch schema (gepes_bench by default) with copies of gepes.projetos and
+gepes.versoes_dados, fills it with generated projects and points the application engine at it
+through schema_translate_map. The endpoint is then requested with the statistics snapshot
+cleared before every call, once with the previous per-chart queries and once with the single
+aggregate query, and the results of both are compared. The gepes schema is never written to;
+the scratch schema is dropped at the end unless --keep is given.
+"""
+
+import json
+import time
+import logging
+import argparse
+import statistics
+from unittest import mock
+from dotenv import load_dotenv
+from sqlalchemy import desc, func, text
+from app import create_app, db
+from app import statistics_snapshot
+from app.models import Projeto
+
+# Configure logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ENDPOINT = '/dashboard/api/charts-data'
+
+
+def load_charts_data_per_chart():
+    """Previous implementation: one GROUP BY query over gepes.projetos per chart."""
+    macroareas_data = db.session.query(
+        Projeto._aia_n1_macroarea,
+        func.count(Projeto.id).label('count')
+    ).filter(Projeto._aia_n1_macroarea != None, Projeto._aia_n1_macroarea != '').group_by(Projeto._aia_n1_macroarea).all()
+
+    segmentos_data = db.session.query(
+        Projeto._aia_n2_segmento,
+        func.count(Projeto.id).label('count')
+    ).filter(Projeto._aia_n2_segmento != None, Projeto._aia_n2_segmento != '').group_by(Projeto._aia_n2_segmento).order_by(desc('count')).limit(10).all()
+
+    tecverde_data = db.session.query(
+        Projeto.tecverde_se_aplica,
+        func.count(Projeto.id).label('count')
+    ).filter(Projeto.tecverde_se_aplica.in_([True, False])).group_by(Projeto.tecverde_se_aplica).all()
+
+    tecverde_classes_data = db.session.query(
+        Projeto.tecverde_classe,
+        func.count(Projeto.id).label('count')
+    ).filter(
+        Projeto.tecverde_se_aplica == True,
+        Projeto.tecverde_classe != None,
+        Projeto.tecverde_classe != ''
+    ).group_by(Projeto.tecverde_classe).order_by(desc('count')).limit(10).all()
+
+    timeline_data = db.session.query(
+        func.date_trunc('month', func.to_timestamp(Projeto.data_contrato / 1000)).label('month'),
+        func.count(Projeto.id).label('count')
+    ).filter(Projeto.data_contrato != None).group_by('month').order_by('month').all()
+
+    status_data = db.session.query(
+        Projeto.status,
+        func.count(Projeto.id).label('count')
+    ).filter(Projeto.status != None, Projeto.status != '').group_by(Projeto.status).all()
+
+    def labels_values(rows):
+        return {'labels': [r[0] for r in rows], 'values': [r[1] for r in rows]}
+
+    return {
+        'macroareas': labels_values(macroareas_data),
+        'segmentos': labels_values(segmentos_data),
+        'tecverde': labels_values([("Sim" if t[0] else "Não", t[1]) for t in tecverde_data]),
+        'tecverde_classes': labels_values(tecverde_classes_data),
+        'timeline': labels_values([(t[0].strftime('%b %Y') if t[0] else 'Desconhecido', t[1]) for t in timeline_data]),
+        'status': labels_values(status_data)
+    }
+
+
+def create_bench_schema(schema, rows):
+    """Create the scratch schema and fill it with `rows` generated projects."""
+    with db.engine.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS {schema} CASCADE'))
+        connection.execute(text(f'CREATE SCHEMA {schema}'))
+        connection.execute(text(f'CREATE TABLE {schema}.projetos (LIKE gepes.projetos INCLUDING CONSTRAINTS)'))
+        connection.execute(text(f'CREATE TABLE {schema}.versoes_dados (LIKE gepes.versoes_dados INCLUDING ALL)'))
+        connection.execute(text(f"""
+            INSERT INTO {schema}.projetos (
+                id, codigo_projeto, titulo, _aia_n1_macroarea, _aia_n2_segmento,
+                tecverde_se_aplica, tecverde_classe, data_contrato, status, data_criacao
+            )
+            SELECT
+                g,
+                'BENCH-' || g,
+                'Projeto de benchmark ' || g,
+                CASE WHEN g % 10 = 0 THEN NULL ELSE 'Macroárea ' || (g % 8) END,
+                CASE WHEN g % 7 = 0 THEN '' ELSE 'Segmento ' || (g % 45) END,
+                CASE g % 3 WHEN 0 THEN true WHEN 1 THEN false END,
+                CASE WHEN g % 3 = 0 THEN 'Classe ' || (g % 17) END,
+                (EXTRACT(EPOCH FROM TIMESTAMP '2015-01-01') + (g % 3650) * 86400)::bigint * 1000,
+                (ARRAY['Em execução', 'Concluído', 'Cancelado', 'Suspenso'])[1 + g % 4],
+                now()
+            FROM generate_series(1, :rows) AS g
+        """), {'rows': rows})
+        connection.execute(text(f'ANALYZE {schema}.projetos'))
+
+
+def time_endpoint(client, loader, repeat):
+    """
+    Request the endpoint `repeat` times with the snapshot cleared before each call.
+
+    Returns:
+        (list of latencies in milliseconds, JSON of the last response)
+    """
+    latencies = []
+    payload = None
+    with mock.patch.object(statistics_snapshot, '_load_charts_data', loader):
+        for _ in range(repeat):
+            statistics_snapshot.statistics_cache.clear()
+            start = time.perf_counter()
+            response = client.get(ENDPOINT)
+            latencies.append((time.perf_counter() - start) * 1000)
+            payload = response.get_json()
+    return latencies, payload
+
+
+def same_charts(before, after):
+    """
+    Compare two charts-data payloads.
+
+    Top-10 charts may break ties between equal counts differently, so they are compared by
+    their counts; the other charts are compared as sets of (label, value) pairs.
+    """
+    for name in before:
+        if name in ('segmentos', 'tecverde_classes'):
+            if before[name]['values'] != after[name]['values']:
+                return False
+        elif name == 'timeline':
+            if before[name] != after[name]:
+                return False
+        elif set(zip(before[name]['labels'], before[name]['values'])) != set(zip(after[name]['labels'], after[name]['values'])):
+            return False
+    return True
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        'median_ms': round(statistics.median(ordered), 1),
+        'p95_ms': round(ordered[max(0, int(len(ordered) * 0.95) - 1)], 1),
+        'min_ms': round(ordered[0], 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-chart and single-pass queries behind /dashboard/api/charts-data')
+    parser.add_argument('--rows', type=int, default=100000, help='Number of generated projects (default: 100000)')
+    parser.add_argument('--repeat', type=int, default=20, help='Requests per implementation (default: 20)')
+    parser.add_argument('--schema', type=str, default='gepes_bench', help='Scratch schema to create (default: gepes_bench)')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch schema after the run')
+    parser.add_argument('--output', type=str, help='Write the report to this JSON file')
+    args = parser.parse_args()
+
+    load_dotenv()
+    app = create_app()
+    app.config['LOGIN_DISABLED'] = True
+
+    with app.app_context():
+        print(f"Generating {args.rows} projects in {args.schema}.projetos...")
+        create_bench_schema(args.schema, args.rows)
+        original_options = dict(db.engine.get_execution_options())
+        db.engine.update_execution_options(schema_translate_map={'gepes': args.schema})
+
+    try:
+        client = app.test_client()
+        # Warm-up: connection pool and query plans
+        time_endpoint(client, statistics_snapshot._load_charts_data, 2)
+        time_endpoint(client, load_charts_data_per_chart, 2)
+
+        before, before_payload = time_endpoint(client, load_charts_data_per_chart, args.repeat)
+        after, after_payload = time_endpoint(client, statistics_snapshot._load_charts_data, args.repeat)
+
+        cached = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            client.get(ENDPOINT)
+            cached.append((time.perf_counter() - start) * 1000)
+    finally:
+        with app.app_context():
+            db.engine.update_execution_options(schema_translate_map=original_options.get('schema_translate_map'))
+            if not args.keep:
+                with db.engine.begin() as connection:
+                    connection.execute(text(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE'))
+
+    report = {
+        'rows': args.rows,
+        'repeat': args.repeat,
+        'per_chart_queries': summarize(before),
+        'grouping_sets': summarize(after),
+        'snapshot_hit': summarize(cached),
+        'same_result': same_charts(before_payload, after_payload)
+    }
+
+    print(f"\n{ENDPOINT} on {args.rows} projects ({args.repeat} requests each, snapshot cleared)")
+    print(f"{'mode':<18} {'median ms':>10} {'p95 ms':>8} {'min ms':>8}")
+    for mode in ('per_chart_queries', 'grouping_sets', 'snapshot_hit'):
+        row = report[mode]
+        print(f"{mode:<18} {row['median_ms']:>10.1f} {row['p95_ms']:>8.1f} {row['min_ms']:>8.1f}")
+    print(f"Same result: {report['same_result']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nReport saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark of project search: ILIKE predicates against the Portuguese tsvector column.
+
+The script creates a scratch schema (gepes_bench by default) with a copy of gepes.projetos,
+fills it with generated projects, adds the generated `busca` column and the GIN indexes of the
+add_busca_to_projetos migration, and points the application engine at it through
+schema_translate_map. For each search term it times the /projects search (first page plus
+total) and the chatbot's ranked search, with the previous ILIKE queries and with the full-text
+ones. The gepes schema is never written to; the scratch schema is dropped at the end unless
+--keep is given.
+"""
+
+import json
+import time
+import logging
+import argparse
+import statistics
+from unittest import mock
+from dotenv import load_dotenv
+from sqlalchemy import text
+from app import create_app, db
+from app import project_search
+from app.models import Projeto
+from app.pagination import keyset_page
+
+# Configure logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_TERMS = 'energia solar,hidrogênio verde,biomassa,inteligência artificial,BENCH-0421,bater'
+
+# Vocabulary used to generate titles and descriptions
+TOPICS = [
+    'energia solar', 'energia eólica', 'hidrogênio verde', 'biomassa', 'baterias de lítio',
+    'inteligência artificial', 'visão computacional', 'manufatura aditiva', 'biofármacos',
+    'agricultura de precisão', 'tratamento de efluentes', 'reciclagem de plásticos',
+    'semicondutores', 'internet das coisas', 'materiais compósitos', 'sensores ópticos'
+]
+ACTIONS = ['Desenvolvimento de', 'Otimização de', 'Plataforma de', 'Sistema de', 'Processo de', 'Novo método de']
+CONTEXTS = ['para a indústria', 'em pequena escala', 'com baixo custo', 'para o agronegócio', 'em ambiente hospitalar']
+
+
+def create_bench_schema(schema, rows):
+    """Create the scratch schema, fill it with `rows` generated projects and build the search indexes."""
+    with db.engine.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS {schema} CASCADE'))
+        connection.execute(text(f'CREATE SCHEMA {schema}'))
+        connection.execute(text(f'CREATE TABLE {schema}.projetos (LIKE gepes.projetos INCLUDING CONSTRAINTS)'))
+        connection.execute(text(f'ALTER TABLE {schema}.projetos DROP COLUMN IF EXISTS busca'))
+        connection.execute(text(f"""
+            INSERT INTO {schema}.projetos (
+                id, codigo_projeto, titulo, unidade_embrapii, _aia_n1_macroarea, _aia_n2_segmento,
+                objetivo, descricao_publica, data_criacao
+            )
+            SELECT
+                g,
+                'BENCH-' || lpad(g::text, 6, '0'),
+                (:actions)[1 + g % cardinality(:actions)] || ' ' || (:topics)[1 + g % cardinality(:topics)]
+                    || ' ' || (:contexts)[1 + (g / 7) % cardinality(:contexts)],
+                'Unidade ' || (g % 80),
+                'Macroárea ' || (g % 8),
+                'Segmento ' || (g % 45),
+                'Objetivo: aplicar ' || (:topics)[1 + (g / 3) % cardinality(:topics)]
+                    || ' ' || (:contexts)[1 + g % cardinality(:contexts)] || ', com validação em campo.',
+                'O projeto investiga ' || (:topics)[1 + (g / 5) % cardinality(:topics)]
+                    || ' e ' || (:topics)[1 + (g / 11) % cardinality(:topics)]
+                    || ' junto a empresas parceiras, gerando protótipos e relatórios técnicos.',
+                now()
+            FROM generate_series(1, :rows) AS g
+        """), {'rows': rows, 'actions': ACTIONS, 'topics': TOPICS, 'contexts': CONTEXTS})
+
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        connection.execute(text(
+            f"ALTER TABLE {schema}.projetos ADD COLUMN busca tsvector "
+            f"GENERATED ALWAYS AS ({project_search.SEARCH_VECTOR_SQL}) STORED"
+        ))
+        connection.execute(text(f'CREATE INDEX ON {schema}.projetos USING gin (busca)'))
+        connection.execute(text(f'CREATE INDEX ON {schema}.projetos USING gin (codigo_projeto gin_trgm_ops)'))
+        connection.execute(text(f'ANALYZE {schema}.projetos'))
+
+
+def listing_search(term):
+    """Same work as the first /projects page with a search: 20 rows plus the filtered total."""
+    query = Projeto.query.filter(project_search.project_search_filter(term))
+    items, _ = keyset_page(query, Projeto.id, per_page=20)
+    total = query.order_by(None).count()
+    return [item.id for item in items], total
+
+
+def chatbot_search(term):
+    """Ranked search used by RAGAssistant.search_project."""
+    return [project['id'] for project in project_search.search_projects(term, limit=5)], None
+
+
+def time_search(function, term, full_text, repeat):
+    """
+    Run `function(term)` `repeat` times with the full-text path enabled or disabled.
+
+    Returns:
+        (list of latencies in milliseconds, result of the last call)
+    """
+    latencies = []
+    result = None
+    with mock.patch.object(project_search, 'full_text_available', return_value=full_text):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function(term)
+            latencies.append((time.perf_counter() - start) * 1000)
+            db.session.rollback()
+    return latencies, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare ILIKE and full-text project search')
+    parser.add_argument('--rows', type=int, default=100000, help='Number of generated projects (default: 100000)')
+    parser.add_argument('--repeat', type=int, default=10, help='Runs per term and mode (default: 10)')
+    parser.add_argument('--terms', type=str, default=DEFAULT_TERMS, help='Comma-separated search terms')
+    parser.add_argument('--schema', type=str, default='gepes_bench', help='Scratch schema to create (default: gepes_bench)')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch schema after the run')
+    parser.add_argument('--output', type=str, help='Write the report to this JSON file')
+    args = parser.parse_args()
+
+    load_dotenv()
+    terms = [term.strip() for term in args.terms.split(',') if term.strip()]
+    app = create_app()
+
+    report = []
+    with app.app_context():
+        print(f"Generating {args.rows} projects in {args.schema}.projetos...")
+        create_bench_schema(args.schema, args.rows)
+        original_options = dict(db.engine.get_execution_options())
+        db.engine.update_execution_options(schema_translate_map={'gepes': args.schema})
+
+        try:
+            for term in terms:
+                for call_site, function in (('projects', listing_search), ('chatbot', chatbot_search)):
+                    row = {'term': term, 'call_site': call_site}
+                    for mode, full_text in (('ilike', False), ('fts', True)):
+                        # Warm-up run, not timed
+                        time_search(function, term, full_text, 1)
+                        latencies, (ids, total) = time_search(function, term, full_text, args.repeat)
+                        row[mode] = {
+                            'median_ms': round(statistics.median(latencies), 1),
+                            'min_ms': round(min(latencies), 1),
+                            'results': total if total is not None else len(ids)
+                        }
+                    report.append(row)
+        finally:
+            db.session.remove()
+            db.engine.update_execution_options(schema_translate_map=original_options.get('schema_translate_map'))
+            if not args.keep:
+                with db.engine.begin() as connection:
+                    connection.execute(text(f'DROP SCHEMA IF EXISTS {args.schema} CASCADE'))
+
+    print(f"\nProject search on {args.rows} projects ({args.repeat} runs per term and mode)")
+    print(f"{'term':<26} {'call site':<10} {'ilike ms':>9} {'fts ms':>8} {'speedup':>8} {'ilike n':>8} {'fts n':>7}")
+    for row in report:
+        ilike, fts = row['ilike'], row['fts']
+        speedup = ilike['median_ms'] / fts['median_ms'] if fts['median_ms'] else float('inf')
+        print(f"{row['term'][:26]:<26} {row['call_site']:<10} {ilike['median_ms']:>9.1f} {fts['median_ms']:>8.1f} "
+              f"{speedup:>7.1f}x {ilike['results']:>8} {fts['results']:>7}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nReport saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
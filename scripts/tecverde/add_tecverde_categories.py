@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 from app import create_app, db
 from app.helpers import add_tecverde_categories
+from app.taxonomy import invalidate_taxonomy
 import logging
 
 # Configurar logging
@@ -21,6 +22,8 @@ def main():
             db.session.query(db.models.CategoriaLista).filter_by(tipo='tecverde_classe').delete()
             # Remover subclasses existentes
             db.session.query(db.models.CategoriaLista).filter_by(tipo='tecverde_subclasse').delete()
+            # Incrementar a versão da taxonomia para que a aplicação descarte o snapshot em cache
+            invalidate_taxonomy()
             db.session.commit()
             logger.info("Categorias existentes removidas com sucesso.")
         except Exception as e:
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 from app import create_app, db
+from app.taxonomy import invalidate_taxonomy
 import logging
 import json
 
@@ -69,6 +70,10 @@ def add_tecverde_categories_sql():
         cursor.close()
         connection.close()
         
+        # Incrementar a versão da taxonomia para que a aplicação descarte o snapshot em cache
+        invalidate_taxonomy()
+        db.session.commit()
+        
         logger.info("Categorias de tecnologias verdes adicionadas com sucesso!")
         return True
     except Exception as e:
@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+
+from app.ai_integration import OpenAIClient
+from app.batch_classification import BatchClassifier, BatchClassificationError
+
+AIA_DATA = [
+    {"Macroárea": "Energia", "Segmento": "Renovável", "Domínios Afeitos": "Solar; Eólica"},
+    {"Macroárea": "Energia", "Segmento": "Armazenamento", "Domínios Afeitos": "Baterias; Hidrogênio"},
+]
+TECVERDE_CLASSES = {"Energias alternativas": "Fontes de energia alternativas"}
+TECVERDE_SUBCLASSES = {"Energias alternativas": "Solar; Eólica"}
+
+ANSWERS = {
+    "etapa1": {"_aia_n1_macroarea": "Energia", "_aia_n2_segmento": "Renovável", "_aia_n3_dominio_afeito": "Solar",
+               "confianca": "ALTA", "justificativa": "Painéis solares"},
+    "etapa2": {"_aia_n3_dominio_outro": "Baterias"},
+    "etapa3": {"tecverde_se_aplica": "Sim", "tecverde_classe": "Energias alternativas", "tecverde_subclasse": "Solar",
+               "confianca": "ALTA", "justificativa": "Energia solar"},
+}
+
+
+class FakeBatchAPI:
+    """Substituto local dos endpoints de arquivos e lotes da Batch API."""
+
+    def __init__(self, fail_retrieve_once=False):
+        self.files = types.SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = types.SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+        self.stored_files = {}
+        self.created_batches = []
+        self.fail_retrieve_once = fail_retrieve_once
+
+    def _create_file(self, file, purpose):
+        file_id = f"file-{len(self.stored_files) + 1}"
+        self.stored_files[file_id] = file.read().decode('utf-8')
+        return types.SimpleNamespace(id=file_id)
+
+    def _file_content(self, file_id):
+        return types.SimpleNamespace(text=self.stored_files[file_id])
+
+    def _create_batch(self, input_file_id, endpoint, completion_window, metadata=None):
+        batch_id = f"batch-{len(self.created_batches) + 1}"
+        self.created_batches.append((batch_id, input_file_id))
+        return types.SimpleNamespace(id=batch_id, status="validating")
+
+    def _retrieve_batch(self, batch_id):
+        if self.fail_retrieve_once:
+            self.fail_retrieve_once = False
+            raise ConnectionError("conexão interrompida")
+
+        input_file_id = dict(self.created_batches)[batch_id]
+        output_lines = []
+        for line in self.stored_files[input_file_id].splitlines():
+            request = json.loads(line)
+            etapa = request["custom_id"].split(":")[0]
+            body = {
+                "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": request["body"]["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(ANSWERS[etapa], ensure_ascii=False)}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}
+            }
+            output_lines.append(json.dumps({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}))
+
+        output_file_id = f"file-out-{batch_id}"
+        self.stored_files[output_file_id] = "\n".join(output_lines)
+        return types.SimpleNamespace(id=batch_id, status="completed", output_file_id=output_file_id, error_file_id=None,
+                                     request_counts=types.SimpleNamespace(completed=len(output_lines), failed=0, total=len(output_lines)))
+
+
+class TestBatchClassification(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmpdir, 'state.json')
+        self.projects = [
+            {'id': 1, 'titulo': 'Painéis solares', 'objetivo': 'Gerar energia solar'},
+            {'id': 2, 'titulo': 'Usina solar', 'objetivo': 'Energia solar em escala'},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _client(self):
+        # A taxonomia vem de constantes para que o teste não dependa do banco de dados
+        client = OpenAIClient('sk-test')
+        client._get_aia_data_from_db = lambda: AIA_DATA
+        client._get_tecverde_classes = lambda: TECVERDE_CLASSES
+        client._get_tecverde_subclasses = lambda: TECVERDE_SUBCLASSES
+        return client
+
+    def test_runs_all_etapas(self):
+        api = FakeBatchAPI()
+        client = self._client()
+        results, errors = BatchClassifier(client, self.state_file, poll_interval=0, batch_client=api).run(self.projects, save=False)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(set(results), {'1', '2'})
+        self.assertEqual(results['1']['_aia_n3_dominio_afeito'], 'Solar')
+        self.assertEqual(results['1']['_aia_n3_dominio_outro'], 'Baterias')
+        self.assertTrue(results['1']['tecverde_se_aplica'])
+        self.assertEqual(results['1']['tecverde_subclasse'], 'Solar')
+        # Um lote para as Etapas 1 e 3 e outro para a Etapa 2
+        self.assertEqual(len(api.created_batches), 2)
+        self.assertEqual(client.get_usage_stats()['requests'], 6)
+
+    def test_resumes_without_resubmitting(self):
+        api = FakeBatchAPI(fail_retrieve_once=True)
+        with self.assertRaises(ConnectionError):
+            BatchClassifier(self._client(), self.state_file, poll_interval=0, batch_client=api).run(self.projects, save=False)
+        self.assertEqual(len(api.created_batches), 1)
+
+        results, errors = BatchClassifier(self._client(), self.state_file, poll_interval=0, batch_client=api).run([], save=False)
+        self.assertEqual(set(results), {'1', '2'})
+        self.assertEqual(len(api.created_batches), 2)
+
+        with open(self.state_file, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['fase'], 'concluido')
+
+    def test_resumed_run_keeps_save_flag(self):
+        api = FakeBatchAPI(fail_retrieve_once=True)
+        with self.assertRaises(ConnectionError):
+            BatchClassifier(self._client(), self.state_file, poll_interval=0, batch_client=api).run(self.projects, save=False)
+
+        # Uma execução iniciada sem gravação não grava ao ser retomada com save=True
+        with mock.patch('app.batch_classification.bulk_upsert_suggestions') as upsert:
+            results, errors = BatchClassifier(self._client(), self.state_file, poll_interval=0, batch_client=api).run([], save=True)
+        self.assertEqual(set(results), {'1', '2'})
+        upsert.assert_not_called()
+
+    def test_failed_batch_raises(self):
+        api = FakeBatchAPI()
+        api._retrieve_batch = lambda batch_id: types.SimpleNamespace(id=batch_id, status="expired")
+        api.batches.retrieve = api._retrieve_batch
+        with self.assertRaises(BatchClassificationError):
+            BatchClassifier(self._client(), self.state_file, poll_interval=0, batch_client=api).run(self.projects, save=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+
+from app import rag_cache
+from app.rag_cache import MemoryCacheBackend, ResponseCache, normalize_query
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.memory = MemoryCacheBackend(max_entries=2)
+        self.cache = ResponseCache([self.memory], ttl=60, versioned_ttl=3600)
+
+    def test_normalized_queries_share_entry(self):
+        self.assertEqual(normalize_query('  Quantos PROJETOS  categorizados? '), 'quantos projetos categorizados')
+        self.cache.set('Quantos projetos categorizados?', 'resposta')
+        self.assertEqual(self.cache.get('quantos   projetos categorizados'), 'resposta')
+        self.assertIsNone(self.cache.get('quantos projetos categorizados', scope='outro@usuario'))
+
+    def test_lru_eviction_keeps_recently_used(self):
+        self.cache.set('a', '1')
+        self.cache.set('b', '2')
+        self.cache.get('a')
+        self.cache.set('c', '3')
+        self.assertEqual(self.cache.get('a'), '1')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.memory.evictions, 1)
+
+    def test_expired_entry_is_a_miss(self):
+        self.cache.set('a', '1', ttl=-1)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_entry_is_discarded_when_a_domain_version_changes(self):
+        versions = {'categorias': 1, 'projetos': 4}
+        self.cache.set('a', '1', versions=versions)
+
+        with mock.patch.object(rag_cache, 'get_data_versions', return_value={'categorias': 1, 'projetos': 4}):
+            self.assertEqual(self.cache.get('a'), '1')
+        with mock.patch.object(rag_cache, 'get_data_versions', return_value={'categorias': 2, 'projetos': 4}):
+            self.assertIsNone(self.cache.get('a'))
+
+        stats = self.cache.stats.to_dict()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stale']), (1, 1, 1))
+        self.assertEqual(self.memory.info()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
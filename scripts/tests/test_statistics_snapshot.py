@@ -0,0 +1,38 @@
+import unittest
+from unittest import mock
+
+from app import statistics_snapshot
+from app.statistics_snapshot import StatisticsSnapshotCache
+
+
+class StatisticsSnapshotCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.loads = 0
+
+    def _loader(self):
+        self.loads += 1
+        return {'total_projects': self.loads}
+
+    def test_snapshot_is_reused_until_a_domain_version_changes(self):
+        cache = StatisticsSnapshotCache(ttl=60)
+
+        with mock.patch.object(statistics_snapshot, 'get_data_versions', return_value={'projetos': 1}):
+            self.assertEqual(cache.get('contagens', self._loader), {'total_projects': 1})
+            self.assertEqual(cache.get('contagens', self._loader), {'total_projects': 1})
+        with mock.patch.object(statistics_snapshot, 'get_data_versions', return_value={'projetos': 2}):
+            self.assertEqual(cache.get('contagens', self._loader), {'total_projects': 2})
+
+        self.assertEqual(self.loads, 2)
+
+    def test_snapshot_expires_after_ttl(self):
+        cache = StatisticsSnapshotCache(ttl=-1)
+
+        with mock.patch.object(statistics_snapshot, 'get_data_versions', return_value=None):
+            cache.get('contagens', self._loader)
+            cache.get('contagens', self._loader)
+
+        self.assertEqual(self.loads, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
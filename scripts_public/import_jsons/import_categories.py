@@ -8,6 +8,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../.
 
 from app import create_app, db
 from app.models import CategoriaLista
+from app.taxonomy import invalidate_taxonomy
 from sqlalchemy.exc import SQLAlchemyError
 
 # Carregar variáveis de ambiente do arquivo .env
@@ -154,7 +155,9 @@ def import_categories_data(json_file_path):
                         print(f"Erro ao inserir domínio '{dominio}' do segmento '{segmento}': {str(e)}")
                         continue
             
-            # Commit após inserir todos os domínios
+            # Commit após inserir todos os domínios (incrementando a versão da taxonomia
+            # para que a aplicação descarte o snapshot em cache)
+            invalidate_taxonomy()
             db.session.commit()
             print(f"Inseridos {dominios_count} domínios.")
             categories_added += dominios_count
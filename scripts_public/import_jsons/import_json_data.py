@@ -3,6 +3,8 @@ import os
 from dotenv import load_dotenv
 from app import create_app, db
 from app.models import Projeto
+from app.classification_status import refresh_classification_status
+from app.data_versions import DOMINIO_CATEGORIAS, DOMINIO_PROJETOS, DOMINIO_TECVERDE, bump_data_versions
 from sqlalchemy.exc import SQLAlchemyError
 
 # Carregar variáveis de ambiente do arquivo .env
@@ -125,7 +127,10 @@ def import_json_data(json_file_path):
                     print(f"Erro ao importar projeto {project_data.get('codigo_projeto')}: {str(e)}")
                     continue
             
-            # Commit final
+            # Commit final (incrementando as versões dos dados para invalidar o cache do chatbot;
+            # a limpeza da tabela também remove categorias e tecnologias verdes dos projetos)
+            refresh_classification_status()
+            bump_data_versions(DOMINIO_PROJETOS, DOMINIO_CATEGORIAS, DOMINIO_TECVERDE)
             db.session.commit()
             print(f"Importação concluída. Total de {projects_added} projetos importados com sucesso.")
             
@@ -6,6 +6,8 @@ from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
 from app import create_app, db
 from app.models import Projeto
+from app.classification_status import refresh_classification_status
+from app.data_versions import DOMINIO_PROJETOS, bump_data_versions
 
 def convert_timestamp_to_date(timestamp):
     """
@@ -107,6 +109,13 @@ def import_projects(json_data):
             errors.append(error_msg)
             stats['errors'] += 1
     
+    # Incrementar a versão dos projetos para invalidar o cache do chatbot (e recalcular o
+    # status de classificação dos projetos importados)
+    if stats['inserted']:
+        refresh_classification_status()
+        bump_data_versions(DOMINIO_PROJETOS)
+        db.session.commit()
+    
     # Retornar estatísticas e erros
     return stats, errors
 
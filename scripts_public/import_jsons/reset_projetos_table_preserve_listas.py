@@ -82,6 +82,7 @@ def reset_projetos_table_preserve_listas():
                 connection.execute(text("DROP TABLE IF EXISTS gepes.classificacoes_adicionais CASCADE"))
                 connection.execute(text("DROP TABLE IF EXISTS gepes.tecnologias_verdes CASCADE"))
                 connection.execute(text("DROP TABLE IF EXISTS gepes.categorias CASCADE"))
+                connection.execute(text("DROP TABLE IF EXISTS gepes.fila_revisao CASCADE"))
                 connection.execute(text("DROP TABLE IF EXISTS gepes.projetos CASCADE"))
                 connection.execute(text("DROP TABLE IF EXISTS gepes.usuarios CASCADE"))
                 connection.commit()